@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Benchmark the scheduling algorithms on reproducible catalog workloads.
+
+Draws seeded random course sets from the catalog, runs every algorithm in
+scheduler.ALGORITHMS on each one and reports wall time, peak memory, conflict
+matrix lookups and the gap between the best score found and the exact optimum.
+Results are written as JSON so runs can be compared between releases.
+
+  python benchmark.py --workloads 20 --seed 0 --output bench.json
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import argparse
+import inspect
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+from typing import List
+from catalog import CourseCatalog, DEFAULT_CATALOG_PATH
+from problem import SchedulingProblem
+from section import select_top_schedules
+from scheduler import ALGORITHMS
+from scheduling_algorithms.csp_alg import constraint_satisfaction_problem_method
+
+
+class CountingMatrix(np.ndarray):
+  """Conflict matrix that counts how many entries are read from it. Only used
+  for the measurement pass, so the timing pass pays nothing for it."""
+  lookups = 0
+
+  def __getitem__(self, key):
+    result = super().__getitem__(key)
+    CountingMatrix.lookups += np.size(result)
+    return result
+
+
+def generate_workloads(catalog : CourseCatalog, n_workloads : int, min_courses : int,
+                       max_courses : int, seed : int) -> List[List[str]]:
+  """Return n_workloads seeded random course sets that have a possible
+  schedule.
+
+  Args:
+      catalog (CourseCatalog): Catalog to draw courses from.
+      n_workloads (int): Number of course sets.
+      min_courses (int): Fewest courses in a set.
+      max_courses (int): Most courses in a set.
+      seed (int): Seed for the draw.
+  """
+  rng = random.Random(seed)
+  course_ids = sorted(course_id for course_id in catalog.course_ids()
+                      if len(catalog.get_sections(course_id)) > 0)
+  workloads = []
+  attempts = 0
+  while (len(workloads) < n_workloads and attempts < 100 * n_workloads):
+    attempts += 1
+    courses = rng.sample(course_ids, rng.randint(min_courses, max_courses))
+    problem = SchedulingProblem([list(catalog.get_sections(c)) for c in courses])
+    if (next(constraint_satisfaction_problem_method(problem, 1), None) is not None):
+      workloads.append(courses)
+  return workloads
+
+
+def run_algorithm(name : str, problem : SchedulingProblem, limit : int, seed : int):
+  """Run one algorithm into the top-k selector, as get_schedules does."""
+  algorithm = ALGORITHMS[name]
+  kwargs = {}
+  if ('seed' in inspect.signature(algorithm).parameters):
+    kwargs['seed'] = seed
+  else:
+    random.seed(seed)
+  return select_top_schedules(algorithm(problem, **kwargs), problem, limit)
+
+
+def benchmark_workload(courses : List[str], catalog : CourseCatalog, algorithms : List[str],
+                       limit : int, seed : int, exact : bool) -> dict:
+  """Benchmark every algorithm on one course set."""
+  classes = [list(catalog.get_sections(course)) for course in courses]
+  problem = SchedulingProblem(classes)
+  result = {"courses": courses, "n_sections": len(problem.sections), "results": {}}
+
+  optimum = None
+  if (exact):
+    start = time.perf_counter()
+    best = select_top_schedules(constraint_satisfaction_problem_method(problem, 1), problem, 1)
+    result["exact_time_s"] = time.perf_counter() - start
+    optimum = best[0][0] if best else None
+  result["optimum"] = optimum
+
+  for name in algorithms:
+    # Timing pass, with nothing instrumented
+    start = time.perf_counter()
+    top = run_algorithm(name, problem, limit, seed)
+    wall_time = time.perf_counter() - start
+
+    # Measurement pass, for memory and conflict lookups
+    measured = SchedulingProblem(classes)
+    measured.conflicts = problem.conflicts.view(CountingMatrix)
+    CountingMatrix.lookups = 0
+    tracemalloc.start()
+    run_algorithm(name, measured, limit, seed)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best_score = top[0][0] if top else None
+    result["results"][name] = {
+      "wall_time_s":       wall_time,
+      "peak_memory_bytes": peak_memory,
+      "conflict_checks":   CountingMatrix.lookups,
+      "schedules":         len(top),
+      "best_score":        best_score,
+      "optimality_gap":    (None if optimum is None or best_score is None
+                            else optimum - best_score),
+    }
+  return result
+
+
+def summarize(workloads : List[dict], algorithms : List[str]) -> dict:
+  """Average every metric of every algorithm over the workloads."""
+  summary = {}
+  for name in algorithms:
+    results = [workload["results"][name] for workload in workloads]
+    gaps = [r["optimality_gap"] for r in results if r["optimality_gap"] is not None]
+    summary[name] = {
+      "mean_wall_time_s":       float(np.mean([r["wall_time_s"] for r in results])),
+      "max_wall_time_s":        float(np.max([r["wall_time_s"] for r in results])),
+      "mean_peak_memory_bytes": float(np.mean([r["peak_memory_bytes"] for r in results])),
+      "mean_conflict_checks":   float(np.mean([r["conflict_checks"] for r in results])),
+      "mean_optimality_gap":    float(np.mean(gaps)) if gaps else None,
+      "optimal_rate":           (float(np.mean([gap <= 1e-12 for gap in gaps]))
+                                 if gaps else None),
+    }
+  return summary
+
+
+def main(argv : List[str] = None):
+  parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+  parser.add_argument("--workloads", type = int, default = 10)
+  parser.add_argument("--min-courses", type = int, default = 3)
+  parser.add_argument("--max-courses", type = int, default = 6)
+  parser.add_argument("--seed", type = int, default = 0)
+  parser.add_argument("--limit", type = int, default = 20)
+  parser.add_argument("--algorithms", nargs = "+", default = sorted(ALGORITHMS),
+                      choices = sorted(ALGORITHMS))
+  parser.add_argument("--catalog", default = DEFAULT_CATALOG_PATH)
+  parser.add_argument("--no-exact", action = "store_true",
+                      help = "skip computing the exact optimum")
+  parser.add_argument("--output", help = "write JSON here instead of stdout")
+  args = parser.parse_args(argv)
+
+  catalog = CourseCatalog(args.catalog)
+  workloads = generate_workloads(catalog, args.workloads, args.min_courses,
+                                 args.max_courses, args.seed)
+  results = [benchmark_workload(courses, catalog, args.algorithms, args.limit,
+                                args.seed, not args.no_exact)
+             for courses in workloads]
+  report = {
+    "version":   __version__,
+    "python":    platform.python_version(),
+    "seed":      args.seed,
+    "catalog":   args.catalog,
+    "limit":     args.limit,
+    "workloads": results,
+    "summary":   summarize(results, args.algorithms),
+  }
+
+  if (args.output):
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent = 2)
+  else:
+    json.dump(report, sys.stdout, indent = 2)
+    print()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Process-wide course catalog. The catalog dump is parsed once per process and
+each course's sections are only built the first time they are asked for, so
+warm workers never pay for JSON parsing or section parsing twice.
+
+Catalogs are backends behind one interface, CatalogBackend: the JSON dump
+(CourseCatalog), the compiled file (compiled_catalog.CompiledCatalog) and a
+key-value store such as DynamoDB (kv_catalog.KeyValueCatalog). get_catalog
+picks one from the SCHEDULETERP_CATALOG environment variable:
+  unset                   the compiled catalog if built, else the JSON dump
+  path/to/catalog.bin     a compiled catalog
+  path/to/catalog.json    a JSON dump, or a catalog.jsonl from etl.py
+  dynamodb:TableName      a DynamoDB table of {"course_id", "sections"} items
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import abc
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Tuple
+from section import Section
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "custom_data_dump_3.json")
+CATALOG_ENV = "SCHEDULETERP_CATALOG"
+
+
+def file_sha256(path : str) -> str:
+  """Return the SHA-256 of a file, the version of a catalog dump."""
+  with open(path, "rb") as f:
+    return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_section(section_dict : dict, course_id : str) -> Section:
+  """Build a section from either a raw dump record or one normalized by 
+  etl.py, which skips the regex parsing."""
+  if ('meetings' in section_dict):
+    return Section.from_normalized(section_dict, course_id)
+  return Section(section_dict, course_id)
+
+
+class CatalogBackend(abc.ABC):
+  """Read-only mapping from course ID to that course's sections. Sections are
+  shared by every caller, so they must be treated as read-only."""
+  @abc.abstractmethod
+  def __contains__(self, course_id : str) -> bool:
+    """Return true if the course is in the catalog."""
+
+  @abc.abstractmethod
+  def get_version(self) -> str:
+    """Return a string that changes whenever the catalog does."""
+
+  @abc.abstractmethod
+  def course_ids(self) -> List[str]:
+    """Return every course ID in the catalog."""
+
+  @abc.abstractmethod
+  def get_sections(self, course_id : str) -> Tuple[Section, ...]:
+    """Return the sections of a course.
+
+    Raises:
+        KeyError: If the course is not in the catalog.
+    """
+
+  def get_many(self, course_ids : Iterable[str]) -> Dict[str, Tuple[Section, ...]]:
+    """Return the sections of several courses. Backends with a per-lookup
+    cost, like a remote store, fetch them all at once.
+
+    Raises:
+        KeyError: If a course is not in the catalog.
+    """
+    return {course_id: self.get_sections(course_id) for course_id in course_ids}
+
+
+class CourseCatalog(CatalogBackend):
+  """Lazily loaded mapping from course ID to that course's sections.
+
+  Sections are built on first use and then shared by every caller, so they
+  must be treated as read-only.
+  """
+  def __init__(self, path : str = DEFAULT_CATALOG_PATH) -> None:
+    """Initializes the catalog without reading anything from disk.
+
+    Args:
+        path (str): Path to the JSON catalog dump, or to a catalog.jsonl 
+        normalized by etl.py.
+    """
+    self.path      = path
+    self.version   : str = None  # SHA-256 of the dump, set when it is loaded
+    self._data     = None
+    self._sections : Dict[str, Tuple[Section, ...]] = {}
+    self._lock     = threading.Lock()
+
+  def _get_data(self) -> dict:
+    """Return the raw catalog, parsing the dump the first time."""
+    if (self._data is None):
+      with self._lock:
+        if (self._data is None):
+          with open(self.path, "rb") as f:
+            source = f.read()
+          self.version = hashlib.sha256(source).hexdigest()
+          if (self.path.endswith(".jsonl")):
+            courses = (json.loads(line) for line in source.splitlines() if line.strip())
+            self._data = {course['course_id']: course['sections'] for course in courses}
+          else:
+            self._data = json.loads(source)
+    return self._data
+
+  def __contains__(self, course_id : str) -> bool:
+    return course_id in self._get_data()
+
+  def get_version(self) -> str:
+    """Return the SHA-256 of the catalog dump, which changes whenever the 
+    catalog does."""
+    self._get_data()
+    return self.version
+
+  def course_ids(self) -> List[str]:
+    """Return every course ID in the catalog."""
+    return list(self._get_data().keys())
+
+  def get_sections(self, course_id : str) -> Tuple[Section, ...]:
+    """Return the shared sections of a course, building them on first use.
+
+    Args:
+        course_id (str): Course to look up, e.g. "CMSC131".
+
+    Raises:
+        KeyError: If the course is not in the catalog.
+
+    Returns:
+        tuple[Section]: The course's sections.
+    """
+    sections = self._sections.get(course_id)
+    if (sections is None):
+      raw_sections = self._get_data()[course_id]
+      sections = tuple(build_section(section_dict, course_id)
+                       for section_dict in raw_sections)
+      # Two threads may race to build the same course; keep whichever
+      # finished first so every caller sees the same objects.
+      sections = self._sections.setdefault(course_id, sections)
+    return sections
+
+
+def open_catalog(location : str = None) -> CatalogBackend:
+  """Open the catalog backend at a location, in the format of CATALOG_ENV.
+
+  Args:
+      location (str, optional): Where the catalog is. None uses the compiled
+      catalog when an up-to-date one has been built, since opening it is much
+      cheaper than parsing the JSON dump, and the JSON dump otherwise.
+
+  Returns:
+      CatalogBackend: The catalog.
+  """
+  from compiled_catalog import CompiledCatalog, DEFAULT_COMPILED_PATH
+  if (location is None):
+    try:
+      return CompiledCatalog(DEFAULT_COMPILED_PATH, DEFAULT_CATALOG_PATH)
+    except (OSError, ValueError):
+      # Not compiled yet, compiled by an older version, or compiled from an
+      # older dump.
+      return CourseCatalog()
+  if (location.startswith("dynamodb:")):
+    from kv_catalog import KeyValueCatalog
+    return KeyValueCatalog.from_dynamodb(location[len("dynamodb:"):])
+  if (location.endswith(".bin")):
+    return CompiledCatalog(location)
+  return CourseCatalog(location)
+
+
+_catalog : CatalogBackend = None
+_catalog_lock = threading.Lock()
+
+def get_catalog() -> CatalogBackend:
+  """Return the process-wide catalog, opening the one CATALOG_ENV names on 
+  first call.
+  """
+  global _catalog
+  if (_catalog is None):
+    with _catalog_lock:
+      if (_catalog is None):
+        _catalog = open_catalog(os.environ.get(CATALOG_ENV) or None)
+  return _catalog
+
+
+def set_catalog(catalog : CatalogBackend) -> None:
+  """Replace the process-wide catalog, e.g. with a key-value catalog over a
+  local stand-in store."""
+  global _catalog
+  with _catalog_lock:
+    _catalog = catalog
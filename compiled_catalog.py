@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Compiled, memory-mapped course catalog.
+
+The JSON catalog has to be parsed in full before a single course can be read.
+This module compiles it offline into a compact binary file that holds the
+already-parsed meeting times, GPAs, an interned string table and a sorted
+course index. The file is read through mmap, so opening it is cheap and a
+request only touches the pages of the courses it asks for.
+
+Compile the catalog with:
+  python compiled_catalog.py [custom_data_dump_3.json] [custom_data_dump_3.bin]
+
+Layout (little-endian):
+  header    magic, version, table counts, table offsets, source SHA-256
+  strings   uint32 offsets[n_strings + 1] followed by the UTF-8 blob
+  courses   (name_id, first_section, n_sections), sorted by course ID
+  sections  (section_num_id, lectures_id, instructors_id, gpa, first_meeting,
+             n_meetings, first_start, n_start)
+  meetings  uint16 (start, end) pairs in minutes since 12:00am on Monday,
+            sorted per section
+  starts    uint16 start time of each meeting, in minutes since 12:00am
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, List, Tuple
+from section import Section
+from catalog import DEFAULT_CATALOG_PATH, CatalogBackend, CourseCatalog, build_section, file_sha256
+
+DEFAULT_COMPILED_PATH = os.path.splitext(DEFAULT_CATALOG_PATH)[0] + ".bin"
+
+MAGIC   = b"STCATLOG"
+VERSION = 3
+
+# magic, version, n_strings, n_courses, n_sections, n_meetings, n_starts,
+# strings/courses/sections/meetings/starts offsets, source SHA-256
+_HEADER  = struct.Struct("<8sIIIIII5Q32s")
+_COURSE  = struct.Struct("<III")
+_SECTION = struct.Struct("<IIIdIIII")
+
+
+class _StringTable:
+  """Interns strings so every distinct string is stored once."""
+  def __init__(self) -> None:
+    self.ids     : Dict[str, int] = {}
+    self.strings : List[str] = []
+
+  def intern(self, string : str) -> int:
+    string_id = self.ids.get(string)
+    if (string_id is None):
+      string_id = len(self.strings)
+      self.ids[string] = string_id
+      self.strings.append(string)
+    return string_id
+
+
+def compile_catalog(json_path : str = DEFAULT_CATALOG_PATH,
+                    out_path : str = DEFAULT_COMPILED_PATH) -> None:
+  """Compile the JSON catalog into the binary format read by CompiledCatalog.
+
+  Args:
+      json_path (str): Path to the JSON catalog dump, or a catalog.jsonl 
+      normalized by etl.py.
+      out_path (str): Path of the compiled file to write.
+  """
+  catalog = CourseCatalog(json_path)
+  data = catalog._get_data()
+
+  strings  = _StringTable()
+  courses  = []
+  sections = []
+  meetings = []
+  starts   = []
+  for course_id in sorted(data):
+    courses.append((strings.intern(course_id), len(sections), len(data[course_id])))
+    for section_dict in data[course_id]:
+      # Reuse Section's parser so compiled sections are identical to the
+      # ones built from JSON.
+      section = build_section(section_dict, course_id)
+      sections.append((strings.intern(section.section_num),
+                       strings.intern(json.dumps(section.lectures)),
+                       strings.intern(json.dumps(section.instructors)),
+                       float(section_dict['gpa']),
+                       len(meetings), len(section.meetings),
+                       len(starts), len(section.start_times)))
+      meetings.extend(section.meetings)
+      starts.extend(section.start_times)
+
+  blob = bytearray()
+  string_offsets = [0]
+  for string in strings.strings:
+    blob += string.encode("utf-8")
+    string_offsets.append(len(blob))
+
+  string_table  = struct.pack("<%dI" % len(string_offsets), *string_offsets) + bytes(blob)
+  course_table  = b"".join(_COURSE.pack(*course) for course in courses)
+  section_table = b"".join(_SECTION.pack(*section) for section in sections)
+  meeting_table = struct.pack("<%dH" % (2 * len(meetings)),
+                              *[minute for meeting in meetings for minute in meeting])
+  start_table   = struct.pack("<%dH" % len(starts), *starts)
+
+  tables  = [string_table, course_table, section_table, meeting_table, start_table]
+  offsets = []
+  position = _HEADER.size
+  for table in tables:
+    # Keep every table 8-byte aligned.
+    position += -position % 8
+    offsets.append(position)
+    position += len(table)
+
+  header = _HEADER.pack(MAGIC, VERSION, len(strings.strings), len(courses),
+                        len(sections), len(meetings), len(starts), *offsets,
+                        bytes.fromhex(catalog.get_version()))
+  tmp_path = out_path + ".tmp"
+  with open(tmp_path, "wb") as f:
+    f.write(header)
+    for offset, table in zip(offsets, tables):
+      f.write(b"\0" * (offset - f.tell()))
+      f.write(table)
+  os.replace(tmp_path, out_path)
+
+
+class CompiledCatalog(CatalogBackend):
+  """Read-only catalog backed by a memory-mapped compiled catalog file.
+  Offers the same lookups as CourseCatalog.
+  """
+  def __init__(self, path : str = DEFAULT_COMPILED_PATH, source_path : str = None) -> None:
+    """Opens and maps the compiled catalog. Only the header is read.
+
+    Args:
+        path (str): Path to a file written by compile_catalog.
+        source_path (str, optional): JSON dump the file should have been
+        compiled from. If it exists, it is hashed and compared with the hash
+        compiled into the file.
+
+    Raises:
+        ValueError: If the file is not a compiled catalog of this version, or
+        was compiled from another version of source_path.
+    """
+    self.path = path
+    with open(path, "rb") as f:
+      self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, version, self._n_strings, self._n_courses, self._n_sections,
+     _, _, self._strings_offset, self._courses_offset, self._sections_offset,
+     self._meetings_offset, self._starts_offset,
+     self.source_sha256) = _HEADER.unpack_from(self._buffer, 0)
+    if (magic != MAGIC or version != VERSION):
+      raise ValueError("%s is not a version %d compiled catalog" % (path, VERSION))
+
+    self.version = self.source_sha256.hex()
+    if (source_path is not None and os.path.exists(source_path)
+        and file_sha256(source_path) != self.version):
+      self._buffer.close()
+      raise ValueError("%s is out of date with %s" % (path, source_path))
+    self._blob_offset = self._strings_offset + 4 * (self._n_strings + 1)
+    self._string_cache : Dict[int, str] = {}
+    self._sections     : Dict[str, Tuple[Section, ...]] = {}
+    self._lock = threading.Lock()
+
+  def _string(self, string_id : int) -> str:
+    """Return the interned string with the given ID."""
+    string = self._string_cache.get(string_id)
+    if (string is None):
+      start, end = struct.unpack_from("<II", self._buffer,
+                                      self._strings_offset + 4 * string_id)
+      string = self._buffer[self._blob_offset + start:self._blob_offset + end].decode("utf-8")
+      string = self._string_cache.setdefault(string_id, string)
+    return string
+
+  def _course_record(self, index : int) -> Tuple[int, int, int]:
+    return _COURSE.unpack_from(self._buffer, self._courses_offset + _COURSE.size * index)
+
+  def _find_course(self, course_id : str) -> int:
+    """Binary search the course index. Returns -1 if the course is missing."""
+    low, high = 0, self._n_courses
+    while (low < high):
+      middle = (low + high) // 2
+      name = self._string(self._course_record(middle)[0])
+      if (name < course_id):
+        low = middle + 1
+      elif (name > course_id):
+        high = middle
+      else:
+        return middle
+    return -1
+
+  def __contains__(self, course_id : str) -> bool:
+    return course_id in self._sections or self._find_course(course_id) != -1
+
+  def get_version(self) -> str:
+    """Return the SHA-256 of the JSON dump this file was compiled from."""
+    return self.version
+
+  def course_ids(self) -> List[str]:
+    """Return every course ID in the catalog, sorted."""
+    return [self._string(self._course_record(i)[0]) for i in range(self._n_courses)]
+
+  def get_sections(self, course_id : str) -> Tuple[Section, ...]:
+    """Return the shared sections of a course, decoding them on first use.
+
+    Args:
+        course_id (str): Course to look up, e.g. "CMSC131".
+
+    Raises:
+        KeyError: If the course is not in the catalog.
+
+    Returns:
+        tuple[Section]: The course's sections.
+    """
+    sections = self._sections.get(course_id)
+    if (sections is None):
+      index = self._find_course(course_id)
+      if (index == -1):
+        raise KeyError(course_id)
+      _, first_section, n_sections = self._course_record(index)
+
+      built = []
+      for i in range(first_section, first_section + n_sections):
+        (section_num_id, lectures_id, instructors_id, gpa, first_meeting, n_meetings,
+         first_start, n_start) = _SECTION.unpack_from(
+           self._buffer, self._sections_offset + _SECTION.size * i)
+        minutes = struct.unpack_from("<%dH" % (2 * n_meetings), self._buffer,
+                                     self._meetings_offset + 4 * first_meeting)
+        start_times = struct.unpack_from(
+          "<%dH" % n_start, self._buffer, self._starts_offset + 2 * first_start)
+        built.append(Section.from_parsed(
+          course_id, self._string(section_num_id), gpa,
+          json.loads(self._string(lectures_id)), zip(minutes[::2], minutes[1::2]),
+          start_times, json.loads(self._string(instructors_id))))
+
+      with self._lock:
+        sections = self._sections.setdefault(course_id, tuple(built))
+    return sections
+
+
+if __name__ == '__main__':
+  compile_catalog(*sys.argv[1:3])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Offline index of the time conflicts between every pair of catalog
+sections.
+
+Many sections share the same meeting times, so sections are grouped by their
+occupancy bitmask, their time pattern. This module computes once, over the
+whole catalog, which pairs of time patterns overlap and stores the result
+next to the catalog. A request then looks up the pattern of each of its
+sections and slices the pattern matrix, instead of comparing every pair of
+sections' bitmasks.
+
+The index is tied to the catalog it was built from and is ignored once the
+catalog changes. Rebuild it after compiling the catalog with:
+  python conflict_index.py [custom_data_dump_3.conflicts.npz]
+
+Layout (.npz):
+  version    SHA-256 of the catalog dump it was built from
+  patterns   P x OCCUPANCY_WORDS little-endian uint64 occupancy of every
+             pattern, sorted
+  conflicts  P x ceil(P / 8) packed bits, row-major; bit (i, j) is set when
+             patterns i and j overlap. Patterns with any meeting overlap
+             themselves.
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import os
+import sys
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from section import Section, OCCUPANCY_WORDS, get_occupancy_words
+from catalog import DEFAULT_CATALOG_PATH, get_catalog
+
+DEFAULT_INDEX_PATH = os.path.splitext(DEFAULT_CATALOG_PATH)[0] + ".conflicts.npz"
+# Patterns compared at once while building, to bound memory
+BUILD_CHUNK = 256
+
+
+def build_conflict_index(catalog = None, path : str = DEFAULT_INDEX_PATH) -> 'ConflictIndex':
+  """Build the conflict index of every section in a catalog and save it.
+
+  Args:
+      catalog (optional): CourseCatalog or CompiledCatalog. Defaults to
+      get_catalog().
+      path (str): Where to write the index.
+
+  Returns:
+      ConflictIndex: The index.
+  """
+  catalog = catalog or get_catalog()
+  occupancies = {section.occupancy: section
+                 for course_id in catalog.course_ids()
+                 for section in catalog.get_sections(course_id)}
+  patterns = get_occupancy_words([occupancies[occupancy] for occupancy in sorted(occupancies)])
+
+  n_patterns = len(patterns)
+  conflicts = np.zeros((n_patterns, (n_patterns + 7) // 8), dtype=np.uint8)
+  for first in range(0, n_patterns, BUILD_CHUNK):
+    chunk = patterns[first:first + BUILD_CHUNK]
+    overlaps = (chunk[:, None, :] & patterns[None, :, :]).any(axis=2)
+    conflicts[first:first + BUILD_CHUNK] = np.packbits(overlaps, axis=1)
+
+  index = ConflictIndex(catalog.get_version(), patterns, conflicts)
+  index.save(path)
+  return index
+
+
+class ConflictIndex:
+  """Packed pairwise conflict matrix of the catalog's time patterns."""
+  def __init__(self, version : str, patterns : np.ndarray, conflicts : np.ndarray) -> None:
+    """Initializes the index. Use build_conflict_index or load.
+
+    Args:
+        version (str): Version of the catalog it was built from.
+        patterns (np.ndarray): P x OCCUPANCY_WORDS occupancy of every pattern.
+        conflicts (np.ndarray): P x ceil(P / 8) packed conflict bits.
+    """
+    self.version   = version
+    self.patterns  = patterns
+    self.conflicts = conflicts
+    self.pattern_ids : Dict[int, int] = {
+      int.from_bytes(words.tobytes(), "little"): i for i, words in enumerate(patterns)}
+
+  def save(self, path : str) -> None:
+    np.savez_compressed(path, version=self.version, patterns=self.patterns,
+                        conflicts=self.conflicts)
+
+  @classmethod
+  def load(cls, path : str = DEFAULT_INDEX_PATH) -> 'ConflictIndex':
+    with np.load(path) as data:
+      patterns = data["patterns"].astype("<u8")
+      if (patterns.ndim != 2 or patterns.shape[1] != OCCUPANCY_WORDS):
+        raise ValueError("Conflict index built with a different slot size")
+      return cls(str(data["version"]), patterns, data["conflicts"])
+
+  def __len__(self) -> int:
+    return len(self.patterns)
+
+  def conflict_matrix(self, sections : List[Section]) -> Optional[np.ndarray]:
+    """Return the pairwise conflict matrix of a list of sections, the same as
+    problem.build_conflict_matrix gives.
+
+    Args:
+        sections (list[Section]): Sections to compare.
+
+    Returns:
+        np.ndarray: N x N boolean matrix, true where two sections conflict,
+        or None if a section's time pattern is not in the index.
+    """
+    pattern_ids = self.pattern_ids
+    ids = np.array([pattern_ids.get(section.occupancy, -1) for section in sections], dtype=int)
+    if ((ids < 0).any()):
+      return None
+    # Slice the few distinct patterns of the request, then expand to sections.
+    unique, inverse = np.unique(ids, return_inverse=True)
+    rows = np.unpackbits(self.conflicts[unique], axis=1, count=len(self))
+    pattern_conflicts = rows[:, unique].astype(bool)
+    conflicts = pattern_conflicts[inverse[:, None], inverse[None, :]]
+    np.fill_diagonal(conflicts, False)
+    return conflicts
+
+
+_index : ConflictIndex = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+def get_conflict_index() -> Optional[ConflictIndex]:
+  """Return the process-wide conflict index, loading it on first call, or
+  None if it hasn't been built for the current catalog."""
+  global _index, _index_loaded
+  if (not _index_loaded):
+    with _index_lock:
+      if (not _index_loaded):
+        try:
+          index = ConflictIndex.load(DEFAULT_INDEX_PATH)
+          # Built from an older catalog
+          _index = index if index.version == get_catalog().get_version() else None
+        except (OSError, ValueError, KeyError):
+          _index = None
+        _index_loaded = True
+  return _index
+
+
+if __name__ == '__main__':
+  index = build_conflict_index(path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_INDEX_PATH)
+  print("%d time patterns, %d conflicting pairs"
+        % (len(index), int(np.unpackbits(index.conflicts).sum())))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Encodings of get_schedules results.
+
+"verbose", the original shape, repeats every section's data in every
+schedule it is part of:
+  [[{"class_name": "CMSC131", "section_num": "0101", "gpa": 3.2,
+     "lectures": [...]}, ...], ...]
+
+"compact" lists every section once and refers to it by index:
+  {"encoding": "compact",
+   "sections":  [{"class_name": "CMSC131", "section_num": "0101", ...}, ...],
+   "schedules": [[0, 3, 5], [1, 3, 5], ...],
+   "scores":    [8.41, 8.37, ...]}
+
+"ndjson" streams a compact result as one JSON object per line. A section is
+sent just before the first schedule that uses it:
+  {"section": {"id": 0, "class_name": "CMSC131", ...}}
+  {"schedule": [0, 3, 5], "score": 8.41}
+  ...
+  {"stop_reason": "finished"}
+  {"done": true, "count": 20}
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import json
+from typing import Iterator, List, Sequence, Tuple
+from problem import SchedulingProblem
+
+# Encodings get_schedules returns
+ENCODINGS = ("verbose", "compact")
+# Encodings a response can be sent in; ndjson streams a compact result
+RESPONSE_ENCODINGS = ENCODINGS + ("ndjson",)
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def encode_schedules(problem : SchedulingProblem,
+                     top_schedules : Sequence[Tuple[float, Sequence[int]]],
+                     encoding : str = "verbose"):
+  """Encode the (score, schedule) pairs of a problem, best first.
+
+  Raises:
+      ValueError: If the encoding is unknown.
+  """
+  if (encoding == "verbose"):
+    return [[section.get_data() for section in problem.to_sections(schedule)]
+            for _, schedule in top_schedules]
+  if (encoding == "compact"):
+    return encode_compact(problem, top_schedules)
+  raise ValueError("Unknown encoding " + str(encoding))
+
+
+def encode_compact(problem : SchedulingProblem,
+                   top_schedules : Sequence[Tuple[float, Sequence[int]]]) -> dict:
+  """Return the compact encoding of (score, schedule) pairs."""
+  ids = {}  # problem section index -> index into sections
+  sections = []
+  schedules = []
+  for _, schedule in top_schedules:
+    encoded = []
+    for i in sorted(schedule):
+      if (i not in ids):
+        ids[i] = len(sections)
+        sections.append(problem.sections[i].get_data())
+      encoded.append(ids[i])
+    schedules.append(encoded)
+  return {"encoding": "compact", "sections": sections, "schedules": schedules,
+          "scores": [float(score) for score, _ in top_schedules]}
+
+
+def is_compact(schedules) -> bool:
+  return isinstance(schedules, dict) and schedules.get("encoding") == "compact"
+
+
+def decode_compact(compact : dict) -> List[List[dict]]:
+  """Return the verbose encoding of a compact result."""
+  sections = compact["sections"]
+  return [[sections[i] for i in schedule] for schedule in compact["schedules"]]
+
+
+def reorder(schedules, input_classes : List[str]):
+  """Put every schedule's sections in the order the courses were requested,
+  in either encoding."""
+  order = {class_name: i for i, class_name in enumerate(input_classes)}
+  if (is_compact(schedules)):
+    sections = schedules["sections"]
+    return {**schedules, "schedules": [
+      sorted(schedule, key = lambda i: order.get(sections[i]['class_name'], len(order)))
+      for schedule in schedules["schedules"]]}
+  return [sorted(schedule, key = lambda section: order.get(section['class_name'], len(order)))
+          for schedule in schedules]
+
+
+def ndjson_lines(compact : dict, **fields) -> Iterator[bytes]:
+  """Yield a compact result as NDJSON lines, ready to write as they come.
+
+  Args:
+      compact (dict): Compact result, see encode_compact.
+      **fields: Extra objects to send before the final line, e.g. metrics.
+  """
+  dumps = json.JSONEncoder(separators = (",", ":")).encode
+  sections = compact["sections"]
+  sent = 0
+  for schedule, score in zip(compact["schedules"], compact["scores"]):
+    # Sections are numbered in order of first use, so every new one is next.
+    while (sent <= max(schedule, default = -1)):
+      yield (dumps({"section": {"id": sent, **sections[sent]}}) + "\n").encode()
+      sent += 1
+    yield (dumps({"schedule": schedule, "score": score}) + "\n").encode()
+  for name, value in fields.items():
+    yield (dumps({name: value}) + "\n").encode()
+  yield (dumps({"done": True, "count": len(compact["schedules"])}) + "\n").encode()
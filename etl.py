@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Incremental catalog ETL.
+
+Streams the catalog dump one course at a time and normalizes every section
+once: meetings become (day, start minute, end minute) triples, "lectures" is
+always a list and placeholder meetings such as " -" and "TBA -" are dropped.
+Each normalized course is content-hashed against the manifest of the previous
+run, so only courses that were added or changed are re-emitted to the
+downstream formats.
+
+Outputs, in the output directory:
+  catalog.jsonl          every normalized course, one per line
+  changes.jsonl          added or changed courses, as normalized JSON lines
+  changes.ion            the same, as ION (needs amazon.ion)
+  changes.dynamodb.json  the same, in the DynamoDB import format, with a
+                         "#version" item for kv_catalog.py
+  manifest.json          course hashes and the courses removed by this run
+  gpa_changes.json       with --grades, every section whose GPA changed
+
+With --grades, every section's GPA is recomputed from a grades.py index, with
+instructor, course, department and overall fallbacks, instead of taken from
+the dump. Sections whose GPA changed are listed with the old and new GPA and
+the level the new one came from.
+
+  python etl.py [--source custom_data_dump_3.json] [--out-dir catalog_build]
+                [--formats jsonl ion dynamodb] [--full] [--grades grades.npz]
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import IO, Dict, Iterator, List, Tuple
+from catalog import DEFAULT_CATALOG_PATH
+from grades import GradeIndex, LEVELS
+from kv_catalog import KEY, VERSION_KEY
+from section import get_minutes
+
+try:
+  import amazon.ion.simpleion as ion
+except ImportError:
+  ion = None
+
+DEFAULT_OUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_build")
+MANIFEST_VERSION = 1
+
+# "MWF 10:00am-10:50am", "SaSu 8:30am-5:30pm"
+_MEETING = re.compile(r"\s*((?:M|Tu|W|Th|F|Sa|Su)+)\s+(\d{1,2}:\d\d[ap]m)-(\d{1,2}:\d\d[ap]m)\s*")
+_DAY     = re.compile(r"M|Tu|W|Th|F|Sa|Su")
+
+
+def iter_courses(path : str = DEFAULT_CATALOG_PATH,
+                 chunk_size : int = 1 << 16) -> Iterator[Tuple[str, list]]:
+  """Yield (course_id, sections) pairs of a JSON catalog dump without loading
+  the whole file.
+
+  Args:
+      path (str): Path to the JSON catalog dump.
+      chunk_size (int): Bytes read at a time.
+  """
+  decoder = json.JSONDecoder()
+  with open(path, "r", encoding="utf-8") as f:
+    buffer = ""
+    position = 0
+    at_eof = False
+
+    def read_more() -> None:
+      nonlocal buffer, position, at_eof
+      chunk = f.read(chunk_size)
+      at_eof = not chunk
+      # Drop what was consumed so the buffer stays about one chunk long.
+      buffer = buffer[position:] + chunk
+      position = 0
+
+    def peek() -> str:
+      """Return the next non-whitespace character, or "" at the end."""
+      nonlocal position
+      while (True):
+        while (position < len(buffer) and buffer[position].isspace()):
+          position += 1
+        if (position < len(buffer) or at_eof):
+          return buffer[position:position + 1]
+        read_more()
+
+    def decode():
+      """Decode the next value, reading more of the file as needed."""
+      nonlocal position
+      peek()
+      while (True):
+        try:
+          value, end = decoder.raw_decode(buffer, position)
+          # A number cut off by the chunk boundary still decodes, so only
+          # trust a value that is followed by something.
+          if (end < len(buffer) or at_eof):
+            position = end
+            return value
+        except json.JSONDecodeError:
+          if (at_eof):
+            raise
+        read_more()
+
+    def expect(character : str) -> None:
+      nonlocal position
+      if (peek() != character):
+        raise ValueError("Expected '%s' in %s" % (character, path))
+      position += 1
+
+    expect("{")
+    if (peek() == "}"):
+      return
+    while (True):
+      course_id = decode()
+      expect(":")
+      yield course_id, decode()
+      if (peek() == "}"):
+        return
+      expect(",")
+
+
+def parse_meeting(meeting : str) -> List[Tuple[str, int, int]]:
+  """Return the (day, start minute, end minute) triples of a meeting string,
+  e.g. "MW 10:00am-10:50am" -> [("M", 600, 650), ("W", 600, 650)].
+  Placeholders such as " -" and "TBA -" give an empty list."""
+  match = _MEETING.fullmatch(meeting)
+  if (match is None):
+    return []
+  days, start, end = match.groups()
+  return [(day, get_minutes(start), get_minutes(end)) for day in _DAY.findall(days)]
+
+
+def normalize_section(section_dict : dict) -> dict:
+  """Return the normalized form of one catalog section.
+
+  Args:
+      section_dict (dict): Section from the dump, e.g. {"section_num": "0101",
+      "gpa": 3.28, "lectures": ["W 4:00pm-5:45pm", " -"], "discussions": []}
+
+  Returns:
+      dict: e.g. {"section_num": "0101", "gpa": 3.28,
+      "lectures": ["W 4:00pm-5:45pm"], "discussions": [],
+      "meetings": [["W", 960, 1065]]}. "instructors" is kept when present.
+  """
+  lectures = section_dict['lectures']
+  if (isinstance(lectures, str)):
+    lectures = [lectures]
+  # Placeholders carry no time, so they are dropped everywhere.
+  lectures    = [meeting.strip() for meeting in lectures if parse_meeting(meeting)]
+  discussions = [meeting.strip() for meeting in section_dict['discussions']
+                 if parse_meeting(meeting)]
+  normalized = {"section_num": section_dict['section_num'],
+                "gpa":         float(section_dict['gpa']),
+                "lectures":    lectures,
+                "discussions": discussions,
+                "meetings":    [list(triple) for meeting in lectures + discussions
+                                for triple in parse_meeting(meeting)]}
+  if ('instructors' in section_dict):
+    normalized['instructors'] = list(section_dict['instructors'])
+  return normalized
+
+
+def normalize_course(course_id : str, sections : list, grades : GradeIndex = None,
+                     gpa_changes : list = None) -> dict:
+  """Return the normalized record of one course, with GPAs from grades if
+  given.
+
+  Args:
+      course_id (str): Course ID, e.g. "CMSC131".
+      sections (list): Sections from the dump.
+      grades (GradeIndex, optional): Recompute section GPAs from this index.
+      gpa_changes (list, optional): Gets a [course_id, section_num, old GPA,
+      new GPA, level] entry for every section whose GPA grades changed.
+  """
+  normalized = [normalize_section(section_dict) for section_dict in sections]
+  if (grades is not None and normalized):
+    gpas, levels = grades.get_gpas([course_id] * len(normalized),
+                                   [section.get('instructors', ()) for section in normalized],
+                                   return_levels = True)
+    for section, gpa, level in zip(normalized, gpas.tolist(), levels.tolist()):
+      if (gpa_changes is not None and gpa != section['gpa']):
+        gpa_changes.append([course_id, section['section_num'], section['gpa'], gpa,
+                            LEVELS[level]])
+      section['gpa'] = gpa
+  return {"course_id": course_id, "sections": normalized}
+
+
+def course_hash(course : dict) -> str:
+  """Return the content hash of a normalized course."""
+  return hashlib.sha256(json.dumps(course, sort_keys=True, separators=(",", ":"))
+                        .encode()).hexdigest()
+
+
+def iter_normalized(path : str) -> Iterator[dict]:
+  """Yield the normalized courses of a catalog.jsonl written by run_etl."""
+  with open(path, "r", encoding="utf-8") as f:
+    for line in f:
+      if (line.strip()):
+        yield json.loads(line)
+
+
+def to_dynamodb(value) -> dict:
+  """Return a value in DynamoDB's typed JSON, e.g. "0101" -> {"S": "0101"}."""
+  if (isinstance(value, bool)):
+    return {"BOOL": value}
+  if (isinstance(value, str)):
+    return {"S": value}
+  if (isinstance(value, (int, float))):
+    return {"N": repr(value)}
+  if (isinstance(value, (list, tuple))):
+    return {"L": [to_dynamodb(item) for item in value]}
+  if (isinstance(value, dict)):
+    return {"M": {str(key): to_dynamodb(item) for key, item in value.items()}}
+  if (value is None):
+    return {"NULL": True}
+  raise TypeError("Cannot convert " + type(value).__name__ + " to DynamoDB JSON")
+
+
+def _write_jsonl(f : IO, course : dict) -> None:
+  f.write(json.dumps(course) + "\n")
+
+def _write_ion(f : IO, course : dict) -> None:
+  f.write(ion.dumps({"Item": course}, binary=False) + "\n")
+
+def _write_dynamodb(f : IO, course : dict) -> None:
+  # One {"Item": ...} per line, as DynamoDB's import from S3 expects.
+  item = {key: to_dynamodb(value) for key, value in course.items()}
+  f.write(json.dumps({"Item": item}) + "\n")
+
+
+def catalog_version(hashes : Dict[str, str]) -> str:
+  """Return a version that changes whenever any course is added, changed or
+  removed."""
+  return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+
+# Change formats: name -> (file name, writer)
+FORMATS = {
+  "jsonl":    ("changes.jsonl", _write_jsonl),
+  "ion":      ("changes.ion", _write_ion),
+  "dynamodb": ("changes.dynamodb.json", _write_dynamodb),
+}
+
+
+def load_manifest(out_dir : str) -> Dict[str, str]:
+  """Return the course hashes of the last run, or an empty dict."""
+  try:
+    with open(os.path.join(out_dir, "manifest.json"), "r") as f:
+      manifest = json.load(f)
+  except (OSError, ValueError):
+    return {}
+  if (manifest.get("version") != MANIFEST_VERSION):
+    return {}
+  return manifest["courses"]
+
+
+def run_etl(source : str = DEFAULT_CATALOG_PATH, out_dir : str = DEFAULT_OUT_DIR,
+            formats : List[str] = None, full : bool = False,
+            grades : GradeIndex = None) -> dict:
+  """Normalize the catalog and emit the courses that changed since the last
+  run.
+
+  Args:
+      source (str): Path to the JSON catalog dump.
+      out_dir (str): Directory for the outputs and the manifest.
+      formats (list[str], optional): Change formats to write, from FORMATS.
+      Defaults to every format whose dependencies are installed.
+      full (bool): Emit every course, ignoring the manifest.
+      grades (GradeIndex, optional): Recompute section GPAs from this index.
+
+  Raises:
+      ImportError: If "ion" is asked for and amazon.ion is not installed.
+
+  Returns:
+      dict: Added, changed and removed course IDs, the unchanged count, the
+      new catalog version and, with grades, the GPA changes written to
+      gpa_changes.json.
+  """
+  if (formats is None):
+    formats = [name for name in FORMATS if name != "ion" or ion is not None]
+  if ("ion" in formats and ion is None):
+    raise ImportError("Writing ION needs the amazon.ion package")
+  os.makedirs(out_dir, exist_ok=True)
+  previous = {} if full else load_manifest(out_dir)
+
+  hashes  : Dict[str, str] = {}
+  summary = {"added": [], "changed": [], "removed": [], "unchanged": 0}
+  gpa_changes = [] if grades is not None else None
+  paths   = [os.path.join(out_dir, "catalog.jsonl")] + \
+            [os.path.join(out_dir, FORMATS[name][0]) for name in formats]
+  files   = [open(path + ".tmp", "w", encoding="utf-8") for path in paths]
+  try:
+    for course_id, sections in iter_courses(source):
+      course = normalize_course(course_id, sections, grades, gpa_changes)
+      _write_jsonl(files[0], course)
+      hashes[course_id] = course_hash(course)
+      if (previous.get(course_id) == hashes[course_id]):
+        summary["unchanged"] += 1
+        continue
+      summary["changed" if course_id in previous else "added"].append(course_id)
+      for name, f in zip(formats, files[1:]):
+        FORMATS[name][1](f, course)
+    summary["version"] = catalog_version(hashes)
+    if ("dynamodb" in formats):
+      # Loaded with the changes, so servers notice the table was updated.
+      _write_dynamodb(files[1 + formats.index("dynamodb")],
+                      {KEY: VERSION_KEY, "version": summary["version"]})
+  finally:
+    for f in files:
+      f.close()
+  for path in paths:
+    os.replace(path + ".tmp", path)
+
+  summary["removed"] = sorted(set(previous) - set(hashes))
+  if (gpa_changes is not None):
+    summary["gpa_changes"] = gpa_changes
+    with open(os.path.join(out_dir, "gpa_changes.json"), "w") as f:
+      json.dump(gpa_changes, f, indent=0)
+  # Written last, so an interrupted run re-emits everything it did not finish.
+  with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+    json.dump({"version": MANIFEST_VERSION, "courses": hashes,
+               "removed": summary["removed"]}, f, indent=0, sort_keys=True)
+  return summary
+
+
+def main():
+  parser = argparse.ArgumentParser(description = "Normalize the catalog and emit changed courses")
+  parser.add_argument("--source", default = DEFAULT_CATALOG_PATH)
+  parser.add_argument("--out-dir", default = DEFAULT_OUT_DIR)
+  parser.add_argument("--formats", nargs = "+", choices = sorted(FORMATS))
+  parser.add_argument("--full", action = "store_true",
+                      help = "emit every course, not only the changed ones")
+  parser.add_argument("--grades", default = None,
+                      help = "GPA index from grades.py to recompute section GPAs with")
+  args = parser.parse_args()
+  grades = GradeIndex.load(args.grades) if args.grades else None
+  summary = run_etl(args.source, args.out_dir, args.formats, args.full, grades)
+  print("%d added, %d changed, %d removed, %d unchanged"
+        % (len(summary["added"]), len(summary["changed"]),
+           len(summary["removed"]), summary["unchanged"]))
+  if (grades is not None):
+    print("%d section GPAs changed, see %s"
+          % (len(summary["gpa_changes"]), os.path.join(args.out_dir, "gpa_changes.json")))
+
+if __name__ == '__main__':
+  main()
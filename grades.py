@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Offline grade-distribution aggregation.
+
+Sums PlanetTerp-style grade records, e.g.
+  {"course": "CMSC131", "professor": "Jane Doe", "semester": "202208",
+   "section": "0101", "A+": 3, "A": 20, ..., "F": 1, "W": 2}
+into count matrices indexed by (course, instructor), and from them GPA tables
+per instructor of a course, per course, per department and overall. A
+section's GPA comes from the first of those levels with grade data.
+
+  python grades.py planetterp_grades/*.json --semesters 10 --out grades.npz
+  python etl.py --grades grades.npz
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import argparse
+import json
+import numpy as np
+from typing import Iterable, Iterator, Sequence
+
+GRADE_KEYS   = ("A+", "A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "F", "W")
+# TODO Maybe change W to 0.5
+GRADE_POINTS = np.array([4.0, 4.0, 3.7, 3.3, 3.0, 2.7, 2.3, 2.0, 1.7, 1.3, 1.0, 0.7, 0.0, 0.0])
+# Fallback order of get_gpas
+LEVELS = ("instructor", "course", "department", "global")
+# Global GPA when there are no grades at all, as Section assumes
+FALLBACK_GPA = 3.1
+
+
+def get_department(course_id : str) -> str:
+  """Return the department of a course, e.g. "CMSC131" -> "CMSC"."""
+  return course_id[:4]
+
+
+def load_records(paths : Iterable[str]) -> Iterator[dict]:
+  """Yield the grade records of local JSON files, each either a list of
+  records (as PlanetTerp's /grades returns) or one record per line."""
+  for path in paths:
+    with open(path, "r", encoding="utf-8") as f:
+      text = f.read()
+    if (text.lstrip().startswith("[")):
+      yield from json.loads(text)
+    else:
+      for line in text.splitlines():
+        if (line.strip()):
+          yield json.loads(line)
+
+
+def _sum_rows(index : np.ndarray, counts : np.ndarray, n_rows : int) -> np.ndarray:
+  """Return counts summed into n_rows rows by row index."""
+  return np.stack([np.bincount(index, counts[:, j], minlength = n_rows)
+                   for j in range(counts.shape[1])], axis = 1)
+
+
+def _gpas(counts : np.ndarray, min_grades : int) -> np.ndarray:
+  """Return the GPA of every row of counts, NaN where it has too few grades."""
+  totals = counts.sum(axis = -1)
+  with np.errstate(invalid = "ignore", divide = "ignore"):
+    gpas = counts @ GRADE_POINTS / totals
+  return np.where(totals >= max(min_grades, 1), gpas, np.nan)
+
+
+def _find(keys : np.ndarray, values : np.ndarray) -> np.ndarray:
+  """Return the index of every value in sorted keys, or -1 if it is missing."""
+  if (len(keys) == 0):
+    return np.full(len(values), -1)
+  index = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+  return np.where(keys[index] == values, index, -1)
+
+
+def _take(table : np.ndarray, index : np.ndarray) -> np.ndarray:
+  """Return table[index], NaN where the index is -1."""
+  if (len(table) == 0):
+    return np.full(len(index), np.nan)
+  return np.where(index >= 0, table[index], np.nan)
+
+
+class GradeIndex:
+  """Grade counts of every (course, instructor) pair, course and department,
+  with the GPA tables they give."""
+  def __init__(self, courses : np.ndarray, instructors : np.ndarray,
+               pair_codes : np.ndarray, pair_counts : np.ndarray,
+               min_grades : int = 1) -> None:
+    """Initializes the index from its count matrix. Use from_records.
+
+    Args:
+        courses (np.ndarray): Sorted course IDs.
+        instructors (np.ndarray): Sorted instructor names.
+        pair_codes (np.ndarray): Sorted course index * len(instructors) +
+        instructor index of every (course, instructor) pair.
+        pair_counts (np.ndarray): pairs x len(GRADE_KEYS) grade counts.
+        min_grades (int): Grades a level needs before its GPA is used.
+    """
+    self.courses     = courses
+    self.instructors = instructors
+    self.pair_codes  = pair_codes
+    self.pair_counts = pair_counts
+    self.min_grades  = min_grades
+
+    pair_courses = pair_codes // max(len(instructors), 1)
+    self.course_counts = _sum_rows(pair_courses, pair_counts, len(courses))
+    self.departments, department_index = np.unique(
+      np.array([get_department(course) for course in courses], dtype = str),
+      return_inverse = True)
+    self.department_counts = _sum_rows(department_index, self.course_counts,
+                                       len(self.departments))
+    self.global_counts = pair_counts.sum(axis = 0)
+
+    self.instructor_gpas = _gpas(pair_counts, min_grades)
+    self.course_gpas     = _gpas(self.course_counts, min_grades)
+    self.department_gpas = _gpas(self.department_counts, min_grades)
+    self.global_gpa      = float(_gpas(self.global_counts, 1)) if self.global_counts.any() \
+                           else FALLBACK_GPA
+
+  @classmethod
+  def from_records(cls, records : Iterable[dict], recent_semesters : int = None,
+                   min_grades : int = 1) -> 'GradeIndex':
+    """Aggregate grade records.
+
+    Args:
+        records (iterable[dict]): PlanetTerp-style grade records.
+        recent_semesters (int, optional): Only count the last this many
+        semesters with grade data, e.g. 10 for about five years.
+        min_grades (int): Grades a level needs before its GPA is used.
+
+    Returns:
+        GradeIndex: The index.
+    """
+    records     = list(records)
+    courses     = np.array([record["course"] for record in records], dtype = str)
+    instructors = np.array([record.get("professor") or "" for record in records], dtype = str)
+    counts      = np.array([[record.get(key) or 0 for key in GRADE_KEYS] for record in records],
+                           dtype = float).reshape(len(records), len(GRADE_KEYS))
+    if (recent_semesters is not None):
+      # Semesters are "YYYYMM", so they sort by date.
+      semesters = np.array([str(record.get("semester", "")) for record in records], dtype = str)
+      recent    = np.unique(semesters)[-recent_semesters:] if recent_semesters > 0 else []
+      keep      = np.isin(semesters, recent)
+      courses, instructors, counts = courses[keep], instructors[keep], counts[keep]
+
+    courses, course_index = np.unique(courses, return_inverse = True)
+    instructors, instructor_index = np.unique(instructors, return_inverse = True)
+    pair_codes, pair_index = np.unique(course_index * len(instructors) + instructor_index,
+                                       return_inverse = True)
+    return cls(courses, instructors, pair_codes, _sum_rows(pair_index, counts, len(pair_codes)),
+               min_grades)
+
+  def save(self, path : str) -> None:
+    """Save the count matrix as .npz; the GPA tables are rebuilt on load."""
+    np.savez_compressed(path, courses = self.courses, instructors = self.instructors,
+                        pair_codes = self.pair_codes, pair_counts = self.pair_counts,
+                        min_grades = self.min_grades)
+
+  @classmethod
+  def load(cls, path : str) -> 'GradeIndex':
+    with np.load(path) as data:
+      return cls(data["courses"], data["instructors"], data["pair_codes"],
+                 data["pair_counts"], int(data["min_grades"]))
+
+  def get_gpas(self, course_ids : Sequence[str],
+               instructors : Sequence[Sequence[str]] = None,
+               return_levels : bool = False):
+    """Return the GPA of many sections at once.
+
+    A section's GPA is that of its instructors' past sections of the course,
+    then the course's, then the department's, then the overall GPA, taking
+    the first with at least min_grades grades.
+
+    Args:
+        course_ids (sequence[str]): Course of every section.
+        instructors (sequence[sequence[str]], optional): Instructors of every
+        section. Sections taught together count all of their instructors.
+        return_levels (bool): Also return the LEVELS index each GPA came from.
+
+    Returns:
+        np.ndarray: GPA of every section, and the levels if asked for.
+    """
+    course_ids = np.array(course_ids, dtype = str).reshape(-1)
+    n_sections = len(course_ids)
+    gpas   = np.full(n_sections, self.global_gpa)
+    levels = np.full(n_sections, LEVELS.index("global"))
+
+    departments = np.array([get_department(course) for course in course_ids], dtype = str)
+    self._override(gpas, levels, _take(self.department_gpas, _find(self.departments, departments)),
+                   "department")
+    course_index = _find(self.courses, course_ids)
+    self._override(gpas, levels, _take(self.course_gpas, course_index), "course")
+
+    if (instructors is not None and len(self.instructors) > 0):
+      # Every (section, instructor) pair, with names that have grade data
+      section_index = np.array([i for i, names in enumerate(instructors)
+                                for name in names if name], dtype = int)
+      names = np.array([name for names in instructors for name in names if name], dtype = str)
+      instructor_index = _find(self.instructors, names)
+      pair = _find(self.pair_codes, np.where(instructor_index >= 0,
+                                             course_index[section_index] * len(self.instructors)
+                                             + instructor_index, -1))
+      pair = np.where((course_index[section_index] >= 0) & (instructor_index >= 0), pair, -1)
+      known = pair >= 0
+      counts = _sum_rows(section_index[known], self.pair_counts[pair[known]], n_sections)
+      self._override(gpas, levels, _gpas(counts, self.min_grades), "instructor")
+
+    return (gpas, levels) if return_levels else gpas
+
+  def _override(self, gpas : np.ndarray, levels : np.ndarray, level_gpas : np.ndarray,
+                level : str) -> None:
+    known = ~np.isnan(level_gpas)
+    gpas[known]   = level_gpas[known]
+    levels[known] = LEVELS.index(level)
+
+  def get_gpa(self, course_id : str, instructors : Sequence[str] = ()) -> float:
+    """Return the GPA of one section, see get_gpas."""
+    return float(self.get_gpas([course_id], [list(instructors)])[0])
+
+
+def main():
+  parser = argparse.ArgumentParser(description = "Aggregate grade records into a GPA index")
+  parser.add_argument("records", nargs = "+", help = "JSON or JSON lines grade record files")
+  parser.add_argument("--out", default = "grades.npz")
+  parser.add_argument("--semesters", type = int, default = None,
+                      help = "only count the last this many semesters")
+  parser.add_argument("--min-grades", type = int, default = 1)
+  args = parser.parse_args()
+  index = GradeIndex.from_records(load_records(args.records), args.semesters, args.min_grades)
+  index.save(args.out)
+  print("%d courses, %d instructors, %d departments, overall GPA %.3f"
+        % (len(index.courses), len(index.instructors), len(index.departments), index.global_gpa))
+
+if __name__ == '__main__':
+  main()
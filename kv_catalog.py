@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""Course catalog backed by a key-value store such as DynamoDB.
+
+Every course is one item, {"course_id": "CMSC131", "sections": [...]}, in
+DynamoDB JSON as in dynamo_custom_data_dump.json. get_many fetches every
+course a request needs that isn't cached yet in one BatchGetItem call,
+retrying the keys the store leaves unprocessed, so a request costs one
+batched read instead of one read per course. Fetched sections stay in an
+in-process read-through cache.
+
+The table must also hold a "#version" item, {"course_id": "#version",
+"version": "..."}, whose version changes whenever the table is updated, as in
+the changes etl.py writes. The schedule cache and the conflict index are keyed
+on it. It is re-read every VERSION_TTL seconds, and cached courses are dropped
+when it changes; without one the table name is used, and updates to the table
+are never noticed.
+
+The store is anything with DynamoDB's low-level client methods batch_get_item
+and scan. InMemoryKeyValueStore is a local stand-in with the same batch-get
+semantics, for running without AWS. Its from_dump gives the dump's hash as
+the version:
+
+  store = InMemoryKeyValueStore.from_dump("dynamo_custom_data_dump.json")
+  set_catalog(KeyValueCatalog(store))
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import json
+import logging
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+from catalog import CatalogBackend, build_section, file_sha256
+from section import Section
+
+DEFAULT_TABLE = "ScheduleTerpCatalog"
+KEY = "course_id"
+# Item whose "version" attribute is the catalog version, if the table has one
+VERSION_KEY = "#version"
+# Seconds a version read from the table is trusted before reading it again
+VERSION_TTL = 60.0
+# Most keys DynamoDB accepts in one BatchGetItem call
+MAX_BATCH_KEYS = 100
+MAX_ATTEMPTS = 5
+# First retry delay in seconds, doubled on every attempt, with full jitter
+RETRY_DELAY = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+def deserialize(value : dict):
+  """Return the Python value of a DynamoDB JSON attribute value, with numbers
+  as floats or ints."""
+  (kind, data), = value.items()
+  if (kind == "S"):
+    return data
+  if (kind == "N"):
+    number = float(data)
+    return int(number) if number.is_integer() and "." not in data else number
+  if (kind == "L"):
+    return [deserialize(item) for item in data]
+  if (kind == "M"):
+    return {name: deserialize(item) for name, item in data.items()}
+  if (kind == "BOOL"):
+    return data
+  if (kind == "NULL"):
+    return None
+  raise ValueError("Unsupported DynamoDB type " + kind)
+
+
+class KeyValueCatalog(CatalogBackend):
+  """Catalog that reads courses from a key-value store in batches and keeps
+  them in memory."""
+  def __init__(self, client, table : str = DEFAULT_TABLE, version : str = None,
+               max_attempts : int = MAX_ATTEMPTS, retry_delay : float = RETRY_DELAY,
+               version_ttl : float = VERSION_TTL) -> None:
+    """Initializes the catalog without reading anything from the store.
+
+    Args:
+        client: DynamoDB low-level client, or a stand-in with batch_get_item
+        and scan.
+        table (str): Table of course items, keyed on course_id.
+        version (str, optional): Fixed catalog version. Defaults to the
+        "version" of the table's VERSION_KEY item, or the table name if it has
+        none.
+        max_attempts (int): BatchGetItem calls made for one batch before
+        giving up on unprocessed keys.
+        retry_delay (float): Seconds before the first retry.
+        version_ttl (float): Seconds before the VERSION_KEY item is read
+        again.
+    """
+    self.client        = client
+    self.table         = table
+    self.fixed_version = version
+    self.version       = version
+    self.version_ttl   = version_ttl
+    self.version_read  = None  # time.monotonic() of the last read
+    self.max_attempts  = max_attempts
+    self.retry_delay   = retry_delay
+    self.batch_calls   = 0
+    self.retries       = 0
+    self.hits          = 0
+    self.misses        = 0
+    self._sections : Dict[str, Tuple[Section, ...]] = {}
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_dynamodb(cls, table : str = DEFAULT_TABLE, **kwargs) -> 'KeyValueCatalog':
+    """Return a catalog over a DynamoDB table. The client keeps a pool of
+    connections that every request reuses."""
+    import boto3
+    from botocore.config import Config
+    client = boto3.client("dynamodb", config = Config(max_pool_connections = 32,
+                                                      retries = {"mode": "adaptive"}))
+    return cls(client, table, **kwargs)
+
+  def __contains__(self, course_id : str) -> bool:
+    try:
+      self.get_sections(course_id)
+    except KeyError:
+      return False
+    return True
+
+  def get_version(self) -> str:
+    """Return the table's version, reading it again once it is older than
+    version_ttl. Cached courses are dropped when it changed."""
+    if (self.fixed_version is not None):
+      return self.fixed_version
+    now = time.monotonic()
+    if (self.version_read is not None and now - self.version_read < self.version_ttl):
+      return self.version
+    item = self._batch_get([VERSION_KEY]).get(VERSION_KEY)
+    if (item and "version" in item):
+      version = str(item["version"])
+    else:
+      if (self.version != self.table):
+        logger.warning("Catalog table %s has no %r item; using the table name as its version, "
+                       "so cached schedules and the conflict index won't notice updates",
+                       self.table, VERSION_KEY)
+      version = self.table
+    with self._lock:
+      if (self.version is not None and version != self.version):
+        self._sections.clear()
+      self.version = version
+      self.version_read = now
+    return version
+
+  def course_ids(self) -> List[str]:
+    """Return every course ID in the table. Scans the whole table."""
+    course_ids = []
+    kwargs = {"TableName": self.table, "ProjectionExpression": KEY}
+    while (True):
+      response = self.client.scan(**kwargs)
+      course_ids.extend(item[KEY]["S"] for item in response.get("Items", ()))
+      if ("LastEvaluatedKey" not in response):
+        break
+      kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return sorted(course_id for course_id in course_ids if course_id != VERSION_KEY)
+
+  def get_sections(self, course_id : str) -> Tuple[Section, ...]:
+    """Return the shared sections of a course, fetching it on first use.
+
+    Raises:
+        KeyError: If the course is not in the table.
+    """
+    return self.get_many([course_id])[course_id]
+
+  def get_many(self, course_ids : Iterable[str]) -> Dict[str, Tuple[Section, ...]]:
+    """Return the sections of several courses, fetching the ones not cached
+    yet in one batch.
+
+    Raises:
+        KeyError: If a course is not in the table.
+    """
+    course_ids = list(course_ids)
+    found = {course_id: self._sections.get(course_id) for course_id in course_ids}
+    missing = list(dict.fromkeys(course_id for course_id, sections in found.items()
+                                 if sections is None))
+    self.hits   += len(found) - len(missing)
+    self.misses += len(missing)
+    if (missing):
+      items = self._batch_get(missing)
+      with self._lock:
+        for course_id in missing:
+          item = items.get(course_id)
+          if (item is None):
+            raise KeyError(course_id)
+          sections = tuple(build_section(section_dict, course_id)
+                           for section_dict in item["sections"])
+          # Keep whichever fetch finished first so every caller sees the
+          # same objects.
+          found[course_id] = self._sections.setdefault(course_id, sections)
+    return found
+
+  def _batch_get(self, course_ids : List[str]) -> Dict[str, dict]:
+    """Return the items of course IDs that exist, retrying unprocessed keys
+    with exponential backoff.
+
+    Raises:
+        RuntimeError: If some keys are still unprocessed after max_attempts
+        calls.
+    """
+    items = {}
+    for first in range(0, len(course_ids), MAX_BATCH_KEYS):
+      request = {self.table: {"Keys": [{KEY: {"S": course_id}} for course_id
+                                       in course_ids[first:first + MAX_BATCH_KEYS]]}}
+      for attempt in range(self.max_attempts):
+        if (attempt):
+          self.retries += 1
+          time.sleep(random.uniform(0, self.retry_delay * 2 ** (attempt - 1)))
+        self.batch_calls += 1
+        response = self.client.batch_get_item(RequestItems = request)
+        for item in response.get("Responses", {}).get(self.table, ()):
+          item = {name: deserialize(value) for name, value in item.items()}
+          items[item[KEY]] = item
+        request = response.get("UnprocessedKeys") or {}
+        if (not request.get(self.table, {}).get("Keys")):
+          break
+      else:
+        raise RuntimeError("%d catalog keys still unprocessed after %d attempts"
+                           % (len(request[self.table]["Keys"]), self.max_attempts))
+    return items
+
+  def stats(self) -> dict:
+    """Return the cache and store call counters."""
+    return {"hits": self.hits, "misses": self.misses, "batch_calls": self.batch_calls,
+            "retries": self.retries, "cached": len(self._sections)}
+
+  def clear(self) -> None:
+    """Drop every cached course and the version, e.g. after the table was
+    updated."""
+    with self._lock:
+      self._sections.clear()
+      self.version = self.fixed_version
+      self.version_read = None
+
+
+class InMemoryKeyValueStore:
+  """Local stand-in for the DynamoDB calls KeyValueCatalog makes. Like
+  DynamoDB, batch_get_item takes at most MAX_BATCH_KEYS distinct keys and may
+  return only some items, leaving the rest in UnprocessedKeys."""
+  def __init__(self, items : Iterable[dict] = (), table : str = DEFAULT_TABLE,
+               max_items_per_call : int = None) -> None:
+    """Initializes the store
+
+    Args:
+        items (iterable[dict]): Items in DynamoDB JSON, keyed on course_id.
+        table (str): Name of the one table it holds.
+        max_items_per_call (int, optional): Most items a batch_get_item call
+        returns, to exercise the retry of unprocessed keys.
+    """
+    self.table = table
+    self.items : Dict[str, dict] = {item[KEY]["S"]: item for item in items}
+    self.max_items_per_call = max_items_per_call
+    self.calls = 0
+
+  @classmethod
+  def from_dump(cls, path : str, **kwargs) -> 'InMemoryKeyValueStore':
+    """Load a DynamoDB JSON export like dynamo_custom_data_dump.json, one
+    object that repeats the "Item" key for every item. Without a VERSION_KEY
+    item, the SHA-256 of the file is added as one."""
+    def items_or_dict(pairs):
+      if (pairs and all(name == "Item" for name, _ in pairs)):
+        return [item for _, item in pairs]
+      return dict(pairs)
+    with open(path, "r", encoding = "utf-8") as f:
+      items = json.load(f, object_pairs_hook = items_or_dict)
+    if (not any(item[KEY]["S"] == VERSION_KEY for item in items)):
+      items.append({KEY: {"S": VERSION_KEY}, "version": {"S": file_sha256(path)}})
+    return cls(items, **kwargs)
+
+  def batch_get_item(self, RequestItems : dict) -> dict:
+    self.calls += 1
+    if (set(RequestItems) - {self.table}):
+      raise KeyError("Unknown table " + str(set(RequestItems) - {self.table}))
+    keys = [key[KEY]["S"] for key in RequestItems.get(self.table, {}).get("Keys", ())]
+    if (len(keys) > MAX_BATCH_KEYS):
+      raise ValueError("Too many items requested for the BatchGetItem call")
+    if (len(set(keys)) != len(keys)):
+      raise ValueError("Provided list of item keys contains duplicates")
+
+    limit = len(keys) if self.max_items_per_call is None else self.max_items_per_call
+    processed, unprocessed = keys[:limit], keys[limit:]
+    response = {"Responses": {self.table: [self.items[key] for key in processed
+                                           if key in self.items]},
+                "UnprocessedKeys": {}}
+    if (unprocessed):
+      response["UnprocessedKeys"][self.table] = {"Keys": [{KEY: {"S": key}}
+                                                          for key in unprocessed]}
+    return response
+
+  def scan(self, TableName : str, ProjectionExpression : str = None,
+           ExclusiveStartKey : dict = None, Limit : int = 1000) -> dict:
+    keys = sorted(self.items)
+    if (ExclusiveStartKey is not None):
+      keys = [key for key in keys if key > ExclusiveStartKey[KEY]["S"]]
+    page = keys[:Limit]
+    items = [{KEY: self.items[key][KEY]} if ProjectionExpression == KEY else self.items[key]
+             for key in page]
+    response = {"Items": items, "Count": len(items)}
+    if (len(keys) > Limit):
+      response["LastEvaluatedKey"] = {KEY: {"S": page[-1]}}
+    return response
@@ -10,9 +10,10 @@ __maintainer__ = "Oliver Villegas, Jaxon Lee"
 __email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
 __status__     = "Development"
 
-import boto3
 import json
-from scheduler import get_schedules
+import logging
+import time
+from schedule_cache import get_schedule_cache
 
 def schedule_terp(input):
   # print("Querying input from PlanetTerp and UMD.io...")
@@ -24,16 +25,46 @@ def schedule_terp(input):
   # NOTE: some HNUH classes are not in PlanetTerp
 
 
-  schedules = get_schedules(my_input)
+  # Popular course combinations are served from the cache.
+  schedules = get_schedule_cache().get_schedules(my_input)
 
   return schedules
 
 
 def lambda_handler(event, context):
-    message = 'Hello {} {}!'.format(event['first_name'], event['last_name'])  
-    return { 
-        'message' : message
-    }
+  """Serve one schedule request. The event is either the request itself or an
+  API Gateway event with the request JSON as its body, in the format
+  server.parse_request takes."""
+  from server import get_body, parse_request, solve
+  from encoding import NDJSON_CONTENT_TYPE, ndjson_lines
+  payload = event.get('body', event) if isinstance(event, dict) else event
+  try:
+    if (isinstance(payload, str)):
+      payload = json.loads(payload)
+    courses, kwargs, deadline = parse_request(payload)
+  except (TypeError, ValueError) as e:
+    return {'statusCode': 400, 'body': json.dumps({'error': str(e)})}
+  if (context is not None and hasattr(context, 'get_remaining_time_in_millis')):
+    # Never plan past the Lambda timeout.
+    deadline = min(deadline, context.get_remaining_time_in_millis() / 1000)
+  try:
+    schedules, metrics, stop_reason = solve(courses, kwargs, time.time() + deadline)
+  except TimeoutError as e:
+    return {'statusCode': 504, 'body': json.dumps({'error': str(e)})}
+  except KeyError as e:
+    return {'statusCode': 400, 'body': json.dumps({'error': 'Unknown course ' + str(e)})}
+  except ValueError as e:
+    return {'statusCode': 400, 'body': json.dumps({'error': str(e)})}
+  except Exception:
+    logging.exception("Request failed")
+    return {'statusCode': 500, 'body': json.dumps({'error': 'Internal server error'})}
+  if (payload.get('encoding') == 'ndjson'):
+    # Lambda responses are buffered, so the lines are sent all at once.
+    lines = ndjson_lines(schedules, stop_reason = stop_reason,
+                         **({'metrics': metrics} if metrics is not None else {}))
+    return {'statusCode': 200, 'headers': {'Content-Type': NDJSON_CONTENT_TYPE},
+            'body': b''.join(lines).decode()}
+  return {'statusCode': 200, 'body': json.dumps(get_body(schedules, metrics, stop_reason))}
 
   
 def main():
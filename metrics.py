@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Opt-in metrics and profiling of one schedule request.
+
+A request carries a Metrics object through get_schedules on its
+SchedulingProblem. Stages are timed with metrics.timer(stage), and the
+algorithms count their work (conflict checks, samples accepted, dead ends,
+generations, ...) in local variables, reporting the totals once per run. When
+a request doesn't ask for metrics it gets NULL_METRICS, whose methods do
+nothing, so the hot paths pay a few attribute lookups per request.
+
+  metrics = Metrics(profiler = "sampling")
+  schedules = get_schedules(["CMSC131", "MATH140"], metrics = metrics)
+  metrics.as_dict()  # {"timings": {...}, "counters": {...}, "profile": {...}}
+  metrics.emit()     # to every sink added with add_sink
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import collections
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+PROFILERS = ("cprofile", "sampling")
+# Functions shown in a profile report
+PROFILE_LIMIT = 25
+
+logger = logging.getLogger(__name__)
+
+
+class _Timer:
+  """Adds the time spent in a with block to a stage."""
+  __slots__ = ("timings", "stage", "start")
+
+  def __init__(self, timings : Dict[str, float], stage : str) -> None:
+    self.timings = timings
+    self.stage   = stage
+
+  def __enter__(self) -> '_Timer':
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.timings[self.stage] = (self.timings.get(self.stage, 0.0)
+                                + time.perf_counter() - self.start)
+
+
+class _NullContext:
+  __slots__ = ()
+
+  def __enter__(self) -> '_NullContext':
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    pass
+
+_NULL_CONTEXT = _NullContext()
+
+
+class Metrics:
+  """Stage timings, counters and an optional profile of one request."""
+  enabled = True
+
+  def __init__(self, profiler : str = None, sinks : List[Callable[[dict], None]] = ()) -> None:
+    """Initializes the metrics
+
+    Args:
+        profiler (str, optional): Profiler from PROFILERS to run around the
+        request: "cprofile" for exact call counts, "sampling" for a low
+        overhead stack sampler.
+        sinks (list[callable], optional): Also emit to these, besides the
+        sinks added with add_sink.
+
+    Raises:
+        ValueError: If the profiler is unknown.
+    """
+    if (profiler is not None and profiler not in PROFILERS):
+      raise ValueError("Unknown profiler " + str(profiler))
+    self.profiler = profiler
+    self.sinks    = list(sinks)
+    self.timings  : Dict[str, float] = {}
+    self.counters : Dict[str, int] = collections.Counter()
+    self.profile  = None
+
+  def timer(self, stage : str):
+    """Return a context manager that adds the time spent in it to stage."""
+    return _Timer(self.timings, stage)
+
+  def count(self, name : str, n : int = 1) -> None:
+    self.counters[name] += n
+
+  def add(self, counters : Dict[str, int]) -> None:
+    """Add several counters at once, e.g. totals from a worker process."""
+    self.counters.update(counters)
+
+  def profiling(self):
+    """Return a context manager that runs the profiler, if any, in it."""
+    if (self.profiler is None):
+      return _NULL_CONTEXT
+    return _Profiling(self)
+
+  def as_dict(self) -> dict:
+    """Return the metrics as JSON-ready data."""
+    data = {"timings":  {stage: round(seconds, 6) for stage, seconds in self.timings.items()},
+            "counters": {name: int(n) for name, n in self.counters.items()}}
+    if (self.profile is not None):
+      data["profile"] = self.profile
+    return data
+
+  def emit(self, **fields) -> None:
+    """Send the metrics, and any extra fields such as the request, to every
+    sink. A failing sink is logged and skipped."""
+    record = {**fields, **self.as_dict()}
+    for sink in self.sinks + _sinks:
+      try:
+        sink(record)
+      except Exception:
+        logger.exception("Metrics sink %r failed", sink)
+
+
+class NullMetrics(Metrics):
+  """Metrics that record nothing, for requests that didn't ask for any."""
+  enabled = False
+
+  def __init__(self) -> None:
+    super().__init__()
+
+  def timer(self, stage : str):
+    return _NULL_CONTEXT
+
+  def count(self, name : str, n : int = 1) -> None:
+    pass
+
+  def add(self, counters : Dict[str, int]) -> None:
+    pass
+
+  def profiling(self):
+    return _NULL_CONTEXT
+
+  def emit(self, **fields) -> None:
+    pass
+
+NULL_METRICS = NullMetrics()
+
+
+def get_metrics(metrics = None) -> Metrics:
+  """Return the metrics a request asked for.
+
+  Args:
+      metrics (bool | str | Metrics, optional): None or False for none, True
+      for timings and counters, a name in PROFILERS to profile as well, or a
+      Metrics object.
+  """
+  if (metrics is None or metrics is False):
+    return NULL_METRICS
+  if (isinstance(metrics, Metrics)):
+    return metrics
+  if (metrics is True):
+    return Metrics()
+  return Metrics(profiler = metrics)
+
+
+class _Profiling:
+  def __init__(self, metrics : Metrics) -> None:
+    self.metrics = metrics
+
+  def __enter__(self) -> '_Profiling':
+    self.profiler = (cProfile.Profile() if self.metrics.profiler == "cprofile"
+                     else SamplingProfiler())
+    self.profiler.enable()
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.profiler.disable()
+    if (isinstance(self.profiler, cProfile.Profile)):
+      text = io.StringIO()
+      pstats.Stats(self.profiler, stream = text).sort_stats("cumulative").print_stats(PROFILE_LIMIT)
+      self.metrics.profile = {"profiler": "cprofile", "report": text.getvalue()}
+    else:
+      self.metrics.profile = {"profiler": "sampling", **self.profiler.report()}
+
+
+class SamplingProfiler:
+  """Samples the stack of the thread that enabled it from a background
+  thread. Cheaper than cProfile for long requests, but approximate."""
+  def __init__(self, interval : float = 0.001) -> None:
+    self.interval     = interval
+    self.samples      = 0
+    self.self_counts  : Dict[str, int] = collections.Counter()
+    self.total_counts : Dict[str, int] = collections.Counter()
+
+  def enable(self) -> None:
+    self.thread_id = threading.get_ident()
+    self._stopped  = threading.Event()
+    self._thread   = threading.Thread(target = self._run, daemon = True)
+    self._thread.start()
+
+  def disable(self) -> None:
+    self._stopped.set()
+    self._thread.join()
+
+  def _run(self) -> None:
+    while (not self._stopped.wait(self.interval)):
+      frame = sys._current_frames().get(self.thread_id)
+      if (frame is None):
+        continue
+      self.samples += 1
+      self.self_counts[_frame_name(frame)] += 1
+      # Count recursive functions once per sample.
+      names = set()
+      while (frame is not None):
+        names.add(_frame_name(frame))
+        frame = frame.f_back
+      self.total_counts.update(names)
+
+  def report(self, limit : int = PROFILE_LIMIT) -> dict:
+    """Return the functions seen most often on top of and anywhere in the
+    stack, as [function, share of samples] pairs."""
+    samples = max(self.samples, 1)
+    return {"samples":  self.samples,
+            "interval": self.interval,
+            "self":  [[name, round(n / samples, 4)] for name, n in self.self_counts.most_common(limit)],
+            "total": [[name, round(n / samples, 4)] for name, n in self.total_counts.most_common(limit)]}
+
+
+def _frame_name(frame) -> str:
+  code = frame.f_code
+  return "%s:%d(%s)" % (os.path.basename(code.co_filename), code.co_firstlineno, code.co_name)
+
+
+# Sinks every emitted record goes to
+_sinks : List[Callable[[dict], None]] = []
+
+def add_sink(sink : Callable[[dict], None]) -> None:
+  """Send every emitted record to sink, a function of the record."""
+  _sinks.append(sink)
+
+def remove_sink(sink : Callable[[dict], None]) -> None:
+  _sinks.remove(sink)
+
+def has_sinks() -> bool:
+  return bool(_sinks)
+
+
+def log_sink(record : dict) -> None:
+  """Sink that logs every record as one JSON line at INFO."""
+  logger.info(json.dumps(record, sort_keys = True))
+
+
+class JsonLinesSink:
+  """Sink that appends every record to a JSON lines file."""
+  def __init__(self, path : str) -> None:
+    self.path  = path
+    self._lock = threading.Lock()
+
+  def __call__(self, record : dict) -> None:
+    line = json.dumps(record, sort_keys = True) + "\n"
+    with self._lock, open(self.path, "a", encoding = "utf-8") as f:
+      f.write(line)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Scheduling preference profiles.
+
+A profile says what makes a schedule good for one kind of student. It is
+compiled once into lookup tables: a score for every start minute of the week,
+a penalty for every 5-minute slot, coefficients for the relative-time
+features in timeline.py and a weight vector. Scoring a section is then a few
+table lookups and a dot product, however involved the profile.
+
+  get_schedules(["CMSC131", "MATH140"], profile="night_owl")
+  get_schedules(["CMSC131", "MATH140"],
+                profile={"base": "part_time_worker", "day_scores": {"F": -5}})
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import hashlib
+import numpy as np
+from typing import Dict, Iterable, List, Tuple, Union
+from section import (Section, DAY_INDEX, MINUTES_PER_DAY, SLOTS_PER_DAY, SLOTS_PER_HOUR,
+                     START_TIME_SCORE_REFERENCE, get_minutes, get_occupancy_words, sig)
+from timeline import FEATURES, ScheduleTimeline
+from restrictions import check_time
+
+# Relative time is off by default, so default scores don't depend on it.
+DEFAULT_WEIGHTS = {"average_gpa": 10, "start_time": 1, "relative_time": 0}
+MIN_SAMPLING_WEIGHT = 0.01
+
+
+def compile_time_of_day(start_time_scores : Dict[str, float]) -> np.ndarray:
+  """Return the score of starting at every minute of the day.
+
+  Args:
+      start_time_scores (dict[str, float]): Scores at given start times, e.g.
+      {"9:00am": 3, "9:30am": 4}. A start time between two of them gets the
+      score of the earlier one, and one before all of them gets the first.
+
+  Returns:
+      np.ndarray: 1440 scores, indexed by minutes since 12:00am.
+  """
+  anchors = sorted((get_minutes(time), score) for time, score in start_time_scores.items())
+  if (not anchors):
+    return np.zeros(MINUTES_PER_DAY)
+  minutes = np.array([minute for minute, _ in anchors])
+  scores  = np.array([score for _, score in anchors], dtype=float)
+  index = np.searchsorted(minutes, np.arange(MINUTES_PER_DAY), side="right") - 1
+  return scores[np.maximum(index, 0)]
+
+
+class PreferenceProfile:
+  """A set of scheduling preferences, compiled into lookup tables."""
+  def __init__(self, start_time_scores : Dict[str, float] = START_TIME_SCORE_REFERENCE,
+               day_scores : Dict[str, float] = None,
+               blocked_windows : Iterable[Tuple[str, str, str, float]] = (),
+               relative_time : Dict[str, float] = None,
+               weights : Dict[str, float] = None, name : str = "custom") -> None:
+    """Initializes and compiles the profile
+
+    Args:
+        start_time_scores (dict[str, float]): Score of a meeting by its start
+        time, e.g. {"8:00am": 0, "10:00am": 10}. See compile_time_of_day.
+        day_scores (dict[str, float], optional): Score added for every meeting
+        on a day, e.g. {"F": -5} to keep Fridays light.
+        blocked_windows (iterable[tuple[str, str, str, float]]): (day, start,
+        end, penalty per hour) windows the student would rather keep free,
+        e.g. ("M", "5:00pm", "9:00pm", 4). Unlike Restrictions, sections in
+        them are only ranked lower, not removed.
+        relative_time (dict[str, float], optional): Coefficient of each
+        timeline.FEATURES feature in the relative time score, e.g.
+        {"idle_hours": -1, "days_on_campus": -2}. Missing features count 0.
+        weights (dict[str, float], optional): Weight of each score term.
+        Defaults to DEFAULT_WEIGHTS.
+        name (str): Name to show for the profile.
+
+    Raises:
+        ValueError: If a weight is negative or unknown, every weight is 0, a
+        day or feature is unknown, or a field has the wrong type.
+    """
+    if (not isinstance(name, str)):
+      raise ValueError("A profile name must be a string")
+    self.name              = name
+    self.start_time_scores = _check_scores(start_time_scores, "start_time_scores")
+    for time in self.start_time_scores:
+      check_time(time, "start_time_scores")
+    self.day_scores        = _check_scores(day_scores or {}, "day_scores")
+    self.blocked_windows   = _check_windows(blocked_windows)
+    self.relative_time     = _check_scores(relative_time or {}, "relative_time")
+    if (not set(self.relative_time) <= set(FEATURES)):
+      raise ValueError("Unknown relative time feature in " + str(sorted(self.relative_time)))
+    self.weights_dict      = {**DEFAULT_WEIGHTS, **_check_scores(weights or {}, "weights")}
+    if (set(self.weights_dict) != set(DEFAULT_WEIGHTS)):
+      raise ValueError("Unknown weight in " + str(sorted(self.weights_dict)))
+    if (min(self.weights_dict.values()) < 0):
+      # The search bounds assume every term can only add to the score.
+      raise ValueError("Profile weights must not be negative")
+    if (max(self.weights_dict.values()) == 0):
+      # A score of 0 marks an impossible schedule, so nothing would be found.
+      raise ValueError("At least one profile weight must be positive")
+
+    # Score of a meeting by its start, in minutes since 12:00am on Monday
+    day_table = np.zeros(len(DAY_INDEX))
+    for day, score in self.day_scores.items():
+      day_table[_day_index(day)] = score
+    self.meeting_scores = (day_table[:, None] + compile_time_of_day(self.start_time_scores)
+                          [None, :]).ravel()
+    # Penalty for every occupied 5-minute slot of the week
+    self.slot_penalties = np.zeros(len(DAY_INDEX) * SLOTS_PER_DAY)
+    for day, start, end, penalty in self.blocked_windows:
+      offset = _day_index(day) * SLOTS_PER_DAY
+      self.slot_penalties[offset + get_minutes(start) * SLOTS_PER_HOUR // 60:
+                          offset + -(-get_minutes(end) * SLOTS_PER_HOUR // 60)] += \
+        penalty / SLOTS_PER_HOUR
+    self.relative_coefficients = np.array([self.relative_time.get(feature, 0)
+                                           for feature in FEATURES], dtype=float)
+    self.weights = np.array([self.weights_dict[term] for term in DEFAULT_WEIGHTS], dtype=float)
+
+  @classmethod
+  def from_dict(cls, profile_dict : dict) -> 'PreferenceProfile':
+    """Build a profile from request JSON.
+
+    Args:
+        profile_dict (dict): e.g. {"base": "commuter", "day_scores": {"F": -5},
+        "blocked_windows": [["Tu", "4:00pm", "8:00pm", 4]],
+        "start_time_scores": {"9:00am": 0, "11:00am": 10},
+        "relative_time": {"idle_hours": -1}, "weights": {"average_gpa": 5}}. Every key is optional, and what is not
+        given comes from the base profile, "default" unless named.
+
+    Raises:
+        ValueError: If the base profile or a field is unknown.
+
+    Returns:
+        PreferenceProfile: The profile.
+    """
+    unknown = set(profile_dict) - {"base", "start_time_scores", "day_scores",
+                                   "blocked_windows", "relative_time", "weights", "name"}
+    if (unknown):
+      raise ValueError("Unknown profile fields " + str(sorted(unknown)))
+    base = profile_dict.get("base", "default")
+    if (not isinstance(base, str)):
+      raise ValueError("A base profile must be a name")
+    base = get_profile(base)
+    return cls(profile_dict.get("start_time_scores", base.start_time_scores),
+               profile_dict.get("day_scores", base.day_scores),
+               profile_dict.get("blocked_windows", base.blocked_windows),
+               profile_dict.get("relative_time", base.relative_time),
+               {**base.weights_dict, **_check_scores(profile_dict.get("weights", {}), "weights")},
+               profile_dict.get("name", "custom"))
+
+  def get_canonical(self) -> dict:
+    """Return JSON-ready data that is equal for any two profiles that score
+    every schedule the same, e.g. for cache keys."""
+    digest = hashlib.sha256()
+    for table in (self.meeting_scores, self.slot_penalties, self.relative_coefficients,
+                  self.weights):
+      digest.update(table.tobytes())
+    return {"profile": digest.hexdigest()}
+
+  def section_time_scores(self, sections : List[Section]) -> np.ndarray:
+    """Return the time score of every section: the scores of its meetings'
+    start times and days, minus the penalties of the blocked slots it uses."""
+    n_meetings = [len(section.meetings) for section in sections]
+    starts = np.fromiter((start for section in sections for start, _ in section.meetings),
+                         dtype=int, count=sum(n_meetings))
+    # Without any meetings bincount gives ints, which can't take the penalties.
+    scores = np.bincount(np.repeat(np.arange(len(sections)), n_meetings),
+                         weights=self.meeting_scores[starts],
+                         minlength=len(sections)).astype(float)
+    if (self.slot_penalties.any()):
+      bits = np.unpackbits(get_occupancy_words(sections).view(np.uint8), axis=1,
+                           bitorder="little")[:, :len(self.slot_penalties)]
+      scores -= bits @ self.slot_penalties
+    return scores
+
+  def section_weights(self, gpas : np.ndarray, time_scores : np.ndarray) -> np.ndarray:
+    """Return the sampling weight of every section. Time scores can be 
+    negative, so weights are kept positive and every section can still be 
+    sampled."""
+    return np.maximum(sig(gpas) * self.weights[0] + time_scores * self.weights[1],
+                      MIN_SAMPLING_WEIGHT)
+
+  def relative_time_scores(self, features : np.ndarray) -> np.ndarray:
+    """Return the relative time score of schedules from their timeline
+    features, before the sigmoid."""
+    return features @ self.relative_coefficients
+
+  def score_sections(self, schedule : List[Section]) -> float:
+    """Score a possible schedule given as sections."""
+    average_gpa_score = sig(sum([section.gpa for section in schedule]) / len(schedule))
+    start_time_score  = sig(sum(self.section_time_scores(schedule)))
+    score = average_gpa_score * self.weights[0] + start_time_score * self.weights[1]
+    if (self.weights[2]):
+      features = ScheduleTimeline(schedule).features()
+      score += sig(self.relative_time_scores(features)) * self.weights[2]
+    return score
+
+  def __str__(self) -> str:
+    return self.name
+
+
+def _is_number(value) -> bool:
+  return (isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+          and bool(np.isfinite(value)))
+
+
+def _check_scores(scores, name : str) -> Dict[str, float]:
+  """Return a copy of a {name: number} field, checking its types.
+
+  Raises:
+      ValueError: If it is not such a mapping.
+  """
+  if (not isinstance(scores, dict)):
+    raise ValueError("'%s' must be an object" % name)
+  for key, value in scores.items():
+    if (not isinstance(key, str) or not _is_number(value)):
+      raise ValueError("'%s' must map names to numbers, not %r: %r" % (name, key, value))
+  return dict(scores)
+
+
+def _check_windows(windows) -> List[Tuple[str, str, str, float]]:
+  """Return blocked windows as tuples, checking their types.
+
+  Raises:
+      ValueError: If a window is not [day, start, end, penalty].
+  """
+  if (not isinstance(windows, (list, tuple))):
+    raise ValueError("'blocked_windows' must be a list")
+  checked = []
+  for window in windows:
+    if (not isinstance(window, (list, tuple)) or len(window) != 4
+        or not isinstance(window[0], str) or not _is_number(window[3])):
+      raise ValueError("'blocked_windows' must hold [day, start, end, penalty] lists, not %r"
+                       % (window,))
+    check_time(window[1], "blocked_windows")
+    check_time(window[2], "blocked_windows")
+    checked.append(tuple(window))
+  return checked
+
+
+def _day_index(day : str) -> int:
+  if (day not in DAY_INDEX):
+    raise ValueError("Unknown day " + str(day))
+  return DAY_INDEX[day]
+
+
+# Named profiles, from the user profiles we plan for.
+PROFILES : Dict[str, PreferenceProfile] = {
+  "default": PreferenceProfile(name="default"),
+  # Avoids rush hour at both ends of the day, and wants as few, as packed
+  # days on campus as possible.
+  "commuter": PreferenceProfile(
+    {"7:00am": 0, "8:00am": 1, "9:00am": 4, "10:00am": 10, "3:00pm": 8,
+     "4:00pm": 3, "5:00pm": 0},
+    relative_time={"idle_hours": -4, "longest_gap_hours": -2, "back_to_back": 1,
+                   "days_on_campus": -4, "four_day_week": 8},
+    weights={"relative_time": 3}, name="commuter"),
+  # No classes before 11 if it can be helped.
+  "night_owl": PreferenceProfile(
+    {"7:00am": -10, "9:00am": -6, "10:00am": -2, "11:00am": 10, "6:00pm": 8,
+     "8:00pm": 6, "10:00pm": 4}, name="night_owl"),
+  # Doesn't mind when classes start, but keeps weekday evenings for work.
+  "part_time_worker": PreferenceProfile(
+    {"7:00am": 5},
+    blocked_windows=[(day, "4:00pm", "10:00pm", 4) for day in DAY_INDEX],
+    name="part_time_worker"),
+  # Goes to class for the experience: normal hours, and room between classes
+  # instead of running from one to the next.
+  "class_experience": PreferenceProfile(
+    relative_time={"back_to_back": -3, "idle_hours": 1, "longest_gap_hours": -1},
+    weights={"average_gpa": 10, "start_time": 2, "relative_time": 2},
+    name="class_experience"),
+}
+DEFAULT_PROFILE = PROFILES["default"]
+
+
+def get_profile(profile : Union[None, str, dict, PreferenceProfile] = None) -> PreferenceProfile:
+  """Return the profile a request asked for.
+
+  Args:
+      profile (str | dict | PreferenceProfile, optional): Name in PROFILES,
+      request JSON for PreferenceProfile.from_dict, or a profile. None gives
+      the default profile.
+
+  Raises:
+      ValueError: If the profile is unknown or malformed.
+  """
+  if (profile is None):
+    return DEFAULT_PROFILE
+  if (isinstance(profile, PreferenceProfile)):
+    return profile
+  if (isinstance(profile, str)):
+    if (profile not in PROFILES):
+      raise ValueError("Unknown profile " + profile)
+    return PROFILES[profile]
+  if (isinstance(profile, dict)):
+    return PreferenceProfile.from_dict(profile)
+  raise ValueError("A profile must be a name or an object")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Per-request view of the candidate sections. Every algorithm works on flat
+section indices into one SchedulingProblem, so pairwise conflicts are computed
+once per request and then only looked up.
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import numpy as np
+from typing import Iterable, List
+from section import Section, get_occupancy_words, score_schedules
+from preferences import PreferenceProfile, get_profile
+from timeline import meeting_keys, relative_time_features
+from metrics import Metrics, NULL_METRICS
+from conflict_index import get_conflict_index
+
+
+def build_conflict_matrix(sections : List[Section]) -> np.ndarray:
+  """Return the pairwise conflict matrix of a list of sections.
+
+  Args:
+      sections (list[Section]): Sections to compare.
+
+  Returns:
+      np.ndarray: N x N boolean matrix, true where two sections conflict. The
+      diagonal is false.
+  """
+  words = get_occupancy_words(sections)
+  conflicts = (words[:, None, :] & words[None, :, :]).any(axis=2)
+  np.fill_diagonal(conflicts, False)
+  return conflicts
+
+
+class SchedulingProblem:
+  """The candidate sections of one request, flattened and indexed.
+
+  Course c owns the flat section indices in domains[c], so a schedule is a
+  tuple of section indices with one index from every domain.
+  """
+  def __init__(self, classes : List[List[Section]], profile = None,
+               metrics : Metrics = None) -> None:
+    """Flattens the candidate sections and builds the conflict matrix.
+
+    Args:
+        classes (list[list[Section]]): Candidate sections of every course.
+        profile (optional): Preference profile, or its name, to score with.
+        See preferences.get_profile.
+        metrics (Metrics, optional): Where the algorithms and scorer record
+        their counters. Defaults to recording nothing.
+    """
+    self.classes   = classes
+    self.metrics   = metrics or NULL_METRICS
+    self.sections  : List[Section] = []
+    self.domains   : List[np.ndarray] = []
+    for class_sections in classes:
+      first = len(self.sections)
+      self.sections.extend(class_sections)
+      self.domains.append(np.arange(first, len(self.sections)))
+    self.n_courses = len(classes)
+    # Domains are contiguous, so course c owns indices 
+    # domain_starts[c] ... domain_starts[c] + domain_sizes[c] - 1.
+    self.domain_sizes  = np.array([len(class_sections) for class_sections in classes], dtype=int)
+    self.domain_starts = np.cumsum(self.domain_sizes) - self.domain_sizes
+    self.course_of = np.repeat(np.arange(self.n_courses),
+                               [len(class_sections) for class_sections in classes])
+    # Look the conflicts up in the offline index when it covers every section.
+    index = get_conflict_index()
+    self.conflicts = index.conflict_matrix(self.sections) if index is not None else None
+    if (self.conflicts is None):
+      self.conflicts = build_conflict_matrix(self.sections)
+      self.metrics.count("problem.conflict_checks", len(self.sections) ** 2)
+    else:
+      self.metrics.count("problem.conflict_index_hits")
+    self.metrics.count("problem.sections", len(self.sections))
+    # Per-section terms of the score_schedule objective, and their weights.
+    self.profile : PreferenceProfile = get_profile(profile)
+    self.weights           = self.profile.weights
+    self.gpas              = np.array([section.gpa for section in self.sections], dtype=float)
+    self.start_time_scores = self.profile.section_time_scores(self.sections)
+    # Meetings of every section, for the schedule-level relative time score
+    self.meeting_keys = meeting_keys(self.sections)
+
+  def section_weights(self) -> np.ndarray:
+    """Return every section's sampling weight under the profile."""
+    return self.profile.section_weights(self.gpas, self.start_time_scores)
+
+  def score_schedules(self, schedules) -> np.ndarray:
+    """Return the score_schedule score of every schedule in an N x courses
+    array of section indices."""
+    return score_schedules(schedules, self.gpas, self.start_time_scores, self.conflicts,
+                           self.weights, self.relative_time_scores)
+
+  def relative_time_scores(self, schedules) -> np.ndarray:
+    """Return the profile's relative time score of every schedule in an 
+    N x courses array of section indices, before the sigmoid."""
+    return self.profile.relative_time_scores(
+      relative_time_features(schedules, self.meeting_keys))
+
+  def is_feasible(self, schedule : Iterable[int]) -> bool:
+    """Return true if no two sections of the schedule conflict."""
+    indices = list(schedule)
+    return not self.conflicts[np.ix_(indices, indices)].any()
+
+  def to_sections(self, schedule : Iterable[int]) -> List[Section]:
+    """Return the sections of a schedule, in course order."""
+    return [self.sections[i] for i in sorted(schedule)]
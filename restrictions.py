@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Per-request restrictions on which sections may be scheduled. Sections that
+break a restriction are removed from their course before any algorithm runs,
+so no search time is spent on schedules that would be thrown away.
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import re
+from typing import Iterable, List, Sequence, Tuple
+from section import Section, SLOTS_PER_DAY, SLOTS_PER_HOUR, get_minutes
+
+DAYS = ['M', 'Tu', 'W', 'Th', 'F']
+# Keys from_dict accepts
+KEYS = ('blacklist', 'forbidden_windows', 'excluded_instructors', 'no_classes_before',
+        'no_classes_after', 'free_days')
+TIME_PATTERN = re.compile(r"(1[0-2]|0?[1-9]):[0-5][0-9](am|pm)")
+
+
+def check_time(time, name : str = "time") -> str:
+  """Return an AM/PM time, e.g. "10:30am", after checking its format.
+
+  Raises:
+      ValueError: If it is not such a time.
+  """
+  if (not isinstance(time, str) or not TIME_PATTERN.fullmatch(time)):
+    raise ValueError("'%s' must be a time like \"10:30am\", not %r" % (name, time))
+  return time
+
+
+def _check_list(value, name : str, length : int = None) -> list:
+  """Return a list of strings, or of length-string lists, from request JSON.
+
+  Raises:
+      ValueError: If it has another shape.
+  """
+  if (not isinstance(value, (list, tuple))):
+    raise ValueError("'%s' must be a list" % name)
+  for item in value:
+    if (length is None):
+      if (not isinstance(item, str)):
+        raise ValueError("'%s' must be a list of strings" % name)
+    elif (not isinstance(item, (list, tuple)) or len(item) != length
+          or not all(isinstance(part, str) for part in item)):
+      raise ValueError("'%s' must be a list of %d-string lists" % (name, length))
+  return list(value)
+
+
+class Restrictions:
+  """Hard constraints of one request: blacklisted sections, forbidden time
+  windows and excluded instructors.
+  """
+  def __init__(self, blacklisted_sections : Iterable[Tuple[str, str]] = (),
+               forbidden_windows : Iterable[Tuple[str, str, str]] = (),
+               excluded_instructors : Iterable[str] = ()) -> None:
+    """Initializes the restrictions
+
+    Args:
+        blacklisted_sections (iterable[tuple[str, str]]): (class_name,
+        section_num) pairs to never schedule, e.g. ("CMSC131", "FC05").
+        forbidden_windows (iterable[tuple[str, str, str]]): (day, start, end)
+        windows that must stay free, e.g. ("F", "12:00am", "11:59pm").
+        excluded_instructors (iterable[str]): Instructors to avoid.
+    """
+    self.blacklisted_sections = {tuple(section) for section in blacklisted_sections}
+    self.excluded_instructors = set(excluded_instructors)
+    self.forbidden_windows    : List[Tuple[str, str, str]] = []
+    self.forbidden_occupancy  = 0
+    for day, start, end in forbidden_windows:
+      self.forbid(day, start, end)
+
+  @classmethod
+  def from_dict(cls, restrictions_dict : dict) -> 'Restrictions':
+    """Build restrictions from request JSON.
+
+    Args:
+        restrictions_dict (dict): e.g. {"blacklist": [["CMSC131", "FC05"]],
+        "no_classes_before": "10:00am", "no_classes_after": "6:00pm",
+        "free_days": ["F"], "forbidden_windows": [["M", "12:00pm", "1:00pm"]],
+        "excluded_instructors": ["Jane Doe"]}. Every key is optional.
+
+    Raises:
+        ValueError: If a key is unknown or a value has the wrong shape.
+
+    Returns:
+        Restrictions: The restrictions.
+    """
+    if (not isinstance(restrictions_dict, dict)):
+      raise ValueError("Restrictions must be an object")
+    unknown = set(restrictions_dict) - set(KEYS)
+    if (unknown):
+      raise ValueError("Unknown restrictions " + ", ".join(sorted(map(str, unknown))))
+    restrictions = cls(_check_list(restrictions_dict.get('blacklist', ()), 'blacklist', 2),
+                       _check_list(restrictions_dict.get('forbidden_windows', ()),
+                                   'forbidden_windows', 3),
+                       _check_list(restrictions_dict.get('excluded_instructors', ()),
+                                   'excluded_instructors'))
+    if ('no_classes_before' in restrictions_dict):
+      restrictions.forbid_before(check_time(restrictions_dict['no_classes_before'],
+                                            'no_classes_before'))
+    if ('no_classes_after' in restrictions_dict):
+      restrictions.forbid_after(check_time(restrictions_dict['no_classes_after'],
+                                           'no_classes_after'))
+    for day in _check_list(restrictions_dict.get('free_days', ()), 'free_days'):
+      restrictions.forbid(day, "12:00am", "11:59pm")
+    return restrictions
+
+  def get_canonical(self) -> dict:
+    """Return JSON-ready data that is equal for any two restrictions that 
+    allow exactly the same sections, e.g. for cache keys."""
+    return {"blacklist": sorted([list(section) for section in self.blacklisted_sections]),
+            "forbidden_occupancy": hex(self.forbidden_occupancy),
+            "excluded_instructors": sorted(self.excluded_instructors)}
+
+  def forbid(self, day : str, start : str, end : str) -> 'Restrictions':
+    """Keep a window free, e.g. forbid("F", "12:00am", "11:59pm").
+
+    Raises:
+        ValueError: If the day or a time is malformed.
+    """
+    if (day not in DAYS):
+      raise ValueError("Day must be one of " + ", ".join(DAYS) + ", not %r" % (day,))
+    check_time(start, "start")
+    check_time(end, "end")
+    day_index = DAYS.index(day)
+    start_slot = day_index * SLOTS_PER_DAY + get_minutes(start) * SLOTS_PER_HOUR // 60
+    # Round the end up so a partially covered slot counts as forbidden.
+    end_slot = day_index * SLOTS_PER_DAY + -(-get_minutes(end) * SLOTS_PER_HOUR // 60)
+    if (end_slot > start_slot):
+      self.forbidden_occupancy |= ((1 << (end_slot - start_slot)) - 1) << start_slot
+    self.forbidden_windows.append((day, start, end))
+    return self
+
+  def forbid_before(self, time : str, days : Sequence[str] = DAYS) -> 'Restrictions':
+    """Forbid classes starting before a time, e.g. forbid_before("10:00am")."""
+    for day in days:
+      self.forbid(day, "12:00am", time)
+    return self
+
+  def forbid_after(self, time : str, days : Sequence[str] = DAYS) -> 'Restrictions':
+    """Forbid classes running past a time, e.g. forbid_after("6:00pm")."""
+    for day in days:
+      self.forbid(day, time, "11:59pm")
+    return self
+
+  def allows(self, section : Section) -> bool:
+    """Return true if the section can be scheduled under these restrictions."""
+    return ((section.class_name, section.section_num) not in self.blacklisted_sections
+            and not (section.occupancy & self.forbidden_occupancy)
+            and self.excluded_instructors.isdisjoint(section.instructors))
+
+  def filter_sections(self, class_name : str, sections : Iterable[Section]) -> List[Section]:
+    """Return the sections of a course that these restrictions allow.
+
+    Raises:
+        ValueError: If no section of the course is allowed.
+    """
+    allowed = [section for section in sections if self.allows(section)]
+    if (len(allowed) == 0):
+      raise ValueError("No section of " + class_name + " satisfies the restrictions")
+    return allowed
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Result cache in front of get_schedules.
+
+Requests are keyed on the sorted course set, the canonical form of every
+other get_schedules argument and the catalog version, so a new catalog never
+serves stale schedules. The version is the catalog backend's get_version: the
+hash of the JSON dump, which a compiled catalog is checked against, or the
+"#version" item of a key-value catalog. Results live in a bounded in-memory LRU with a TTL and
+optionally in an SQLite file that survives worker restarts.
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from catalog import get_catalog
+from encoding import reorder
+
+
+def canonicalize(value):
+  """Return a JSON-ready canonical form of a get_schedules argument. Objects
+  such as Restrictions provide their own through get_canonical."""
+  if (hasattr(value, "get_canonical")):
+    return canonicalize(value.get_canonical())
+  if (isinstance(value, dict)):
+    return {str(key): canonicalize(value[key]) for key in sorted(value)}
+  if (isinstance(value, (list, tuple))):
+    return [canonicalize(item) for item in value]
+  if (isinstance(value, (set, frozenset))):
+    return sorted([canonicalize(item) for item in value], key = json.dumps)
+  return value
+
+
+class ScheduleCache:
+  """LRU + TTL cache of get_schedules results with an optional SQLite tier."""
+  def __init__(self, max_entries : int = 1024, ttl : float = 3600.0,
+               db_path : Optional[str] = None,
+               get_version : Callable[[], str] = None) -> None:
+    """Initializes the cache
+
+    Args:
+        max_entries (int): Most results kept in memory.
+        ttl (float): Seconds a result stays valid, in both tiers.
+        db_path (str, optional): SQLite file for the persistent tier. None
+        keeps the cache in memory only.
+        get_version (callable, optional): Returns the current catalog
+        version. Defaults to the process-wide catalog's.
+    """
+    self.max_entries = max_entries
+    self.ttl         = ttl
+    self.get_version = get_version or (lambda: get_catalog().get_version())
+    self.hits        = 0
+    self.misses      = 0
+    self.disk_hits   = 0
+    self.evictions   = 0
+    self.uncached    = 0  # results not cached because their search was cut short
+    self._memory     : "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, json)
+    self._version    = None
+    self._lock       = threading.Lock()
+    self._db         = None
+    if (db_path is not None):
+      self._db = sqlite3.connect(db_path, check_same_thread = False)
+      self._db.execute("CREATE TABLE IF NOT EXISTS schedules (key TEXT PRIMARY KEY, "
+                       "catalog_version TEXT, expires_at REAL, value TEXT)")
+      self._db.commit()
+
+  def get_key(self, input_classes : List[str], **kwargs) -> str:
+    """Return the cache key of a get_schedules request. The time budget,
+    patience and metrics are left out, since they change how long a request
+    may take and what is recorded about it, but not what was asked for. Only
+    results whose search finished are cached, so a key never holds a result
+    cut short by them."""
+    kwargs.pop("time_budget", None)
+    kwargs.pop("patience", None)
+    kwargs.pop("metrics", None)
+    request = {"courses": sorted(input_classes), "catalog": self._version,
+               "arguments": canonicalize(kwargs)}
+    return hashlib.sha256(json.dumps(request, sort_keys = True).encode()).hexdigest()
+
+  def get_schedules(self, input_classes : List[str], return_stop_reason : bool = False,
+                    **kwargs):
+    """get_schedules, served from the cache when possible.
+
+    Args:
+        input_classes (list[str]): Course IDs, e.g. ["CMSC132", "MATH141"].
+        return_stop_reason (bool): Also return why the search stopped, as
+        get_schedules does. Cached results are always "finished".
+        **kwargs: Any other get_schedules arguments.
+
+    Returns:
+        The same value get_schedules returns.
+    """
+    from scheduler import get_schedules
+    self._check_version()
+    key = self.get_key(input_classes, **kwargs)
+
+    value = self._get(key)
+    if (kwargs.get("metrics") is not None):
+      kwargs["metrics"].count("cache.misses" if value is None else "cache.hits")
+    if (value is None):
+      # Compute in sorted course order, so every ordering of the same courses
+      # can share one entry.
+      schedules, stop_reason = get_schedules(sorted(input_classes), return_stop_reason = True,
+                                             **kwargs)
+      # A search cut short by its deadline or patience may have missed
+      # schedules a later request with more time would find.
+      if (stop_reason == "finished"):
+        self._put(key, json.dumps(schedules))
+      else:
+        with self._lock:
+          self.uncached += 1
+    else:
+      schedules, stop_reason = json.loads(value), "finished"
+    if (return_stop_reason):
+      return reorder(schedules, input_classes), stop_reason
+    return reorder(schedules, input_classes)
+
+  def stats(self) -> dict:
+    """Return the hit and miss counters."""
+    with self._lock:
+      return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+              "evictions": self.evictions, "uncached": self.uncached,
+              "entries": len(self._memory)}
+
+  def clear(self) -> None:
+    """Drop every cached result, in both tiers."""
+    with self._lock:
+      self._memory.clear()
+      if (self._db is not None):
+        self._db.execute("DELETE FROM schedules")
+        self._db.commit()
+
+  def _check_version(self) -> None:
+    """Drop everything cached for an older catalog."""
+    version = self.get_version()
+    if (version != self._version):
+      with self._lock:
+        self._memory.clear()
+        if (self._db is not None):
+          self._db.execute("DELETE FROM schedules WHERE catalog_version != ?", (version,))
+          self._db.commit()
+        self._version = version
+
+  def _get(self, key : str) -> Optional[str]:
+    now = time.time()
+    with self._lock:
+      entry = self._memory.get(key)
+      if (entry is not None):
+        if (entry[0] > now):
+          self._memory.move_to_end(key)
+          self.hits += 1
+          return entry[1]
+        del self._memory[key]
+
+      if (self._db is not None):
+        row = self._db.execute("SELECT expires_at, value FROM schedules WHERE key = ?",
+                               (key,)).fetchone()
+        if (row is not None and row[0] > now):
+          self._remember(key, row[0], row[1])
+          self.hits += 1
+          self.disk_hits += 1
+          return row[1]
+
+      self.misses += 1
+      return None
+
+  def _put(self, key : str, value : str) -> None:
+    expires_at = time.time() + self.ttl
+    with self._lock:
+      self._remember(key, expires_at, value)
+      if (self._db is not None):
+        self._db.execute("INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?)",
+                         (key, self._version, expires_at, value))
+        self._db.execute("DELETE FROM schedules WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+  def _remember(self, key : str, expires_at : float, value : str) -> None:
+    """Add to the in-memory tier, evicting the least recently used entry."""
+    self._memory[key] = (expires_at, value)
+    self._memory.move_to_end(key)
+    while (len(self._memory) > self.max_entries):
+      self._memory.popitem(last = False)
+      self.evictions += 1
+
+
+_schedule_cache : ScheduleCache = None
+_schedule_cache_lock = threading.Lock()
+
+def get_schedule_cache() -> ScheduleCache:
+  """Return the process-wide, memory-only schedule cache."""
+  global _schedule_cache
+  if (_schedule_cache is None):
+    with _schedule_cache_lock:
+      if (_schedule_cache is None):
+        _schedule_cache = ScheduleCache()
+  return _schedule_cache
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
-"""Auto-generate UMD schedules. The algorithm is O(n), but it is sampled-based
-and thus not exact. Code is written for the ScheduleTerp website.
+"""Auto-generate UMD schedules. get_schedules samples schedules by default,
+which is fast but not exact; "csp" finds the exact best schedules, and "auto"
+picks an algorithm by problem size and profile. See
+scheduling_algorithms/solver.py. Code is written for the ScheduleTerp website.
 """
 
 __author__     = "Oliver Villegas, Jaxon Lee"
@@ -12,54 +14,98 @@ __maintainer__ = "Oliver Villegas, Jaxon Lee"
 __email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
 __status__     = "Development"
 
-import json
 import numpy as np
 from typing import List
-from section import Section, score_and_sort_schedules
-from scheduling_algorithms.sampling_based_alg import sampling_based_method
-from scheduling_algorithms.genetic_alg import genetic_method
-
-def constraint_satisfaction_problem_method(classes: List[List[Section]]):
-  pass
-
-
-def process_input(class_strings : List[str], restrictions : List[str] = None):
+from catalog import get_catalog
+from metrics import Metrics, NULL_METRICS
+from section import Section
+from problem import SchedulingProblem
+from restrictions import Restrictions
+from encoding import ENCODINGS, encode_schedules
+from scheduling_algorithms.solver import STRATEGIES, solve
+
+# Algorithms selectable through get_schedules, besides "auto". See 
+# scheduling_algorithms/solver.py for the interface they share.
+ALGORITHMS = STRATEGIES
+
+
+def process_input(class_strings : List[str], restrictions : Restrictions = None):
+  """Return the candidate sections of every requested class.
+
+  Args:
+      class_strings (list[str]): Course IDs, e.g. ["CMSC132", "MATH141"].
+      restrictions (Restrictions, optional): Sections that break these are 
+      left out.
+
+  Raises:
+      ValueError: If a class has no section left after applying restrictions.
+  """
+  # get_catalog().get_sections('AASP380')
+  # (Section(AASP380 0101 3.28 ["W 4:00pm-5:45pm", " -"]), ...)
+  # Sections are shared across requests, so never modify them here.
+  # One lookup for every class, a single batched read on remote catalogs.
+  class_sections = get_catalog().get_many(class_strings)
   result = []
-  classes = []
-  grades  = []
-  average_gpas = []
-  
-  data = {}
-  with open("./custom_data_dump_3.json", "r") as f:
-    data = json.load(f)
-
   for one_class in class_strings:
-    # data['AASP380']
-    # [{"section_num": "0101", "gpa": 3.28, "lectures": ["W 4:00pm-5:45pm", " -"], "discussions": []}, ..., {...}]
-    # data['AASP380'][0]
-    # {"section_num": "0101", "gpa": 3.28, "lectures": ["W 4:00pm-5:45pm", " -"], "discussions": []}
-    # data['AASP380'][0]['section_num']
-    # "0101"
-    section_list = []
-    
-    for section_dict in data[one_class]:
-      section_list.append(Section(section_dict, one_class))
-    
-    result.append(section_list)  
+    sections = class_sections[one_class]
+    if (restrictions is not None):
+      sections = restrictions.filter_sections(one_class, sections)
+    result.append(list(sections))
     
   return result
   
 
 # JET -- CALL THIS FUNCTION FROM THE FRONT END
-def get_schedules(input_classes : List[str]):
-  classes = process_input(input_classes)
-  # all_schedules = genetic_method(classes)
-  all_schedules = sampling_based_method(classes)
-  all_schedules = score_and_sort_schedules(all_schedules)
-  string_schedules = [[section.get_data() for section in schedule] for schedule in all_schedules]  # Array of schedules, which is an array of section objects
+def get_schedules(input_classes : List[str], algorithm : str = "sampling",
+                  limit : int = 20, restrictions : Restrictions = None,
+                  time_budget : float = None, profile = None, metrics : Metrics = None,
+                  patience : float = None, encoding : str = "verbose",
+                  return_stop_reason : bool = False):
+  """Return the best schedules for the requested classes, best first.
+
+  Args:
+      input_classes (list[str]): Course IDs, e.g. ["CMSC132", "MATH141"].
+      algorithm (str): Name of the algorithm in ALGORITHMS to run, or "auto"
+      to pick one by problem size.
+      limit (int): Maximum number of schedules to return.
+      restrictions (Restrictions, optional): Blacklisted sections, forbidden 
+      times and excluded instructors for this request.
+      time_budget (float, optional): Seconds the algorithm may search for. The
+      best schedules found by then are returned.
+      profile (str | dict | PreferenceProfile, optional): Preferences to rank
+      schedules by, e.g. "commuter". See preferences.get_profile.
+      metrics (Metrics, optional): Records stage timings and counters of 
+      this request, and profiles it if asked to.
+      patience (float, optional): Stop early once the best schedules have 
+      not improved for this many seconds.
+      encoding (str): "verbose" for a list of schedules, each a list of 
+      section dicts, or "compact" to list every section once. See encoding.py.
+      return_stop_reason (bool): Also return why the search stopped: 
+      "finished", or "deadline" or "converged" if it was cut short. See 
+      scheduling_algorithms/solver.py.
+  """
+  if (encoding not in ENCODINGS):
+    raise ValueError("Unknown encoding " + str(encoding))
+  metrics = metrics or NULL_METRICS
+  with metrics.profiling():
+    with metrics.timer("process_input"):
+      classes = process_input(input_classes, restrictions)
+    # Conflicts between every pair of candidate sections, computed once and 
+    # shared by the algorithm and the scorer.
+    with metrics.timer("build_problem"):
+      problem = SchedulingProblem(classes, profile, metrics)
+    # Schedules stream straight from the algorithm into a bounded top-k heap,
+    # so the search time includes the scoring time.
+    with metrics.timer("search"):
+      result = solve(problem, algorithm, limit, time_budget, patience)
+      top_schedules = result.schedules
+    with metrics.timer("serialize"):
+      string_schedules = encode_schedules(problem, top_schedules, encoding)
   
   # TODO return some sort of formatted data that works well with the 
   # calendar library
+  if (return_stop_reason):
+    return string_schedules, result.stop_reason
   return string_schedules
 
 
@@ -79,7 +125,7 @@ DONE- Blacklist unwanted sections
 # Beta version
 -3. Create variants: exact (CSP), Gibbs Sampling, Genetic, Annealing
 DONE- -2. Increase API call efficiency
-  -1.5. Change json so that lectures are always array, add departmental GPA fallback, add restrictions
+DONE-  -1.5. Change json so that lectures are always array, add departmental GPA fallback, add restrictions
 -1. Send algorithm to Professor Childs / Professor Mount to see if we can write an academic paper on it
   -0.5. Create variants: exact (CSP), Gibbs Sampling, Genetic, Annealing, Integer Linear Programming
 0. Draw out front-end using wireframing software
@@ -10,8 +10,159 @@ __maintainer__ = "Oliver Villegas, Jaxon Lee"
 __email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
 __status__     = "Development"
 
-from section import Section
-from typing import List
+from problem import SchedulingProblem
+from timeline import ScheduleTimeline
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+import heapq
+import itertools
+import math
+import random
+import time
+import numpy as np
 
-def annealing_method(classes: List[List[Section]]):
-  pass
+# Temperature at a given fraction of the way through a run, given the initial
+# and final temperatures.
+COOLING_SCHEDULES = {
+  "geometric": lambda fraction, initial, final: initial * (final / initial) ** fraction,
+  "linear":    lambda fraction, initial, final: initial + (final - initial) * fraction,
+}
+
+def annealing_method(problem : SchedulingProblem, k : int = 20, moves : int = 20000,
+                     restarts : Optional[int] = 4, initial_temperature : float = 0.05,
+                     final_temperature : float = 0.0001,
+                     cooling : Union[str, Callable[[float, float, float], float]] = "geometric",
+                     conflict_penalty : float = 1.0, seed : int = None,
+                     time_budget : float = None,
+                     stop : Callable[[], bool] = None) -> Iterator[Tuple[int, ...]]:
+  """Simulated annealing over complete schedules.
+
+  A move swaps one course's section for another section of the same course.
+  The schedule keeps running GPA and start time score sums and, for every 
+  candidate section, how many scheduled sections it conflicts with. The change
+  in score and in the number of conflicts of a move is then a handful of 
+  lookups instead of a call to score_schedule. When the profile scores 
+  relative time, a ScheduleTimeline is kept too, and a move only rescans the
+  days the two swapped sections meet on. Schedules with conflicts are
+  allowed while searching, at conflict_penalty per conflicting pair.
+
+  Args:
+      problem (SchedulingProblem): The request to solve.
+      k (int): Number of schedules to return.
+      moves (int): Moves per restart.
+      restarts (int, optional): Number of runs, each from a new random 
+      schedule. None keeps restarting until the time budget or stop ends the
+      search.
+      initial_temperature (float): Temperature at the start of a run.
+      final_temperature (float): Temperature at the end of a run.
+      cooling (str | callable): Name in COOLING_SCHEDULES, or a function of
+      (fraction of run done, initial temperature, final temperature).
+      conflict_penalty (float): Score lost per conflicting pair of sections.
+      seed (int, optional): Seed for reproducible runs.
+      time_budget (float, optional): Stop after this many seconds.
+      stop (callable, optional): Checked along with the time budget; the 
+      search ends early once it returns true.
+
+  Yields:
+      tuple[int]: Distinct possible schedules as section indices in course 
+      order, each as soon as it is among the k best visited so far.
+  """
+  n_courses = problem.n_courses
+  if (n_courses == 0 or not problem.domain_sizes.all()):
+    return
+  rng = random.Random(seed)
+  temperature = COOLING_SCHEDULES[cooling] if isinstance(cooling, str) else cooling
+  deadline = None if time_budget is None else time.perf_counter() + time_budget
+  
+  conflicts     = problem.conflicts.astype(np.int64)
+  gpas          = problem.gpas.tolist()
+  start_times   = problem.start_time_scores.tolist()
+  gpa_weight, start_time_weight, relative_time_weight = problem.weights.tolist()
+  sections      = problem.sections
+  domain_starts = problem.domain_starts.tolist()
+  domain_sizes  = problem.domain_sizes.tolist()
+  movable       = [c for c in range(n_courses) if domain_sizes[c] > 1]
+  
+  def objective(gpa_sum : float, start_time_sum : float, timeline : ScheduleTimeline) -> float:
+    # score_schedule of a possible schedule, from its running sums
+    score = (gpa_weight / (1 + math.exp(-gpa_sum / n_courses / 10)) 
+             + start_time_weight / (1 + math.exp(-start_time_sum / 10)))
+    if (relative_time_weight):
+      relative_time_score = float(problem.profile.relative_time_scores(timeline.features()))
+      score += relative_time_weight / (1 + math.exp(-relative_time_score / 10))
+    return score
+  
+  best : List[Tuple[float, Tuple[int, ...]]] = []  # min-heap of the k best
+  in_best = set()
+  def visit(score : float, assignment : List[int]) -> bool:
+    """Returns true if the schedule is new among the k best."""
+    if (len(best) < k or score > best[0][0]):
+      schedule = tuple(assignment)
+      if (schedule in in_best):
+        return False
+      in_best.add(schedule)
+      if (len(best) < k):
+        heapq.heappush(best, (score, schedule))
+      else:
+        in_best.discard(heapq.heapreplace(best, (score, schedule))[1])
+      return True
+    return False
+  
+  out_of_time = False
+  restarts_run = moves_run = accepted = 0
+  try:
+    for restart in (itertools.count() if restarts is None else range(restarts)):
+      if (out_of_time or k <= 0 
+          or (deadline is not None and time.perf_counter() >= deadline)
+          or (stop is not None and stop())):
+        break
+      restarts_run += 1
+      assignment = [domain_starts[c] + rng.randrange(domain_sizes[c]) for c in range(n_courses)]
+      # hits[x]: number of scheduled sections that section x conflicts with
+      hits = conflicts[assignment].sum(axis = 0)
+      n_conflicts = int(hits[assignment].sum()) // 2
+      gpa_sum = sum([gpas[x] for x in assignment])
+      start_time_sum = sum([start_times[x] for x in assignment])
+      timeline = (ScheduleTimeline([sections[x] for x in assignment]) 
+                  if relative_time_weight else None)
+      score = objective(gpa_sum, start_time_sum, timeline)
+      if (n_conflicts == 0 and visit(score, assignment)):
+        yield tuple(assignment)
+    
+      for step in range(moves if movable else 0):
+        if (step % 256 == 0 and ((deadline is not None and time.perf_counter() >= deadline) 
+                                 or (stop is not None and stop()))):
+          out_of_time = True
+          break
+        moves_run += 1
+        # Propose a different section for one course
+        course = rng.choice(movable)
+        old = assignment[course]
+        new = domain_starts[course] + rng.randrange(domain_sizes[course] - 1)
+        if (new >= old):
+          new += 1
+      
+        # The old section is still in hits, so don't count a conflict with it.
+        new_conflicts = n_conflicts - int(hits[old]) + int(hits[new]) - int(conflicts[new, old])
+        new_gpa_sum = gpa_sum - gpas[old] + gpas[new]
+        new_start_time_sum = start_time_sum - start_times[old] + start_times[new]
+        if (timeline is not None):
+          timeline.replace(sections[old], sections[new])
+        new_score = objective(new_gpa_sum, new_start_time_sum, timeline)
+        delta = (new_score - score) - conflict_penalty * (new_conflicts - n_conflicts)
+      
+        if (delta < 0 and rng.random() >= math.exp(delta / temperature(
+            step / moves, initial_temperature, final_temperature))):
+          if (timeline is not None):
+            timeline.replace(sections[new], sections[old])
+          continue
+        accepted += 1
+        assignment[course] = new
+        hits += conflicts[new] - conflicts[old]
+        n_conflicts, gpa_sum, start_time_sum, score = (new_conflicts, new_gpa_sum, 
+                                                       new_start_time_sum, new_score)
+        if (n_conflicts == 0 and visit(score, assignment)):
+          yield tuple(assignment)
+  finally:
+    problem.metrics.add({"annealing.restarts": restarts_run, "annealing.moves": moves_run,
+                         "annealing.accepted": accepted, "annealing.rejected": moves_run - accepted,
+                         "annealing.stopped_early": int(out_of_time)})
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Exact branch-and-bound approach for finding the best college schedules.
+"""
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+from section import sig
+from problem import SchedulingProblem
+from typing import Callable, Dict, Iterator, List, Tuple
+import heapq
+import time
+import numpy as np
+
+def constraint_satisfaction_problem_method(problem : SchedulingProblem, k : int = 20,
+                                           time_budget : float = None,
+                                           stop : Callable[[], bool] = None
+                                           ) -> Iterator[Tuple[int, ...]]:
+  """Find the k best schedules exactly, by depth-first branch and bound.
+
+  Courses are assigned fewest-remaining-sections first, and every assignment
+  removes the conflicting sections from the other courses' domains (forward
+  checking). The score_schedule objective only grows with the GPA sum and the
+  start time score sum, so taking the best remaining section of every 
+  unassigned course gives an upper bound. Branches whose bound can't beat the 
+  current k-th best schedule are pruned.
+
+  Args:
+      problem (SchedulingProblem): The request to solve.
+      k (int): Number of schedules to return.
+      time_budget (float, optional): Stop searching after this many seconds,
+      after which the schedules found so far are not guaranteed to be optimal.
+      stop (callable, optional): Checked along with the time budget; the 
+      search ends early once it returns true.
+
+  Yields:
+      tuple[int]: Schedules as section indices in course order, each as soon
+      as it is among the k best found so far. The k best schedules are among
+      them, so a top-k selector over the stream gets the exact answer.
+  """
+  n_courses   = problem.n_courses
+  gpas        = problem.gpas
+  start_times = problem.start_time_scores
+  gpa_weight, start_time_weight, relative_time_weight = problem.weights
+  conflicts   = problem.conflicts
+  best : List[Tuple[float, Tuple[int, ...]]] = []  # min-heap of the k best
+  assignment  = [0] * n_courses
+  deadline    = None if time_budget is None else time.perf_counter() + time_budget
+  nodes = pruned = dead_ends = conflict_checks = 0
+  
+  def search(domains : Dict[int, np.ndarray], gpa_sum : float, start_time_sum : float):
+    """Yields schedules that enter the k best. Returns false once the time 
+    budget runs out."""
+    nonlocal nodes, pruned, dead_ends, conflict_checks
+    if ((deadline is not None and time.perf_counter() >= deadline) 
+        or (stop is not None and stop())):
+      return False
+    nodes += 1
+    if (not domains):
+      score = gpa_weight * sig(gpa_sum / n_courses) + start_time_weight * sig(start_time_sum)
+      if (relative_time_weight):
+        score += relative_time_weight * sig(problem.relative_time_scores([assignment])[0])
+      entry = (float(score), tuple(assignment))
+      if (len(best) < k):
+        heapq.heappush(best, entry)
+      elif (entry[0] > best[0][0]):
+        heapq.heapreplace(best, entry)
+      else:
+        return True
+      yield entry[1]
+      return True
+    
+    # Branch on the course with the fewest sections left.
+    course = min(domains, key = lambda c: len(domains[c]))
+    candidates = domains[course]
+    others = [c for c in domains if c != course]
+    others_gpa        = sum([gpas[domains[c]].max() for c in others])
+    others_start_time = sum([start_times[domains[c]].max() for c in others])
+    bounds = (gpa_weight * sig((gpa_sum + gpas[candidates] + others_gpa) / n_courses) 
+              + start_time_weight * sig(start_time_sum + start_times[candidates] + others_start_time)
+              # The relative time term depends on the whole schedule; a 
+              # sigmoid is at most 1.
+              + relative_time_weight)
+    
+    # Most promising sections first, so the k-th best rises quickly.
+    for position, i in enumerate(np.argsort(-bounds, kind = "stable")):
+      if (len(best) == k and bounds[i] <= best[0][0]):
+        # This and every later candidate in bound order are pruned.
+        pruned += len(candidates) - position
+        break
+      section = candidates[i]
+      remaining = {}
+      for c in others:
+        domain = domains[c][~conflicts[section, domains[c]]]
+        conflict_checks += len(domains[c])
+        if (len(domain) == 0):
+          dead_ends += 1
+          break
+        remaining[c] = domain
+      else:
+        assignment[course] = int(section)
+        if (not (yield from search(remaining, gpa_sum + gpas[section], 
+                                   start_time_sum + start_times[section]))):
+          return False
+    return True
+  
+  finished = True
+  try:
+    if (n_courses > 0 and k > 0):
+      finished = yield from search(dict(enumerate(problem.domains)), 0.0, 0.0)
+  finally:
+    problem.metrics.add({"csp.nodes": nodes, "csp.pruned": pruned, "csp.dead_ends": dead_ends,
+                         "csp.conflict_checks": conflict_checks,
+                         "csp.stopped_early": int(not finished)})
@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 """Genetic algorithm for finding optimal college schedules.
+
+A chromosome is one row of a population array, holding one section index per
+course. Selection, crossover and mutation act on the whole population array 
+at once, and fitness comes from the batch scorer.
 """
 __author__     = "Oliver Villegas, Jaxon Lee"
 __copyright__  = "Copyright 2023"
@@ -10,173 +14,150 @@ __maintainer__ = "Oliver Villegas, Jaxon Lee"
 __email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
 __status__     = "Development"
 
-from section import Section, score_schedule
-from .sampling_based_alg import sampling_based_method
-from typing import List
-import random
-import json
-
-data = {}
-with open("./custom_data_dump_3.json", "r") as f:
-  data = json.load(f)
-  
-def get_random_section(section_to_replace : Section):
-  random_section = Section(random.choice(data[section_to_replace.class_name]), section_to_replace.class_name)
-  
-  return random_section
-
+from problem import SchedulingProblem
+from typing import Callable, Iterator, Optional, Tuple
+import itertools
+import time
+import numpy as np
 
-def genetic_method(classes: List[List[Section]]):
-  """_summary_
+def genetic_method(problem : SchedulingProblem, population_size : int = 1000,
+                   generations : Optional[int] = 50, mutation_rate : float = 0.1,
+                   tournament_size : int = 4, elite_size : int = 10,
+                   seed : int = None, time_budget : float = None, k : int = 20,
+                   stop : Callable[[], bool] = None) -> Iterator[Tuple[int, ...]]:
+  """Evolve a population of schedules and yield the possible ones it finds.
 
   Args:
-      classes (list[list[Section]]): _description_
-
-  Returns:
-      _type_: _description_
+      problem (SchedulingProblem): The request to solve.
+      population_size (int): Number of schedules in every generation.
+      generations (int, optional): Number of generations to run. None runs
+      until the time budget or stop ends the search.
+      mutation_rate (float): Chance of replacing each course's section.
+      tournament_size (int): Number of schedules competing in each selection.
+      elite_size (int): Number of best schedules copied unchanged into the 
+      next generation.
+      seed (int, optional): Seed for reproducible runs.
+      time_budget (float, optional): Stop evolving after this many seconds.
+      k (int): Schedules wanted. Every possible schedule of every generation
+      is yielded, so this only keeps the interface the same as the other
+      algorithms'.
+      stop (callable, optional): Checked after every generation; evolution 
+      ends early once it returns true.
+
+  Yields:
+      tuple[int]: Possible schedules as section indices in course order, one
+      generation at a time.
   """
-  POPULATION_SIZE = 100
-  GENERATIONS = 10
-  MUTATION_RATE = 0.1
+  if (problem.n_courses == 0 or population_size <= 0 or not problem.domain_sizes.all()):
+    return
+  rng = np.random.default_rng(seed)
+  deadline = None if time_budget is None else time.perf_counter() + time_budget
+  elite_size = min(elite_size, population_size)
   
   # Generate an initial population of schedules
-  population = generate_initial_population(classes, POPULATION_SIZE)
+  population = generate_initial_population(problem, population_size, rng)
+  generations_run = 0
   
-  for generation in range(GENERATIONS):
+  try:
+    for generation in (itertools.count() if generations is None else range(generations + 1)):
       # Evaluate the fitness of each schedule in the population
-      fitness_scores = evaluate_fitness(population)
+      scores, fitness_scores = evaluate_fitness(population, problem)
+      generations_run += 1
+      yield from unique_possible_schedules(population, scores)
+      if (generation == generations or 
+          (deadline is not None and time.perf_counter() >= deadline) or
+          (stop is not None and stop())):
+        break
+      
+      # Keep the best schedules as they are
+      elite = population[np.argsort(-fitness_scores, kind = "stable")[:elite_size]]
       
       # Perform selection to choose parents for crossover
-      parents = selection(population, fitness_scores)
+      parents = selection(population, fitness_scores, rng, tournament_size)
       
       # Create the next generation through crossover
-      offspring = crossover(parents)
+      offspring = crossover(parents, rng)
       
       # Apply mutation to the offspring
-      mutated_offspring = mutation(offspring, MUTATION_RATE)
+      mutated_offspring = mutation(offspring, mutation_rate, problem, rng)
       
       # Replace the old population with the new generation
-      population = mutated_offspring
-      print("Generation: ", generation)
-  
-  # Sort the final population by fitness
-  population.sort(key=lambda x: evaluate_fitness([x])[0], reverse=True)
-  
-  # Return the schedules from the final population
-  return population
-
-def generate_initial_population(classes, population_size):
-  """_summary_
-
-  Args:
-      population (list[list[Section]]): _description_
+      population = np.concatenate([elite, mutated_offspring[:population_size - elite_size]])
+  finally:
+    problem.metrics.count("genetic.generations", generations_run)
+    problem.metrics.count("genetic.evaluated", generations_run * population_size)
+    problem.metrics.count("genetic.conflict_checks", generations_run * population_size
+                          * problem.n_courses * (problem.n_courses - 1) // 2)
+
+def generate_initial_population(problem : SchedulingProblem, population_size : int,
+                                rng : np.random.Generator) -> np.ndarray:
+  """Return a population_size x courses array of uniformly random schedules."""
+  return random_sections(problem, (population_size, problem.n_courses), rng)
+
+def random_sections(problem : SchedulingProblem, shape, rng : np.random.Generator) -> np.ndarray:
+  """Return random section indices, where column c is drawn from course c."""
+  return (problem.domain_starts 
+          + (rng.random(shape) * problem.domain_sizes).astype(int))
+
+def evaluate_fitness(population : np.ndarray, problem : SchedulingProblem):
+  """Score the whole population in one batch.
+
+  Impossible schedules score 0 in score_schedule, which tells selection 
+  nothing. For selection they get minus their number of conflicting pairs 
+  instead, so schedules closer to being possible are preferred.
 
   Returns:
-      _type_: _description_
+      tuple[np.ndarray, np.ndarray]: score_schedule scores and the fitness 
+      scores used for selection.
   """
-  # TODO add functionality for population size
-  population = sampling_based_method(classes)
-  
-  population = [list(schedule) for schedule in population]
-  
-  return population
-
-def evaluate_fitness(population : List[List[Section]]):
-  """_summary_
-
-  Args:
-      population (list[list[Section]]): _description_
-
-  Returns:
-      _type_: _description_
+  scores = problem.score_schedules(population)
+  n_conflicts = np.zeros(len(population))
+  for i in range(problem.n_courses):
+    for j in range(i + 1, problem.n_courses):
+      n_conflicts += problem.conflicts[population[:, i], population[:, j]]
+  fitness_scores = np.where(n_conflicts == 0, scores, -n_conflicts)
+  return scores, fitness_scores
+
+def unique_possible_schedules(population : np.ndarray, scores : np.ndarray):
+  """Return the distinct possible schedules of a population as tuples."""
+  possible = np.unique(population[scores > 0], axis = 0)
+  return [tuple(schedule) for schedule in possible.tolist()]
+
+def selection(population : np.ndarray, fitness_scores : np.ndarray, 
+              rng : np.random.Generator, tournament_size : int = 4) -> np.ndarray:
+  """Tournament selection. Each parent is the fittest of tournament_size 
+  schedules drawn at random, with replacement."""
+  population_size = len(population)
+  tournament_size = max(1, min(tournament_size, population_size))
+  tournaments = rng.integers(0, population_size, (population_size, tournament_size))
+  winners = tournaments[np.arange(population_size), 
+                        np.argmax(fitness_scores[tournaments], axis = 1)]
+  return population[winners]
+
+def crossover(parents : np.ndarray, rng : np.random.Generator) -> np.ndarray:
+  """One-point crossover of consecutive pairs of parents.
+
+  parent1 = [(ENES210 0101), (CMSC132 0101), (MATH141 0101), (AOSC200 0101)]
+  parent2 = [(ENES210 0102), (CMSC132 0203), (MATH141 0201), (AOSC200 0301)]
+  child1  = [(p1), (p1), (p1), (p2)]
+  child2  = [(p2), (p2), (p2), (p1)]
   """
-  fitness_scores = []
-  
-  for schedule in population:
-    # Calculate the fitness score for a schedule
-    fitness_score = calculate_fitness(schedule)
-    fitness_scores.append(fitness_score)
-  
-  return fitness_scores
-
-def calculate_fitness(schedule):
-  # Implement your own fitness function here
-  # This function should evaluate the quality of a schedule
-  # and return a fitness score
-  fitness_score = score_schedule(schedule)
-  
-  return fitness_score
-
-def selection(population, fitness_scores, tournament_size = 500):
-  # Implement your own selection method here
-  # This function should select parents from the population
-  # based on their fitness scores
-  parents = []
-  
-  for _ in range(len(population)):
-    # Randomly select individuals for the tournament
-    tournament = random.sample(range(len(population)), tournament_size)
-    
-    # Find the individual with the highest fitness score in the tournament
-    winner_index = max(tournament, key=lambda i: fitness_scores[i])
-    
-    # Add the winner to the parents list
-    parents.append(population[winner_index])
-  
-  return parents
-
-def crossover(parents):
-  # Implement your own crossover method here
-  # This function should create offspring schedules by
-  # combining the parents' schedules
-  offspring = []
-  
-  my_range = len(parents)
-  if (my_range % 2 == 1):
-    my_range -= 1  
-  for i in range(0, my_range, 2):
-    
-    parent1 : List[Section] = parents[i]
-    parent2 : List[Section] = parents[i+1]
-    # TODO give score of 0 to impossible schedules
-    # parent1 = [(ENES210 0101), (CMSC132 0101), (MATH141 0101), (AOSC200 0101)]
-    # parent2 = [(ENES210 0102), (CMSC132 0203), (MATH141 0201), (AOSC200 0301)]
-    # child1 = [(p1), (p1), (p1), (p2)]
-    # child2 = [(p2), (p2), (p2), (p1)]
-    
-    # Randomly select the crossover point
-    crossover_point = random.randint(1, len(parent1) - 1)
-    
-    # Create the offspring by swapping sections between parents
-    child1 = parent1[:crossover_point] + parent2[crossover_point:]
-    child2 = parent2[:crossover_point] + parent1[crossover_point:]
-    
-    # Add the offspring to the list
-    offspring.append(child1)
-    offspring.append(child2)
-    
-  return offspring
-
-def mutation(offspring, mutation_rate):
-  # Implement your own mutation method here
-  # This function should introduce random changes to the
-  # offspring schedules based on the mutation rate
-  mutated_offspring = []
-    
-  for schedule in offspring:
-    mutated_schedule : List[Section] = schedule.copy()
-    
-    for section in mutated_schedule:
-      # Generate a random number between 0 and 1
-      random_value = random.random()
-      
-      if random_value < mutation_rate:
-        # Replace the section with a random section
-        mutated_section = get_random_section(section)
-        insert_index = mutated_schedule.index(section)
-        mutated_schedule.remove(section)
-        mutated_schedule.insert(insert_index, mutated_section)
-    
-    mutated_offspring.append(mutated_schedule)
-    
-  return mutated_offspring
+  n_pairs, n_courses = len(parents) // 2, parents.shape[1]
+  if (n_courses < 2):
+    return parents.copy()
+  parent1 = parents[0:2 * n_pairs:2]
+  parent2 = parents[1:2 * n_pairs:2]
+  # Randomly select the crossover point of every pair
+  crossover_points = rng.integers(1, n_courses, n_pairs)
+  from_parent1 = np.arange(n_courses) < crossover_points[:, None]
+  child1 = np.where(from_parent1, parent1, parent2)
+  child2 = np.where(from_parent1, parent2, parent1)
+  # An odd parent out is carried over as it is.
+  return np.concatenate([child1, child2, parents[2 * n_pairs:]])
+
+def mutation(offspring : np.ndarray, mutation_rate : float, problem : SchedulingProblem,
+             rng : np.random.Generator) -> np.ndarray:
+  """Replace each course's section with a random section of the same course,
+  with probability mutation_rate."""
+  mutate = rng.random(offspring.shape) < mutation_rate
+  return np.where(mutate, random_sections(problem, offspring.shape, rng), offspring)
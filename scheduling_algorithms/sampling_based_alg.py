@@ -10,49 +10,241 @@ __maintainer__ = "Oliver Villegas, Jaxon Lee"
 __email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
 __status__     = "Development"
 
-from section import Section
-from typing import List
+from problem import SchedulingProblem
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+import itertools
+import multiprocessing
+import os
 import random
+import threading
+import time
+import numpy as np
+
+# Share of the time budget parallel workers stop early by, so their schedules
+# can still be merged and scored within it.
+MERGE_MARGIN = 0.1
 
 # Original method
-def sampling_based_method(classes : List[List[Section]]):
-  all_schedules         = []
-  conflicting_schedules = []
+def sampling_based_method(problem : SchedulingProblem, iterations : Optional[int] = 1000,
+                          time_budget : float = None, seed : int = None, k : int = 20,
+                          stop : Callable[[], bool] = None) -> Iterator[Tuple[int, ...]]:
+  """Sample schedules by adding one random, weighted, non-conflicting section
+  of every course at a time.
+
+  Args:
+      problem (SchedulingProblem): The request to solve.
+      iterations (int, optional): Number of schedules to try to sample. None
+      samples until the time budget or stop ends the search, or every 
+      possible schedule has been found.
+      time_budget (float, optional): Stop sampling after this many seconds.
+      seed (int, optional): Seed for reproducible runs.
+      k (int): Schedules wanted. Sampling has no notion of the best ones, so
+      this only keeps the interface the same as the other algorithms'.
+      stop (callable, optional): Checked before every sample; sampling ends 
+      early once it returns true.
+
+  Yields:
+      tuple[int]: Distinct schedules as section indices in course order, as 
+      soon as each one is found.
+  """
+  rng = random if seed is None else random.Random(seed)
+  counters = {}
+  try:
+    yield from sample_schedules(problem.domains, problem.conflicts, problem.section_weights(),
+                                iterations, time_budget, rng, counters, stop)
+  finally:
+    problem.metrics.add(counters)
+
+def sample_schedules(domains : List[np.ndarray], conflicts : np.ndarray, 
+                     section_weights : np.ndarray, iterations : Optional[int], 
+                     time_budget : float, rng, counters : dict = None,
+                     stop : Callable[[], bool] = None) -> Iterator[Tuple[int, ...]]:
+  """The sampler itself. Only needs index arrays, so it can run in a worker 
+  process without the Section objects.
+
+  Args:
+      domains (list[np.ndarray]): Section indices of every course.
+      conflicts (np.ndarray): Section conflict matrix.
+      section_weights (np.ndarray): Sampling weight of every section.
+      iterations (int): Number of schedules to try to sample, or None for no
+      limit.
+      time_budget (float): Stop sampling after this many seconds, or None.
+      rng (random.Random): Source of randomness.
+      counters (dict, optional): Gets the run's totals, such as 
+      "sampling.dead_ends", when the run ends.
+      stop (callable, optional): Ends sampling early once it returns true.
+  """
+  # Complete schedules we have already found, and partial schedules that can't
+  # be extended into a new one. Both are keyed on frozensets of indices so 
+  # every lookup is a hash instead of a scan.
+  seen_schedules = set()
+  dead_schedules = set()
+  deadline = None if time_budget is None else time.perf_counter() + time_budget
+  # Totals for counters, kept in locals so they cost next to nothing
+  attempts = accepted = dead_ends = dedup_hits = conflict_checks = 0
   
-  for i in range(1000):
-    available_classes = list(range(0, len(classes)))
-    running_schedule  = set()
-    for j in range(len(classes)):
-      # randomly select class i, where i not in used_class
-      rand_index = random.choice(available_classes)
-      available_classes.remove(rand_index)
-      class_i = classes[rand_index]
-      
-      
-      all_weights_0 = True
-      # assign weight to i's sections based on GPA, conflicts
-      for section_s in class_i:
-        potential_schedule = running_schedule.copy()
-        potential_schedule.add(section_s)
-        # Check if section conflicts with schedule, if the newly proposed 
-        # schedule already exists or if it is known to be conflicting
-        if section_s.conflicts_with_schedule(running_schedule) or any([x == potential_schedule for x in all_schedules]) or any([x == potential_schedule for x in conflicting_schedules]):
-          section_s.weight = 0
-        else:
-          section_s.weight = section_s.get_weight()
-          all_weights_0 = False
-          
-      # if all other weights are 0, add to conflicting_schedules
-      if (all_weights_0):
-        conflicting_schedules.append(running_schedule)
+  try:
+    for i in (itertools.count() if iterations is None else range(iterations)):
+      if ((deadline is not None and time.perf_counter() >= deadline) 
+          or (stop is not None and stop())):
+        break
+      if (frozenset() in dead_schedules):
+        # Every possible schedule has been found.
         break
-      
-      # add randomly selected section s in i to running_schedule
-      running_schedule.add(random.choices(class_i, [section.weight for section in class_i], k=1)[0])
-    if (len(running_schedule) == len(classes)):
-      # Only add the newly generated schedule if we didn't break early.
-      all_schedules.append(running_schedule)
-    
-  # all_schedules = score_and_sort_schedules(all_schedules)
-
-  return all_schedules
+      attempts += 1
+      available_classes = list(range(0, len(domains)))
+      running_schedule  = frozenset()
+      for j in range(len(domains)):
+        # randomly select class i, where i not in used_class
+        rand_index = rng.choice(available_classes)
+        available_classes.remove(rand_index)
+        class_i = domains[rand_index]
+        
+        # Look up which of i's sections conflict with the running schedule
+        scheduled = np.fromiter(running_schedule, dtype=int, count=len(running_schedule))
+        conflicts_i = conflicts[np.ix_(class_i, scheduled)].any(axis=1)
+        conflict_checks += len(class_i) * len(scheduled)
+        
+        all_weights_0 = True
+        # assign weight to i's sections based on GPA, conflicts. Sections are
+        # shared across requests, so keep the weights local.
+        weights = []
+        for section_s, conflicts_s in zip(class_i.tolist(), conflicts_i.tolist()):
+          if (conflicts_s):
+            weights.append(0)
+            continue
+          # Skip sections that would recreate a schedule we already have or 
+          # extend into a known dead end
+          potential_schedule = running_schedule | {section_s}
+          if (potential_schedule in seen_schedules or potential_schedule in dead_schedules):
+            weights.append(0)
+            dedup_hits += 1
+          else:
+            weights.append(section_weights[section_s])
+            all_weights_0 = False
+            
+        # if all other weights are 0, never extend this partial schedule again
+        if (all_weights_0):
+          dead_schedules.add(running_schedule)
+          dead_ends += 1
+          break
+        
+        # add randomly selected section s in i to running_schedule
+        running_schedule = running_schedule | {rng.choices(class_i.tolist(), weights, k=1)[0]}
+      if (len(running_schedule) == len(domains)):
+        # Only add the newly generated schedule if we didn't break early.
+        seen_schedules.add(running_schedule)
+        accepted += 1
+        yield tuple(sorted(running_schedule))
+  finally:
+    if (counters is not None):
+      for name, n in (("sampling.attempts", attempts), ("sampling.accepted", accepted),
+                      ("sampling.dead_ends", dead_ends), ("sampling.dedup_hits", dedup_hits),
+                      ("sampling.conflict_checks", conflict_checks)):
+        counters[name] = counters.get(name, 0) + n
+
+
+def parallel_sampling_method(problem : SchedulingProblem, iterations : Optional[int] = 1000,
+                             time_budget : float = None, seed : int = None, 
+                             workers : int = None, k : int = 20,
+                             stop : Callable[[], bool] = None) -> Iterator[Tuple[int, ...]]:
+  """Run the sampler on several cores and merge the results.
+
+  The iterations are split across a persistent process pool. Every worker gets
+  its own seed derived from seed, so runs with the same seed and number of 
+  workers are reproducible. Workers only receive the conflict matrix, domains
+  and weights and only send back arrays of section indices, so they never
+  need the catalog.
+
+  Args:
+      problem (SchedulingProblem): The request to solve.
+      iterations (int, optional): Total number of schedules to try to 
+      sample. None has every worker sample until the time budget runs out,
+      so it needs one.
+      time_budget (float, optional): Seconds to search for. Workers stop 
+      MERGE_MARGIN of it early.
+      seed (int, optional): Seed for reproducible runs.
+      workers (int, optional): Number of worker processes. Defaults to the 
+      number of CPUs.
+      k (int): Schedules wanted, see sampling_based_method.
+      stop (callable, optional): Workers run in other processes and can't 
+      check it, so it only ends the merge early.
+
+  Raises:
+      ValueError: If neither iterations nor a time budget bound the workers.
+
+  Yields:
+      tuple[int]: Distinct schedules as section indices in course order.
+  """
+  if (iterations is None and time_budget is None):
+    raise ValueError("Parallel sampling without iterations needs a time budget")
+  workers = workers or os.cpu_count() or 1
+  workers = max(1, workers if iterations is None else min(workers, iterations))
+  section_weights = problem.section_weights()
+  worker_seeds = [int(child.generate_state(1)[0]) 
+                  for child in np.random.SeedSequence(seed).spawn(workers)]
+  worker_iterations = [None if iterations is None 
+                       else iterations // workers + (i < iterations % workers) 
+                       for i in range(workers)]
+  
+  worker_budget = None if time_budget is None else time_budget * (1 - MERGE_MARGIN)
+  
+  pool = get_sampling_pool(workers)
+  futures = [pool.submit(_sample_worker, problem.domains, problem.conflicts, 
+                         section_weights, worker_iterations[i], worker_budget, 
+                         worker_seeds[i])
+             for i in range(workers)]
+  
+  # Workers don't share their memo of seen schedules, so dedup on merge.
+  seen_schedules = set()
+  merged = 0
+  try:
+    for future in futures:
+      if (stop is not None and stop()):
+        break
+      schedules, counters = future.result()
+      problem.metrics.add(counters)
+      merged += len(schedules)
+      for schedule in schedules.tolist():
+        schedule = tuple(schedule)
+        if (schedule not in seen_schedules):
+          seen_schedules.add(schedule)
+          yield schedule
+  finally:
+    # Free the shared pool for the next request. Workers already running
+    # stop at their own iteration count or budget.
+    for future in futures:
+      future.cancel()
+    problem.metrics.count("sampling.merge_duplicates", merged - len(seen_schedules))
+
+def _sample_worker(domains, conflicts, section_weights, iterations, time_budget, 
+                   seed) -> Tuple[np.ndarray, dict]:
+  """Worker process entry point. Returns the sampled schedules as one compact
+  n_schedules x courses array, and the worker's counters."""
+  counters = {}
+  schedules = list(sample_schedules(domains, conflicts, section_weights, iterations,
+                                    time_budget, random.Random(seed), counters))
+  return np.array(schedules, dtype=np.int32).reshape(len(schedules), len(domains)), counters
+
+
+_sampling_pool : ProcessPoolExecutor = None
+_sampling_pool_workers = 0
+_sampling_pool_lock = threading.Lock()
+
+def get_sampling_pool(workers : int) -> ProcessPoolExecutor:
+  """Return the process-wide sampling pool, growing it if it's too small.
+
+  Workers are forked where possible, so they inherit the parent's 
+  already-loaded modules and catalog instead of loading them again.
+  """
+  global _sampling_pool, _sampling_pool_workers
+  with _sampling_pool_lock:
+    if (_sampling_pool is None or _sampling_pool_workers < workers):
+      if (_sampling_pool is not None):
+        _sampling_pool.shutdown(wait = False)
+      methods = multiprocessing.get_all_start_methods()
+      context = multiprocessing.get_context("fork" if "fork" in methods else None)
+      _sampling_pool = ProcessPoolExecutor(max_workers = workers, mp_context = context)
+      _sampling_pool_workers = workers
+    return _sampling_pool
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Common anytime interface over the scheduling algorithms.
+
+Every algorithm in STRATEGIES is called the same way,
+  algorithm(problem, k = k, time_budget = seconds, stop = should_stop, **options)
+and yields schedules as it finds them. solve streams them into a top-k
+selection and returns the best schedules found when the algorithm finishes
+its usual amount of work. The deadline only caps that: a search still running
+then is cut short and returns the best found so far. It also stops once the
+top k has not improved for patience seconds. Unbounded searches skip the
+usual amount of work and run until the deadline or patience stops them.
+"""
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+from problem import SchedulingProblem
+from section import TopSchedules
+from scheduling_algorithms.sampling_based_alg import sampling_based_method, parallel_sampling_method
+from scheduling_algorithms.genetic_alg import genetic_method
+from scheduling_algorithms.csp_alg import constraint_satisfaction_problem_method
+from scheduling_algorithms.annealing_alg import annealing_method
+from typing import Callable, List, Optional, Tuple
+import time
+import numpy as np
+
+# Algorithms selectable by name. Each takes a SchedulingProblem and yields
+# schedules as collections of section indices.
+STRATEGIES = {
+  "sampling": sampling_based_method,
+  "parallel_sampling": parallel_sampling_method,
+  "genetic":  genetic_method,
+  "csp":      constraint_satisfaction_problem_method,
+  "annealing": annealing_method,
+}
+STRATEGY_NAMES = tuple(STRATEGIES) + ("auto",)
+
+# Options that make an algorithm search until its deadline instead of for its
+# default amount of work. Only used when solve is asked for an unbounded
+# search.
+UNBOUNDED = {
+  "sampling": {"iterations": None},
+  "parallel_sampling": {"iterations": None},
+  "genetic":  {"generations": None},
+  "csp":      {},
+  "annealing": {"restarts": None},
+}
+# Strategies whose work runs where stop can't reach it, so patience alone
+# can't end an unbounded search.
+NEEDS_TIME_BUDGET = ("parallel_sampling",)
+
+# Largest problem, as log10 of the number of section combinations, that "auto"
+# solves exactly when the profile scores relative time. That term has a loose
+# CSP bound, and on random catalog workloads above about 10^4.5 combinations
+# annealing finds as good schedules in less time. Without it CSP is fastest
+# at every size we have seen.
+AUTO_EXACT_LOG_COMBINATIONS = 4.5
+
+
+def choose_strategy(problem : SchedulingProblem) -> str:
+  """Return the strategy "auto" picks for a problem."""
+  if (not problem.weights[2]):
+    return "csp"
+  log_combinations = float(np.log10(np.maximum(problem.domain_sizes, 1)).sum())
+  return "csp" if log_combinations <= AUTO_EXACT_LOG_COMBINATIONS else "annealing"
+
+
+class SolveResult:
+  """The outcome of solve."""
+  def __init__(self, schedules : List[Tuple[float, Tuple[int, ...]]], strategy : str,
+               stop_reason : str, elapsed : float, candidates : int) -> None:
+    """Initializes the result
+
+    Args:
+        schedules (list[tuple[float, tuple[int]]]): (score, schedule) pairs,
+        best first.
+        strategy (str): Strategy that ran, after resolving "auto".
+        stop_reason (str): "finished" if the algorithm ran out of work,
+        "deadline" or "converged".
+        elapsed (float): Seconds spent.
+        candidates (int): Schedules the algorithm yielded.
+    """
+    self.schedules   = schedules
+    self.strategy    = strategy
+    self.stop_reason = stop_reason
+    self.elapsed     = elapsed
+    self.candidates  = candidates
+
+
+def solve(problem : SchedulingProblem, strategy : str = "auto", k : int = 20,
+          time_budget : float = None, patience : float = None,
+          progress : Callable[[dict], None] = None, batch_size : int = 64,
+          unbounded : bool = False, **options) -> SolveResult:
+  """Run a strategy and return the k best schedules it finds in time.
+
+  Args:
+      problem (SchedulingProblem): The request to solve.
+      strategy (str): Name in STRATEGIES, or "auto" to pick by problem size
+      and profile, see choose_strategy.
+      k (int): Most schedules to return, 0 or more.
+      time_budget (float, optional): Most seconds to search for. The
+      algorithm still stops after its default amount of work if that comes
+      first.
+      patience (float, optional): Stop once the top k has not improved for
+      this many seconds.
+      progress (callable, optional): Called after every scored batch with
+      {"strategy", "elapsed", "candidates", "found", "best_score",
+      "kth_score", "improved"}.
+      batch_size (int): Schedules to score at once.
+      unbounded (bool): Search until the time budget runs out or patience
+      stops the search, instead of for the algorithm's default amount of
+      work. Needs one of them, and parallel_sampling needs a time budget.
+      **options: Passed on to the algorithm, e.g. seed.
+
+  Raises:
+      ValueError: If the strategy is unknown, k is not a non-negative
+      integer, or an unbounded search has nothing to end it.
+
+  Returns:
+      SolveResult: The best schedules and how the search ended.
+  """
+  if (strategy == "auto"):
+    strategy = choose_strategy(problem)
+  if (strategy not in STRATEGIES):
+    raise ValueError("Unknown strategy " + str(strategy))
+  if (not isinstance(k, (int, np.integer)) or isinstance(k, bool) or k < 0):
+    raise ValueError("The number of schedules must be a non-negative integer, not %r" % (k,))
+  if (unbounded and time_budget is None and patience is None):
+    raise ValueError("An unbounded search needs a time budget or patience")
+  if (unbounded and time_budget is None and strategy in NEEDS_TIME_BUDGET):
+    raise ValueError("An unbounded %s search needs a time budget" % strategy)
+  start    = time.perf_counter()
+  deadline = None if time_budget is None else start + time_budget
+  top      = TopSchedules(problem, k)
+  pending  = []
+  last_improvement = start
+  candidates = 0
+
+  def flush() -> None:
+    nonlocal last_improvement
+    if (not pending):
+      return
+    improved = top.add(pending)
+    pending.clear()
+    now = time.perf_counter()
+    if (improved):
+      last_improvement = now
+    if (progress is not None):
+      best = top.best()[0][0] if len(top) else None
+      progress({"strategy": strategy, "elapsed": now - start, "candidates": candidates,
+                "found": len(top), "best_score": best, "kth_score": top.kth_score(),
+                "improved": improved})
+
+  def expired() -> Optional[str]:
+    now = time.perf_counter()
+    if (deadline is not None and now >= deadline):
+      return "deadline"
+    if (patience is not None and now - last_improvement >= patience):
+      if (not pending):
+        return "converged"
+      # Schedules not scored yet may still improve the top k.
+      flush()
+      return "converged" if now - last_improvement >= patience else None
+    return None
+
+  def stop() -> bool:
+    """Polled by the algorithm between the schedules it yields."""
+    return expired() is not None
+
+  kwargs = {**(UNBOUNDED[strategy] if unbounded else {}), **options}
+  schedules = STRATEGIES[strategy](problem, k = k, time_budget = time_budget, stop = stop,
+                                   **kwargs)
+  stop_reason = None
+  try:
+    for schedule in schedules:
+      pending.append(schedule)
+      candidates += 1
+      if (len(pending) >= batch_size):
+        flush()
+      stop_reason = expired()
+      if (stop_reason is not None):
+        break
+  finally:
+    if (hasattr(schedules, "close")):
+      schedules.close()
+  flush()
+  # An algorithm that stopped itself because stop() said so didn't finish.
+  stop_reason = stop_reason or expired() or "finished"
+
+  problem.metrics.count("solver.candidates", candidates)
+  problem.metrics.count("solver.stopped." + stop_reason)
+  return SolveResult(top.best(), strategy, stop_reason, time.perf_counter() - start, candidates)
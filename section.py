@@ -12,180 +12,211 @@ __maintainer__ = "Oliver Villegas, Jaxon Lee"
 __email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
 __status__     = "Development"
 
+import heapq
+import itertools
 import re
+import sys
 import numpy as np
-from typing import List
+from typing import Callable, Iterable, List, Optional, Tuple
 
-# TODO remove empty lectures from json, i.e. " -"
+START_TIME_SCORE_REFERENCE = {"7:00am": 0, "7:30am": 0, "8:00am": 0, "8:30am": 0,
+                              "9:00am": 3, "9:30am": 4, "10:00am": 10, "10:30am": 10, 
+                              "11:00am": 10, "11:30am": 10, "12:00pm": 10, "12:30pm": 10,
+                              "1:00pm": 10, "1:30pm": 10, "2:00pm": 10, "2:30pm": 10,
+                              "3:00pm": 10,  "3:30pm": 10, "4:00pm": 9, "4:30pm": 8,
+                              "5:00pm": 7, "5:30pm": 6, "6:00pm": 5, "6:30pm": 4, 
+                              "7:00pm": 3, "7:30pm": 2, "8:00pm": 1, "8:30pm": 0,
+                              "9:00pm": 0, "9:30pm": 0, "10:00pm": 0, "10:30pm": 0}
+
+DAY_INDEX = {'M': 0, 'Tu': 1, 'W': 2, 'Th': 3, 'F': 4}
+MINUTES_PER_DAY = 24 * 60
+
+def get_minutes(time : str) -> int:
+  """Convert AM/PM time, e.g. "10:30am", to minutes since 12:00am."""
+  hh, mm = map(int, time[:-2].split(':'))
+  am_or_pm_multiplier = 0 if time[-2:] == "am" or hh == 12 else 1
+  if (time[-2:] == "am" and hh == 12):
+    # 12:00am is midnight
+    hh = 0
+  return (hh + 12 * am_or_pm_multiplier) * 60 + mm
+
+
+# Many sections meet at the same times, so equal meeting tuples, start times and
+# occupancies are stored once and shared. Values never change, so sharing is safe.
+_interned = {}
+
+def _intern(key, compute = None, *args):
+  """Return the shared copy of a value. With compute, key identifies the value
+  and compute(*args) builds it the first time."""
+  value = _interned.get(key)
+  if (value is None):
+    value = _interned.setdefault(key, key if compute is None else compute(*args))
+  return value
+
+
+# Raw dumps still contain empty lectures, i.e. " -"; etl.py drops them.
 # [{"section_num": "0101", "gpa": 3.28, "lectures": ["W 4:00pm-5:45pm", " -"], "discussions": []}]
 class Section:
   """Stores data for a section of a class.
+
+  Sections are immutable, so one set of them is shared by every request and
+  thread. Anything that belongs to a single request, such as sampling weights,
+  lives in that request's SchedulingProblem arrays instead.
   """
+  __slots__ = ("class_name", "section_num", "gpa", "lectures", "instructors",
+               "meetings", "start_times", "occupancy")
+
   def __init__(self, section_dict : dict, class_name : str) -> None:
     """Initializes the section
 
     Args:
         section_dict (dict): section data from ScheduleTerp API 
     """
-    self.class_name   = class_name
-    self.section_num  = section_dict['section_num']
-    self.raw_meetings = []
-    self.start_times  = []
-
-    self.lectures = section_dict['lectures']
-    
     # "lectures": "MWF 10:00am-10:50am"
     # "lectures": ["TuTh 2:00pm-3:15pm", "Th 6:00pm-6:50pm"]
-    meetings : List[str] = []
+    meeting_strings : List[str] = []
     if (isinstance(section_dict['lectures'], str)):
-      meetings.append(section_dict['lectures'])
+      meeting_strings.append(section_dict['lectures'])
     else:
-      meetings.extend(section_dict['lectures'])
-    
-    
-    meetings.extend(section_dict['discussions'])
+      meeting_strings.extend(section_dict['lectures'])
+    meeting_strings.extend(section_dict['discussions'])
     
-    for meeting in meetings:
-      # Extract all days for a particular meeting
-      days = re.findall('^M|Tu|W|Th|F$', meeting)
+    meetings    = []
+    start_times = []
+    for meeting in meeting_strings:
+      # Extract all days for a particular meeting, e.g. "MWF" -> M, W, F
+      days = re.findall('M|Tu|W|Th|F', meeting.split(" ")[0])
       for day in days:
         # "meeting": "MWF 10:00am-10:50am"
         # start = "10:00am"
         # end = "10:50am"
         # Extract start and end times
-        start, end = meeting.split(" ")[1].split("-")
-        
-        self.start_times.append(start)
-        raw_start_time = self.__get_raw_time(start, day)
-        raw_end_time = self.__get_raw_time(end, day)
-        self.raw_meetings.extend([raw_start_time, raw_end_time])
-    
-    self.raw_meetings.sort()
-  
-    self.gpa = section_dict["gpa"]
-    if (self.gpa == -1):
-      # Average GPA across all classes
-      self.gpa = 3.1
+        start, end = map(get_minutes, meeting.split(" ")[1].split("-"))
+        start_times.append(start)
+        meetings.append((DAY_INDEX[day] * MINUTES_PER_DAY + start, 
+                         DAY_INDEX[day] * MINUTES_PER_DAY + end))
+
+    # Instructors are not in the current catalog dumps, but are used by 
+    # Restrictions when present.
+    self._set_fields(class_name, section_dict['section_num'], section_dict['gpa'],
+                     section_dict['lectures'], meetings, start_times,
+                     section_dict.get('instructors', ()))
+
+  def _set_fields(self, class_name : str, section_num : str, gpa : float, lectures,
+                  meetings : Iterable[Tuple[int, int]], start_times : Iterable[int],
+                  instructors : Iterable[str]) -> None:
+    set_field = object.__setattr__
+    # Every section of a course shares one interned course ID.
+    set_field(self, 'class_name',  sys.intern(class_name))
+    set_field(self, 'section_num', sys.intern(section_num))
+    # Average GPA across all classes stands in for unknown GPAs (-1). Run
+    # the ETL with grades.py data to fall back by department instead.
+    set_field(self, 'gpa',         3.1 if gpa == -1 else gpa)
+    set_field(self, 'lectures',    _intern(lectures if isinstance(lectures, str) 
+                                           else tuple(map(sys.intern, lectures))))
+    set_field(self, 'instructors', _intern(tuple(instructors)))
+    meetings = _intern(tuple(sorted(_intern(tuple(meeting)) for meeting in meetings)))
+    set_field(self, 'meetings',    meetings)
+    set_field(self, 'start_times', _intern(tuple(start_times)))
+    set_field(self, 'occupancy',   _intern(('occupancy', meetings), get_occupancy, meetings))
+
+  def __setattr__(self, name : str, value) -> None:
+    raise AttributeError("Section is immutable")
+
+  def __delattr__(self, name : str) -> None:
+    raise AttributeError("Section is immutable")
+
+  def __reduce__(self):
+    return (Section.from_parsed, (self.class_name, self.section_num, self.gpa, self.lectures,
+                                  self.meetings, self.start_times, self.instructors))
+
+  @classmethod
+  def from_parsed(cls, class_name : str, section_num : str, gpa : float, 
+                  lectures, meetings : Iterable[Tuple[int, int]], 
+                  start_times : Iterable[int], instructors = ()) -> 'Section':
+    """Build a section from fields that were already parsed, skipping the 
+    regex parsing done in __init__. Used by the compiled catalog.
+
+    Args:
+        class_name (str): Course ID, e.g. "CMSC131".
+        section_num (str): Section number, e.g. "0101".
+        gpa (float): Section GPA from the catalog (-1 if unknown).
+        lectures (str | list[str]): Original lecture strings.
+        meetings (iterable[tuple[int, int]]): (start, end) of every meeting,
+        in minutes since 12:00am on Monday.
+        start_times (iterable[int]): Start time of every meeting, in minutes
+        since 12:00am.
+        instructors (tuple[str], optional): Names of the section's instructors.
+
+    Returns:
+        Section: The section.
+    """
+    section = cls.__new__(cls)
+    section._set_fields(class_name, section_num, gpa, lectures, meetings, 
+                        start_times, instructors)
+    return section
+
+  @classmethod
+  def from_normalized(cls, section_dict : dict, class_name : str) -> 'Section':
+    """Build a section from a record normalized by etl.py, whose meetings are
+    already (day, start minute, end minute) triples, so no regex parsing is
+    needed.
+
+    Args:
+        section_dict (dict): e.g. {"section_num": "0101", "gpa": 3.28,
+        "lectures": ["W 4:00pm-5:45pm"], "discussions": [],
+        "meetings": [["W", 960, 1065]]}
+        class_name (str): Course ID, e.g. "AAPS380".
+
+    Returns:
+        Section: The section.
+    """
+    # Weekend meetings are not scheduled around.
+    weekday_meetings = [(day, start, end) for day, start, end in section_dict['meetings']
+                        if day in DAY_INDEX]
+    return cls.from_parsed(class_name, section_dict['section_num'], section_dict['gpa'],
+                           section_dict['lectures'],
+                           [(DAY_INDEX[day] * MINUTES_PER_DAY + start,
+                             DAY_INDEX[day] * MINUTES_PER_DAY + end)
+                            for day, start, end in weekday_meetings],
+                           [start for _, start, _ in weekday_meetings],
+                           section_dict.get('instructors', ()))
       
 
   def conflicts_with_section(self, other : 'Section') -> bool:
     """Return true if this section conflicts with the other section.
     
-    Go through both section times in order until either a double start time 
-    (even index + even index) or double end time (odd index + odd index) occurs.
-    We can detect both by checking if the sum is even. This algorithm is O(n).
+    Both sections carry a weekly occupancy bitmask, so this is a single AND.
+    Meetings are half-open, so a class that ends at 10:00am does not conflict
+    with one that starts at 10:00am.
     
     Returns:
         bool: Return true if the two sections conflict (can't schedule them
         together).
     """
-    result = False
-    my_index = 0
-    other_index = 0
-    last_index_checked = -1
-    while (my_index < len(self.raw_meetings) 
-           and other_index < len(other.raw_meetings)):
-      my_curr_meeting    = self.raw_meetings[my_index]
-      other_curr_meeting = other.raw_meetings[other_index]
-      if (my_curr_meeting < other_curr_meeting):
-        if ((last_index_checked + my_index) % 2 == 0): 
-          result = True
-          break
-        last_index_checked = my_index
-        my_index += 1
-      else:
-        if ((last_index_checked + other_index) % 2 == 0): 
-          result = True
-          break
-        last_index_checked = other_index
-        other_index += 1 
-        
-    return result
+    return (self.occupancy & other.occupancy) != 0
 
 
   def conflicts_with_schedule(self, partial_schedule) -> bool:
-    """Return true if this section conflicts with anything in the schedule."""
-    result = False
-    # For each section in schedule, check if this conflicts. If any do, 
-    # return true. Else return false.
-    for section in partial_schedule:
-      if (self.conflicts_with_section(section)):
-        result = True
-        break
+    """Return true if this section conflicts with anything in the schedule.
     
-    return result
+    Callers that build a schedule one section at a time should keep a running
+    schedule_occupancy mask instead and AND against it directly.
+    """
+    return (self.occupancy & schedule_occupancy(partial_schedule)) != 0
   
-  def get_weight(self) -> float:
-      score = 0
-      start_time_score_reference = {"7:00am": 0, "7:30am": 0, "8:00am": 0, "8:30am": 0,
-                                  "9:00am": 3, "9:30am": 4, "10:00am": 10, "10:30am": 10, 
-                                  "11:00am": 10, "11:30am": 10, "12:00pm": 10, "12:30pm": 10,
-                                  "1:00pm": 10, "1:30pm": 10, "2:00pm": 10, "2:30pm": 10,
-                                  "3:00pm": 10,  "3:30pm": 10, "4:00pm": 9, "4:30pm": 8,
-                                  "5:00pm": 7, "5:30pm": 6, "6:00pm": 5, "6:30pm": 4, 
-                                  "7:00pm": 3, "7:30pm": 2, "8:00pm": 1, "8:30pm": 0,
-                                  "9:00pm": 0, "9:30pm": 0, "10:00pm": 0, "10:30pm": 0}
-      
-      gpa_score = sig(self.gpa)
-      
-      start_time_score = sum([start_time_score_reference[start_time] for 
-                              start_time in self.start_times])
-      
-      relative_time_score = 0
+  def get_start_time_score(self) -> float:
+    """Return the sum of the start time scores of all of this section's 
+    meetings, under the default preference profile."""
+    from preferences import DEFAULT_PROFILE
+    return DEFAULT_PROFILE.section_time_scores([self])[0]
 
-      weight_dict = {"average_gpa": 10, "start_time": 1}
-      
-      score = gpa_score * weight_dict['average_gpa'] + start_time_score * weight_dict['start_time'] 
-      
-      return score
-
-
-  def __get_gpa_given_prof(self, profs : List[str], grades_dict, fallback_gpa):
-    """Return the Professor's average GPA for this particular section.
-
-    Args:
-        prof (str): The professor to check
-        grades_dict (dict): grades data for the section
+  def get_weight(self) -> float:
+    """Return the sampling weight under the default preference profile.
+    SchedulingProblem.section_weights gives every section's at once."""
+    from preferences import DEFAULT_PROFILE
+    return DEFAULT_PROFILE.section_weights(self.gpa, self.get_start_time_score())
 
-    Returns:
-        float: The average GPA of the Professor.
-    """
-    
-    # TODO Maybe change W to 0.5
-    past_sections = [section for section in grades_dict 
-                     if section.get('professor') in profs]
-    GPA_weights   = [4.0,4.0,3.7, 3.3,3.0,2.7, 2.3,2.0,1.7, 1.3,1.0,0.7, 0.0, 0.0]
-    grades        = [0.0,0.0,0.0, 0.0,0.0,0.0, 0.0,0.0,0.0, 0.0,0.0,0.0, 0.0, 0.0]
-    for section in past_sections:
-      grades[0]  += section['A+']
-      grades[1]  += section['A']
-      grades[2]  += section['A-']
-      grades[3]  += section['B+']
-      grades[4]  += section['B']
-      grades[5]  += section['B-']
-      grades[6]  += section['C+']
-      grades[7]  += section['C']
-      grades[8]  += section['C-']
-      grades[9]  += section['D+']
-      grades[10] += section['D']
-      grades[11] += section['D-']
-      grades[12] += section['F']
-      grades[13] += section['W']
-    
-    total_grades = sum(grades)
-    if (total_grades == 0):
-      return fallback_gpa
-    else:
-      return sum([GPA_weights[i] * grades[i] for i in range(len(grades))]) / total_grades
-
-  def __get_raw_time(self, time : str, day : str):
-    """Convert AM/PM time to hours since 12:00am on Monday and return it."""
-    day_converter = {'M': 0, 'Tu': 1, 'W': 2, 'Th' : 3, 'F': 4}
-    hh, mm = map(int, time[:-2].split(':'))
-    am_or_pm_multiplier = 0 if time[-2:] == "am" or hh == 12 else 1
-    raw_time = hh + (mm / 60.0) + 12 * am_or_pm_multiplier + day_converter[day] * 24
-    return raw_time
-  
   def __str__(self) -> str:
     """Return neat string representation of this section."""
     return self.class_name + " " + str(self.section_num) + " " + str(self.gpa) + " " + str(self.lectures)
@@ -195,95 +226,276 @@ class Section:
     d['class_name'] = self.class_name
     d['section_num'] = self.section_num
     d['gpa'] = self.gpa
-    d['lectures']  = self.lectures
+    d['lectures']  = self.lectures if isinstance(self.lectures, str) else list(self.lectures)
     return d
   
 
+# Weekly occupancy bitmasks. Bit i is set if the section meets during the i-th
+# 5-minute slot of the week, counting from 12:00am on Monday.
+SLOTS_PER_HOUR = 12
+SLOTS_PER_DAY  = 24 * SLOTS_PER_HOUR
+
+# Monday through Friday, packed into 64-bit words.
+OCCUPANCY_WORDS = (5 * SLOTS_PER_DAY + 63) // 64
+
+def get_occupancy_words(sections : List['Section']) -> np.ndarray:
+  """Return the occupancy bitmasks of sections as an N x OCCUPANCY_WORDS
+  array of little-endian 64-bit words."""
+  return np.frombuffer(b"".join(section.occupancy.to_bytes(8 * OCCUPANCY_WORDS, "little")
+                                for section in sections),
+                       dtype="<u8").reshape(len(sections), OCCUPANCY_WORDS)
+
+def get_occupancy(meetings : Iterable[Tuple[int, int]]) -> int:
+  """Return the occupancy bitmask of a section's meetings.
+
+  Args:
+      meetings (iterable[tuple[int, int]]): (start, end) of every meeting, in
+      minutes since 12:00am on Monday.
+
+  Returns:
+      int: Bitmask with one bit per 5-minute slot.
+  """
+  occupancy = 0
+  for start, end in meetings:
+    # Every catalog time is a multiple of 5 minutes, so this is exact; other
+    # times mark every slot they touch.
+    start = start * SLOTS_PER_HOUR // 60
+    end   = -(-end * SLOTS_PER_HOUR // 60)
+    if (end > start):
+      occupancy |= ((1 << (end - start)) - 1) << start
+  return occupancy
+
+def schedule_occupancy(schedule) -> int:
+  """Return the union of the occupancy bitmasks of a (partial) schedule."""
+  occupancy = 0
+  for section in schedule:
+    occupancy |= section.occupancy
+  return occupancy
+
+
 # Code for dealing with schedules
 def sig(x):
   """Apply sigmoid function to x and return it."""
   # Modified sigmoid function so that it doesn't level off so fast.
   return 1/(1 + np.exp(-1/10 * x))
 
-def score_schedule(schedule : List[Section]):
+def score_schedule(schedule : List[Section], profile = None):
   """Scores a schedule based on its GPA, the times of each class, and their relative times.
 
   Args:
       schedule (list): Schedule to score. It's a list of sections.
+      profile (optional): Preference profile, or its name, to score with. See
+      preferences.get_profile.
 
   Returns:
       float: the schedule's score
   """
-  score = 0
-  #any([section1.conflicts_with_section(section2) for section2 in schedule if section2 != section1] for section1 in schedule)
   # Check if schedule is possible before proceeding. If it's not possible, then 
-  # simply return 0.
-  is_possible_schedule = True
-  for section1 in schedule:
-    for section2 in schedule:
-      if (section1 != section2):
-        if (section1.conflicts_with_section(section2)):
-          is_possible_schedule = False
-          break
-  if (is_possible_schedule):
-    start_time_score_reference = {"7:00am": 0, "7:30am": 0, "8:00am": 0, "8:30am": 0,
-                                "9:00am": 3, "9:30am": 4, "10:00am": 10, "10:30am": 10, 
-                                "11:00am": 10, "11:30am": 10, "12:00pm": 10, "12:30pm": 10,
-                                "1:00pm": 10, "1:30pm": 10, "2:00pm": 10, "2:30pm": 10,
-                                "3:00pm": 10,  "3:30pm": 10, "4:00pm": 9, "4:30pm": 8,
-                                "5:00pm": 7, "5:30pm": 6, "6:00pm": 5, "6:30pm": 4, 
-                                "7:00pm": 3, "7:30pm": 2, "8:00pm": 1, "8:30pm": 0,
-                                "9:00pm": 0, "9:30pm": 0, "10:00pm": 0, "10:30pm": 0}
-    
-    average_gpa_score = sig(sum([section.gpa for section in schedule]) / len(schedule))
-    
-    start_time_score  = sig(sum([sum([start_time_score_reference[start_time] for start_time 
-                                in section.start_times]) for section in schedule]))
-    # add {time gap b/w classes} score 
-    # Add geographical distances b/w classes
-    # Add online vs in person
-    # Add prefence f/ 4 day week or consolidated
-    
-    # User Profiles--
-    # Commuter: consolidated, back to back... or doesn't care
-    # Part time job worker: doesn't care about consolidation, 
-    #   but wants certain parts of the day open
-    # "Class experience": in person, not consolidated
-    # Night owl: no classes before 11
-    # Freshman / Sophomore / Junior / Senior: 
-    # Only goes to lecture for exams: classes that don't require attendance
-    
-    # TODO add this functionality
-    relative_time_score = 0
+  # simply return 0. A section conflicts with an earlier one exactly when it 
+  # overlaps their combined occupancy.
+  occupancy = 0
+  for section in schedule:
+    if (section.occupancy & occupancy):
+      return 0
+    occupancy |= section.occupancy
+  return _score_possible_schedule(schedule, profile)
 
-    weight_dict = {"average_gpa": 10, "start_time": 1}
-    score : float = average_gpa_score * weight_dict['average_gpa'] + start_time_score * weight_dict['start_time']
-  return score
+def score_indexed_schedule(schedule, problem : 'SchedulingProblem'):
+  """Scores a schedule given as section indices into a SchedulingProblem. 
+  Feasibility comes from the problem's precomputed conflict matrix.
 
+  Args:
+      schedule (iterable[int]): Section indices of the schedule.
+      problem (SchedulingProblem): The request the indices belong to.
 
-blacklisted_sections = []
-def score_and_sort_schedules(all_schedules : List[List[Section]]):
-  """Sorts all schedules from best to worst based on how good they are (subjective). For now, only take into account GPA.
+  Returns:
+      float: the schedule's score, same as score_schedule
+  """
+  if (not problem.is_feasible(schedule)):
+    return 0
+  return _score_possible_schedule([problem.sections[i] for i in schedule], problem.profile)
+
+def score_schedules(schedules : np.ndarray, gpas : np.ndarray, 
+                    start_time_scores : np.ndarray, conflicts : np.ndarray,
+                    weights : np.ndarray = None, 
+                    relative_time_scores : Callable[[np.ndarray], np.ndarray] = None) -> np.ndarray:
+  """Scores a whole population of schedules at once. Gives exactly the same 
+  scores as calling score_schedule on each schedule, including 0 for 
+  impossible schedules.
 
   Args:
-      all_schedules ([] : Section): The schedules to sort.
+      schedules (np.ndarray): N x courses array of section indices.
+      gpas (np.ndarray): GPA of every section.
+      start_time_scores (np.ndarray): get_start_time_score of every section.
+      conflicts (np.ndarray): Section conflict matrix.
+      weights (np.ndarray, optional): Weights of the GPA, start time and 
+      relative time terms, as in PreferenceProfile.weights. Defaults to the 
+      default profile's.
+      relative_time_scores (callable, optional): Returns the relative time 
+      score of an array of schedules, e.g. 
+      SchedulingProblem.relative_time_scores. Only called for possible 
+      schedules, and only needed when the relative time weight is not 0.
+
+  Returns:
+      np.ndarray: The N scores.
   """
-  # Sort based on average GPA
-  all_schedules.sort(key = lambda schedule: score_schedule(schedule))
+  schedules = np.asarray(schedules, dtype=int)
+  if (schedules.size == 0):
+    return np.zeros(len(schedules))
+  n_schedules, n_courses = schedules.shape
   
-  global blacklisted_sections
-  blacklisted_sections.append(("CMSC131", "FC05"))
-  blacklisted_sections.append(("CMSC132", "0203"))
+  is_possible_schedule = np.ones(n_schedules, dtype=bool)
+  for i in range(n_courses):
+    for j in range(i + 1, n_courses):
+      is_possible_schedule &= ~conflicts[schedules[:, i], schedules[:, j]]
   
-  schedules_to_remove = []
-  for schedule in all_schedules:
-    for section in schedule:
-      if ((section.class_name, section.section_num) in blacklisted_sections):
-        schedules_to_remove.append(schedule)
-        print("Found: " + str(section.class_name + section.section_num))
-        string_schedule = [section.get_data() for section in schedule]
-        print("Removed: " + str(string_schedule))
-        break
+  # Add up column by column so the sums match score_schedule's bit for bit.
+  gpa_sum = np.zeros(n_schedules)
+  start_time_sum = np.zeros(n_schedules)
+  for i in range(n_courses):
+    gpa_sum += gpas[schedules[:, i]]
+    start_time_sum += start_time_scores[schedules[:, i]]
   
-  return [x for x in all_schedules if x not in schedules_to_remove]
+  if (weights is None):
+    from preferences import DEFAULT_PROFILE
+    weights = DEFAULT_PROFILE.weights
+  scores = sig(gpa_sum / n_courses) * weights[0] + sig(start_time_sum) * weights[1]
+  if (weights[2] and is_possible_schedule.any()):
+    scores[is_possible_schedule] += (sig(relative_time_scores(schedules[is_possible_schedule])) 
+                                     * weights[2])
+  return np.where(is_possible_schedule, scores, 0.0)
+
+def _score_possible_schedule(schedule : List[Section], profile = None):
+  """Scores a schedule that is known to have no conflicts."""
+  from preferences import get_profile
+  # Add geographical distances b/w classes
+  # Add online vs in person
+  
+  # User Profiles (see preferences.PROFILES)--
+  # Commuter: consolidated, back to back... or doesn't care
+  # Part time job worker: doesn't care about consolidation, 
+  #   but wants certain parts of the day open
+  # "Class experience": in person, not consolidated
+  # Night owl: no classes before 11
+  # Freshman / Sophomore / Junior / Senior: 
+  # Only goes to lecture for exams: classes that don't require attendance
   
+  # Relative time (gaps, back to back, days on campus) is scored from a
+  # timeline.ScheduleTimeline when the profile weighs it.
+  return get_profile(profile).score_sections(schedule)
+
+
+def score_and_sort_schedules(all_schedules, problem : 'SchedulingProblem'):
+  """Sorts all schedules from worst to best based on how good they are (subjective).
+  Prefer select_top_schedules when only the best schedules are needed.
+
+  Args:
+      all_schedules ([] : [int]): The schedules to sort, as section indices.
+      problem (SchedulingProblem): The request the indices belong to.
+
+  Returns:
+      [] : [Section]: The sorted schedules, as lists of sections.
+  """
+  top_schedules = select_top_schedules(all_schedules, problem, k = None)
+  return [problem.to_sections(schedule) for _, schedule in reversed(top_schedules)]
+
+
+def select_top_schedules(schedules : Iterable, problem : 'SchedulingProblem', 
+                         k : Optional[int] = 20, batch_size : int = 256) -> List[Tuple[float, Tuple[int, ...]]]:
+  """Keep the k best schedules of a stream in a bounded heap.
+
+  Schedules are read in batches and scored with score_schedules. Duplicates
+  and impossible schedules are dropped on insert, so memory stays O(k) 
+  however many schedules are streamed in. Blacklisted sections are removed 
+  before search, see Restrictions.
+
+  Args:
+      schedules (iterable): Schedules as collections of section indices. May be
+      a generator.
+      problem (SchedulingProblem): The request the indices belong to.
+      k (int, optional): Number of schedules to keep. None keeps every one.
+      batch_size (int): Number of schedules to score at once.
+
+  Returns:
+      list[tuple[float, tuple[int]]]: (score, schedule) pairs, best first. 
+      Schedules are in course order.
+  """
+  top = TopSchedules(problem, k)
+  schedules = iter(schedules)
+  while (k != 0):
+    chunk = list(itertools.islice(schedules, batch_size))
+    if (not chunk):
+      break
+    top.add(chunk)
+  return top.best()
+
+
+class TopSchedules:
+  """The k best schedules added so far, kept in a bounded heap. Used by
+  select_top_schedules, and by callers that need to look at the best 
+  schedules between batches."""
+  def __init__(self, problem : 'SchedulingProblem', k : Optional[int] = 20) -> None:
+    """Initializes an empty selection
+
+    Args:
+        problem (SchedulingProblem): The request the schedules belong to.
+        k (int, optional): Number of schedules to keep. None keeps every one.
+    """
+    self.problem  = problem
+    self.k        = k
+    self.heap     = []  # min-heap of (score, -insertion order, schedule)
+    self.seen     = set()
+    self.inserted = 0
+
+  def add(self, schedules : Iterable) -> int:
+    """Score a batch of schedules and keep the best.
+
+    Returns:
+        int: Number of schedules that entered the k best.
+    """
+    batch = []
+    duplicates = impossible = entered = 0
+    for schedule in schedules:
+      schedule = tuple(sorted(schedule))
+      if (schedule in self.seen):
+        duplicates += 1
+        continue
+      self.seen.add(schedule)
+      batch.append(schedule)
+    
+    metrics = self.problem.metrics
+    if (batch and self.k != 0):
+      with metrics.timer("score"):
+        scores = self.problem.score_schedules(batch).tolist()
+      heap = self.heap
+      for score, schedule in zip(scores, batch):
+        if (score == 0):
+          # Impossible schedule
+          impossible += 1
+          continue
+        # On ties, keep the schedule that was found first.
+        entry = (score, -self.inserted, schedule)
+        self.inserted += 1
+        if (self.k is None or len(heap) < self.k):
+          heapq.heappush(heap, entry)
+        elif (score > heap[0][0]):
+          heapq.heapreplace(heap, entry)
+        else:
+          continue
+        entered += 1
+    
+    metrics.count("score.scored", len(batch))
+    metrics.count("score.dedup_hits", duplicates)
+    metrics.count("score.impossible", impossible)
+    return entered
+
+  def __len__(self) -> int:
+    return len(self.heap)
+
+  def kth_score(self) -> Optional[float]:
+    """Return the score a schedule has to beat to enter a full selection."""
+    return self.heap[0][0] if self.heap else None
+
+  def best(self) -> List[Tuple[float, Tuple[int, ...]]]:
+    """Return the (score, schedule) pairs kept, best first."""
+    return [(score, schedule) for score, _, schedule in sorted(self.heap, reverse = True)]
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""Asyncio HTTP entry point for ScheduleTerp.
+
+  POST /schedules  {"courses": ["CMSC131", "MATH140"], "algorithm": "csp",
+                    "limit": 20, "restrictions": {...}, "profile": "commuter",
+                    "deadline": 2.0, "patience": 0.5, "metrics": true}
+  GET  /health
+
+Solving runs in a process pool behind a bounded queue. When the queue is full
+new requests get 503 right away instead of piling up. Identical in-flight
+requests share one computation. Every request has a deadline, and the
+algorithm is given whatever is left of it, so the best schedules found in
+time are returned; "patience" returns them sooner once they stop improving.
+Responses say why the search stopped in "stop_reason", and a request whose
+deadline passed while it waited for a worker gets 504.
+"algorithm": "auto" picks the algorithm by problem size. With "metrics", the response also has the request's stage
+timings and counters, and "metrics": "cprofile" or "sampling" profiles it.
+"encoding": "compact" lists every section once instead of in every schedule,
+and "ndjson" streams that one line at a time; see encoding.py.
+
+  python server.py --host 0.0.0.0 --port 8080
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from catalog import get_catalog
+from encoding import NDJSON_CONTENT_TYPE, RESPONSE_ENCODINGS, is_compact, ndjson_lines
+from metrics import PROFILERS, get_metrics, has_sinks
+from preferences import get_profile
+from restrictions import Restrictions
+from schedule_cache import canonicalize, get_schedule_cache
+from scheduling_algorithms.solver import STRATEGY_NAMES
+
+DEFAULT_DEADLINE = 5.0
+MAX_DEADLINE     = 30.0
+# Part of the deadline kept back for scoring, serialization and the trip
+# back from the worker.
+DEADLINE_MARGIN  = 0.1
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+            504: "Gateway Timeout"}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_request(payload : dict) -> Tuple[list, dict, float]:
+  """Validate a schedule request.
+
+  Args:
+      payload (dict): Request JSON.
+
+  Raises:
+      ValueError: If the request is malformed. Values of the wrong type are
+      reported as ValueError too.
+
+  Returns:
+      tuple[list, dict, float]: Course IDs, the other get_schedules
+      arguments (restrictions still as a dict) and the deadline in seconds.
+  """
+  if (not isinstance(payload, dict)):
+    raise ValueError("Request must be a JSON object")
+  courses = payload.get("courses")
+  if (not isinstance(courses, list) or not courses
+      or not all(isinstance(course, str) for course in courses)):
+    raise ValueError("'courses' must be a non-empty list of course IDs")
+
+  kwargs = {}
+  algorithm = payload.get("algorithm", "sampling")
+  if (algorithm not in STRATEGY_NAMES):
+    raise ValueError("Unknown algorithm " + str(algorithm))
+  kwargs["algorithm"] = algorithm
+  if ("limit" in payload):
+    if (not isinstance(payload["limit"], int) or payload["limit"] < 0):
+      raise ValueError("'limit' must be a non-negative integer")
+    kwargs["limit"] = payload["limit"]
+  # Restrictions and profiles are checked here so bad ones are a 400, but 
+  # sent on as given.
+  if ("restrictions" in payload):
+    _check(Restrictions.from_dict, payload["restrictions"], "restrictions")
+    kwargs["restrictions"] = payload["restrictions"]
+  if ("profile" in payload):
+    _check(get_profile, payload["profile"], "profile")
+    kwargs["profile"] = payload["profile"]
+  if ("patience" in payload):
+    if (not isinstance(payload["patience"], (int, float)) or payload["patience"] <= 0):
+      raise ValueError("'patience' must be a positive number of seconds")
+    kwargs["patience"] = float(payload["patience"])
+  if (payload.get("metrics")):
+    if (payload["metrics"] is not True and payload["metrics"] not in PROFILERS):
+      raise ValueError("'metrics' must be true or one of " + ", ".join(PROFILERS))
+    kwargs["metrics"] = payload["metrics"]
+  encoding = payload.get("encoding", "verbose")
+  if (encoding not in RESPONSE_ENCODINGS):
+    raise ValueError("'encoding' must be one of " + ", ".join(RESPONSE_ENCODINGS))
+  if (encoding != "verbose"):
+    # ndjson is sent from the compact result.
+    kwargs["encoding"] = "compact"
+
+  deadline = payload.get("deadline", DEFAULT_DEADLINE)
+  if (not isinstance(deadline, (int, float)) or deadline <= 0):
+    raise ValueError("'deadline' must be a positive number of seconds")
+  return courses, kwargs, min(float(deadline), MAX_DEADLINE)
+
+
+def _check(parse, value, name : str) -> None:
+  """Parse part of a request, reporting any type error as a ValueError."""
+  try:
+    parse(value)
+  except TypeError as e:
+    raise ValueError("Malformed '%s': %s" % (name, e))
+
+
+def solve(courses : list, kwargs : dict,
+          expires_at : float) -> Tuple[list, Optional[dict], str]:
+  """Compute schedules for a parsed request. Runs in a worker process.
+
+  Metrics are recorded when the request asks for them or a metrics sink is
+  set up, and emitted to the sinks.
+
+  Args:
+      courses (list[str]): Course IDs.
+      kwargs (dict): Other get_schedules arguments from parse_request.
+      expires_at (float): Wall-clock time the response is due by.
+
+  Raises:
+      TimeoutError: If the deadline passed before the search started.
+
+  Returns:
+      tuple[list, dict, str]: The schedules, the metrics if asked for, and
+      why the search stopped, see scheduling_algorithms/solver.py.
+  """
+  kwargs = dict(kwargs)
+  requested = kwargs.pop("metrics", None)
+  metrics = get_metrics(requested or has_sinks())
+  if ("restrictions" in kwargs):
+    kwargs["restrictions"] = Restrictions.from_dict(kwargs["restrictions"])
+  remaining = expires_at - time.time()
+  if (remaining <= 0):
+    # Waited for a worker past its deadline. Searching for no time would
+    # return no schedules, as if none fit.
+    raise TimeoutError("Deadline exceeded before the search started")
+  kwargs["time_budget"] = remaining * (1 - DEADLINE_MARGIN)
+  with metrics.timer("total"):
+    schedules, stop_reason = get_schedule_cache().get_schedules(
+      courses, metrics = metrics, return_stop_reason = True, **kwargs)
+  metrics.emit(courses = courses, algorithm = kwargs.get("algorithm"))
+  return schedules, (metrics.as_dict() if requested else None), stop_reason
+
+
+def get_body(schedules, metrics : Optional[dict] = None, stop_reason : str = None) -> dict:
+  """Return the response body of a result in either encoding."""
+  body = dict(schedules) if is_compact(schedules) else {"schedules": schedules}
+  if (stop_reason is not None):
+    body["stop_reason"] = stop_reason
+  if (metrics is not None):
+    body["metrics"] = metrics
+  return body
+
+
+class ScheduleServer:
+  """Serves schedule requests over HTTP."""
+  def __init__(self, max_workers : int = None, max_queue : int = 64,
+               executor : Executor = None) -> None:
+    """Initializes the server
+
+    Args:
+        max_workers (int, optional): Worker processes. Defaults to the number
+        of CPUs.
+        max_queue (int): Requests allowed to wait for a worker before new ones
+        are turned away with 503.
+        executor (Executor, optional): Runs solve. Defaults to a forked
+        process pool, which inherits the already-opened catalog.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if (executor is None):
+      get_catalog()
+      methods = multiprocessing.get_all_start_methods()
+      context = multiprocessing.get_context("fork" if "fork" in methods else None)
+      executor = ProcessPoolExecutor(max_workers = max_workers, mp_context = context)
+      # Fork the workers now, while no sockets are open. Workers forked later
+      # would inherit open client connections and keep them from closing.
+      executor.submit(os.getpid).result()
+    self.executor  = executor
+    self.capacity  = max_workers + max_queue
+    self.in_flight : Dict[str, asyncio.Future] = {}
+    self.coalesced = 0
+    self.rejected  = 0
+
+  async def handle(self, payload) -> Tuple[int, object]:
+    """Answer one schedule request.
+
+    Returns:
+        tuple[int, object]: HTTP status and JSON-ready body, or an iterator
+        of NDJSON lines for "encoding": "ndjson".
+    """
+    try:
+      courses, kwargs, deadline = parse_request(payload)
+    except ValueError as e:
+      return 400, {"error": str(e)}
+
+    key = hashlib.sha256(json.dumps([courses, canonicalize(kwargs)],
+                                    sort_keys = True).encode()).hexdigest()
+    future = self.in_flight.get(key)
+    if (future is not None):
+      # Same request already being solved, share its result
+      self.coalesced += 1
+    else:
+      if (len(self.in_flight) >= self.capacity):
+        self.rejected += 1
+        return 503, {"error": "Server is busy, try again shortly"}
+      future = asyncio.ensure_future(self._solve(key, courses, kwargs, deadline))
+      # Every caller may have timed out before it fails, so nothing else is
+      # sure to retrieve its exception.
+      future.add_done_callback(lambda done: done.cancelled() or done.exception())
+      self.in_flight[key] = future
+
+    try:
+      # Shield so one caller timing out doesn't cancel a shared computation.
+      schedules, metrics, stop_reason = await asyncio.wait_for(asyncio.shield(future),
+                                                               deadline)
+    except (asyncio.TimeoutError, TimeoutError) as e:
+      # Either waiting here or the worker found the deadline already passed
+      return 504, {"error": str(e) or "Deadline exceeded"}
+    except (KeyError, ValueError) as e:
+      return 400, {"error": "Unknown course " + str(e) if isinstance(e, KeyError) else str(e)}
+    if (payload.get("encoding") == "ndjson"):
+      return 200, ndjson_lines(schedules, stop_reason = stop_reason,
+                               **({"metrics": metrics} if metrics is not None else {}))
+    return 200, get_body(schedules, metrics, stop_reason)
+
+  async def _solve(self, key : str, courses : list, kwargs : dict, deadline : float):
+    try:
+      loop = asyncio.get_running_loop()
+      return await loop.run_in_executor(self.executor, solve, courses, kwargs,
+                                        time.time() + deadline)
+    finally:
+      del self.in_flight[key]
+
+  def stats(self) -> dict:
+    return {"in_flight": len(self.in_flight), "capacity": self.capacity,
+            "coalesced": self.coalesced, "rejected": self.rejected}
+
+  async def handle_connection(self, reader : asyncio.StreamReader,
+                              writer : asyncio.StreamWriter) -> None:
+    """Read one HTTP/1.1 request, answer it and close the connection. A
+    request that fails unexpectedly gets a 500."""
+    try:
+      try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while (True):
+          line = (await reader.readline()).decode("latin-1").strip()
+          if (not line):
+            break
+          name, _, value = line.partition(":")
+          headers[name.strip().lower()] = value.strip()
+        if (len(request_line) < 2):
+          status, body = 400, {"error": "Malformed request"}
+        else:
+          status, body = await self._route(request_line[0], request_line[1], headers, reader)
+      except (ConnectionError, asyncio.IncompleteReadError):
+        return
+      except Exception:
+        logger.exception("Request failed")
+        status, body = 500, {"error": "Internal server error"}
+
+      if (not isinstance(body, dict)):
+        await self._stream(writer, status, body)
+        return
+      data = json.dumps(body).encode()
+      writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                    "Content-Length: %d\r\nConnection: close\r\n\r\n"
+                    % (status, _REASONS[status], len(data))).encode() + data)
+      await writer.drain()
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
+
+  async def _stream(self, writer : asyncio.StreamWriter, status : int, lines) -> None:
+    """Send NDJSON lines as chunks, draining after each one so a slow client
+    only holds back its own response."""
+    writer.write(("HTTP/1.1 %d %s\r\nContent-Type: %s\r\n"
+                  "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+                  % (status, _REASONS[status], NDJSON_CONTENT_TYPE)).encode())
+    try:
+      for line in lines:
+        writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+        await writer.drain()
+    except ConnectionError:
+      raise
+    except Exception:
+      # The status is already sent; ending without the last chunk tells the
+      # client the response is incomplete.
+      logger.exception("Streaming response failed")
+      return
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+  async def _route(self, method : str, path : str, headers : dict,
+                   reader : asyncio.StreamReader) -> Tuple[int, object]:
+    if (path == "/health"):
+      return 200, {"status": "ok", **self.stats()}
+    if (path != "/schedules"):
+      return 404, {"error": "Not found"}
+    if (method != "POST"):
+      return 405, {"error": "Use POST"}
+    try:
+      length = int(headers.get("content-length", 0))
+    except ValueError:
+      return 400, {"error": "Content-Length must be a number"}
+    if (length < 0):
+      return 400, {"error": "Content-Length must be a number"}
+    if (length > 1 << 20):
+      return 413, {"error": "Request too large"}
+    try:
+      payload = json.loads(await reader.readexactly(length))
+    except ValueError:
+      return 400, {"error": "Body must be JSON"}
+    return await self.handle(payload)
+
+  async def serve(self, host : str = "127.0.0.1", port : int = 8080) -> None:
+    """Serve until cancelled."""
+    server = await asyncio.start_server(self.handle_connection, host, port)
+    async with server:
+      await server.serve_forever()
+
+
+def main():
+  parser = argparse.ArgumentParser(description = "ScheduleTerp HTTP server")
+  parser.add_argument("--host", default = "127.0.0.1")
+  parser.add_argument("--port", type = int, default = 8080)
+  parser.add_argument("--workers", type = int, default = None)
+  parser.add_argument("--max-queue", type = int, default = 64)
+  args = parser.parse_args()
+  asyncio.run(ScheduleServer(args.workers, args.max_queue).serve(args.host, args.port))
+
+if __name__ == '__main__':
+  main()
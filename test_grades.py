@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Checks the GPA aggregation of grades.py and its use by etl.py on the
+PlanetTerp-style records in test_grades_data.json.
+
+  python -m pytest test_grades.py
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import json
+import os
+import pytest
+from etl import run_etl
+from grades import GradeIndex, LEVELS, load_records
+
+GRADES_PATH = "test_grades_data.json"
+# Grade points and counts of the records in GRADES_PATH
+ALICE   = (8 * 4.0 + 2 * 3.0 + 2 * 4.0 + 8 * 3.0, 20)
+BOB     = (5 * 2.0, 10)  # W counts 0, "Other" isn't counted
+CMSC131 = (ALICE[0] + BOB[0], ALICE[1] + BOB[1])
+CMSC    = (CMSC131[0] + 10 * 3.0, CMSC131[1] + 10)
+MATH140 = (1 * 4.0, 1 + 3)
+ALL     = (CMSC[0] + MATH140[0], CMSC[1] + MATH140[1])
+
+
+def gpa(points_and_count):
+  points, count = points_and_count
+  return points / count
+
+
+@pytest.fixture(scope = "module")
+def index():
+  return GradeIndex.from_records(load_records([GRADES_PATH]))
+
+
+def check(index, course_id, instructors, expected, level):
+  gpas, levels = index.get_gpas([course_id], [instructors], return_levels = True)
+  assert gpas[0] == pytest.approx(gpa(expected))
+  assert LEVELS[levels[0]] == level
+
+
+def test_fallback_order(index):
+  # The section's own instructors, pooled when it is taught together
+  check(index, "CMSC131", ["Alice Smith"], ALICE, "instructor")
+  check(index, "CMSC131", ["Alice Smith", "Bob Jones"], CMSC131, "instructor")
+  # Then the course, for new or unknown instructors
+  check(index, "CMSC131", ["Erin Wu"], CMSC131, "course")
+  check(index, "CMSC131", [], CMSC131, "course")
+  # An instructor only counts for the courses they taught
+  check(index, "CMSC132", ["Alice Smith"], (10 * 3.0, 10), "course")
+  # Then the department, then every grade
+  check(index, "CMSC250", ["Alice Smith"], CMSC, "department")
+  check(index, "ENGL101", [], ALL, "global")
+  assert index.get_gpa("CMSC131", ["Alice Smith"]) == pytest.approx(gpa(ALICE))
+
+
+def test_min_grades_falls_back():
+  index = GradeIndex.from_records(load_records([GRADES_PATH]), min_grades = 2)
+  # Dan Park has one grade, MATH140 four.
+  check(index, "MATH140", ["Dan Park"], MATH140, "course")
+  check(index, "CMSC131", ["Bob Jones"], BOB, "instructor")
+
+
+def test_recent_semesters():
+  index = GradeIndex.from_records(load_records([GRADES_PATH]), recent_semesters = 1)
+  check(index, "CMSC131", ["Alice Smith"], (2 * 4.0 + 8 * 3.0, 10), "instructor")
+  check(index, "MATH140", ["Dan Park"], (0.0, 3), "course")
+
+
+def test_save_and_load(index, tmp_path):
+  path = str(tmp_path / "grades.npz")
+  index.save(path)
+  check(GradeIndex.load(path), "CMSC131", ["Alice Smith"], ALICE, "instructor")
+
+
+def test_etl_reports_gpa_changes(index, tmp_path):
+  source = tmp_path / "dump.json"
+  source.write_text(json.dumps({"CMSC131": [
+    {"section_num": "0101", "gpa": 3.1, "lectures": ["MWF 10:00am-10:50am"],
+     "discussions": [], "instructors": ["Alice Smith"]},
+    {"section_num": "0102", "gpa": gpa(CMSC131), "lectures": ["TuTh 2:00pm-3:15pm"],
+     "discussions": [], "instructors": ["Erin Wu"]}]}))
+  out_dir = str(tmp_path / "build")
+  summary = run_etl(str(source), out_dir, ["jsonl"], grades = index)
+
+  changes = [["CMSC131", "0101", 3.1, gpa(ALICE), "instructor"]]
+  assert summary["gpa_changes"] == changes
+  with open(os.path.join(out_dir, "gpa_changes.json")) as f:
+    assert json.load(f) == changes
+  with open(os.path.join(out_dir, "catalog.jsonl")) as f:
+    sections = json.loads(f.readline())["sections"]
+  assert [section["gpa"] for section in sections] == [gpa(ALICE), gpa(CMSC131)]
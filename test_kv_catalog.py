@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Checks the key-value catalog against the JSON catalog, through the local
+stand-in store.
+
+  python -m pytest test_kv_catalog.py
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import pytest
+from catalog import CourseCatalog, DEFAULT_CATALOG_PATH
+from kv_catalog import KeyValueCatalog, InMemoryKeyValueStore, MAX_BATCH_KEYS, VERSION_KEY
+
+DUMP_PATH = "dynamo_custom_data_dump.json"
+
+
+@pytest.fixture(scope = "module")
+def items():
+  return list(InMemoryKeyValueStore.from_dump(DUMP_PATH).items.values())
+
+
+def test_unprocessed_keys_are_retried(items):
+  store = InMemoryKeyValueStore(items, max_items_per_call = 40)
+  catalog = KeyValueCatalog(store, retry_delay = 0)
+  course_ids = catalog.course_ids()[:2 * MAX_BATCH_KEYS + 10]
+  found = catalog.get_many(course_ids)
+
+  reference = CourseCatalog(DEFAULT_CATALOG_PATH)
+  for course_id in course_ids:
+    assert ([section.get_data() for section in found[course_id]]
+            == [section.get_data() for section in reference.get_sections(course_id)])
+  # Three batches of at most MAX_BATCH_KEYS keys, 40 items per call
+  assert catalog.stats()["batch_calls"] == 3 + 3 + 1
+  assert catalog.stats()["retries"] == 2 + 2 + 0
+  assert catalog.get_many(course_ids[:5]) == {course_id: found[course_id]
+                                              for course_id in course_ids[:5]}
+  assert catalog.stats()["batch_calls"] == 7
+
+
+def test_keys_left_unprocessed_raise(items):
+  store = InMemoryKeyValueStore(items, max_items_per_call = 1)
+  catalog = KeyValueCatalog(store, max_attempts = 3, retry_delay = 0)
+  with pytest.raises(RuntimeError):
+    catalog.get_many(catalog.course_ids()[:5])
+  assert store.calls == 3
+
+
+def test_version_is_read_again_after_its_ttl(items):
+  store = InMemoryKeyValueStore(items)
+  catalog = KeyValueCatalog(store, version_ttl = 0)
+  version = catalog.get_version()
+  assert version not in (None, catalog.table)
+  catalog.get_sections("CMSC131")
+  assert catalog.stats()["cached"] == 1
+
+  store.items[VERSION_KEY] = {**store.items[VERSION_KEY], "version": {"S": "updated"}}
+  assert catalog.get_version() == "updated"
+  # Courses read under the old version are dropped.
+  assert catalog.stats()["cached"] == 0
+
+  fixed = KeyValueCatalog(store, version = "pinned", version_ttl = 0)
+  assert fixed.get_version() == "pinned"
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Checks preference profiles on sections and courses of the shipped catalog.
+
+  python -m pytest test_preferences.py
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import pytest
+from catalog import get_catalog
+from preferences import PreferenceProfile, get_profile
+from scheduler import get_schedules
+
+
+def test_blocked_windows_score_sections_without_meetings():
+  # Every section of AASP298M is online, with no meetings to score.
+  sections = list(get_catalog().get_sections("AASP298M"))
+  assert sections and not any(section.meetings for section in sections)
+  profile = get_profile("part_time_worker")
+  assert (profile.section_time_scores(sections) == 0).all()
+  assert profile.score_sections(sections[:1]) > 0
+  assert get_schedules(["AASP298M"], profile = "part_time_worker")
+
+
+def test_all_zero_weights_are_rejected():
+  # Every schedule would score 0, which marks an impossible schedule.
+  with pytest.raises(ValueError):
+    PreferenceProfile(weights = {"average_gpa": 0, "start_time": 0})
+  with pytest.raises(ValueError):
+    get_profile({"base": "commuter",
+                 "weights": {"average_gpa": 0, "start_time": 0, "relative_time": 0}})
+  assert get_schedules(["CMSC131"], profile = {"weights": {"average_gpa": 0}})
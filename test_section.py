@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Checks the occupancy bitmasks of Section against the merge-walk conflict
+check they replaced, on the shipped catalog.
+
+  python -m pytest test_section.py
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+from typing import List, Tuple, Union
+from catalog import CourseCatalog, DEFAULT_CATALOG_PATH
+from section import Section
+
+
+def merge_walk_conflicts(mine : List[int], other : List[int]) -> bool:
+  """The original Section.conflicts_with_section, as a reference.
+
+  Go through both section times in order until either a double start time
+  (even index + even index) or double end time (odd index + odd index) occurs.
+  We can detect both by checking if the sum is even.
+
+  Args:
+      mine (list[int]): Sorted meeting boundaries, start, end, start, ...
+      other (list[int]): The other section's boundaries.
+  """
+  my_index = 0
+  other_index = 0
+  last_index_checked = -1
+  while (my_index < len(mine) and other_index < len(other)):
+    if (mine[my_index] < other[other_index]):
+      if ((last_index_checked + my_index) % 2 == 0):
+        return True
+      last_index_checked = my_index
+      my_index += 1
+    else:
+      if ((last_index_checked + other_index) % 2 == 0):
+        return True
+      last_index_checked = other_index
+      other_index += 1
+  return False
+
+
+def boundaries(meetings : Tuple[Tuple[int, int], ...],
+               shrink : float = 0) -> List[Union[int, float]]:
+  """Return the sorted boundaries of meetings, with every end pulled in by
+  shrink minutes."""
+  return sorted([minute for start, end in meetings for minute in (start, end - shrink)])
+
+
+def touches(a : Tuple[Tuple[int, int], ...], b : Tuple[Tuple[int, int], ...]) -> bool:
+  """Return true if a meeting of one ends exactly when one of the other
+  starts."""
+  starts_a = {start for start, _ in a}
+  starts_b = {start for start, _ in b}
+  return (any(end in starts_b for _, end in a) or any(end in starts_a for _, end in b))
+
+
+def make_section(*meetings : Tuple[int, int]) -> Section:
+  return Section.from_parsed("TEST100", "0101", 3.0, [], meetings,
+                             [start % (24 * 60) for start, _ in meetings], [])
+
+
+def test_touching_meetings_do_not_conflict():
+  # Meetings are half-open: a class ending at 10:00am on Monday does not
+  # conflict with one starting at 10:00am. The merge-walk said they did, but
+  # only when asked from the earlier section.
+  earlier = make_section((540, 600))
+  later   = make_section((600, 660))
+  assert not earlier.conflicts_with_section(later)
+  assert not later.conflicts_with_section(earlier)
+  assert merge_walk_conflicts(boundaries(earlier.meetings), boundaries(later.meetings))
+  assert not merge_walk_conflicts(boundaries(later.meetings), boundaries(earlier.meetings))
+
+
+def test_overlapping_meetings_conflict():
+  assert make_section((540, 600)).conflicts_with_section(make_section((590, 650)))
+  assert make_section((540, 600)).conflicts_with_section(make_section((540, 600)))
+  # Same time on different days
+  assert not make_section((540, 600)).conflicts_with_section(
+    make_section((540 + 24 * 60, 600 + 24 * 60)))
+
+
+def test_bitmask_agrees_with_merge_walk_on_catalog():
+  """Every pair of sections in the shipped catalog, compared through their
+  distinct meeting patterns, since sections with the same meetings give the
+  same answers."""
+  catalog = CourseCatalog(DEFAULT_CATALOG_PATH)
+  patterns = {}
+  for course_id in catalog.course_ids():
+    for section in catalog.get_sections(course_id):
+      patterns.setdefault(section.meetings, section)
+  patterns = list(patterns.items())
+  walks = [boundaries(meetings) for meetings, _ in patterns]
+
+  disagreements = []
+  for i, (meetings_a, section_a) in enumerate(patterns):
+    for j in range(i, len(patterns)):
+      meetings_b, section_b = patterns[j]
+      bitmask = section_a.conflicts_with_section(section_b)
+      assert bitmask == section_b.conflicts_with_section(section_a)
+      if (touches(meetings_a, meetings_b)):
+        # The documented difference: the merge-walk counts a meeting that
+        # ends when another starts as a conflict in one or both orders, the
+        # half-open bitmask doesn't. Times are whole minutes, so two
+        # boundaries that differ at all differ by at least a minute, and
+        # pulling every end in by half a minute removes exactly those
+        # conflicts.
+        walk = merge_walk_conflicts(boundaries(meetings_a, 0.5), boundaries(meetings_b, 0.5))
+      else:
+        walk = merge_walk_conflicts(walks[i], walks[j])
+        assert walk == merge_walk_conflicts(walks[j], walks[i])
+      if (bitmask != walk):
+        disagreements.append((section_a.lectures, section_b.lectures))
+  assert not disagreements, disagreements[:10]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Relative-time features of a schedule: idle time between classes, the
+longest gap, back-to-back classes, days on campus and four-day weeks.
+
+ScheduleTimeline keeps every day's meetings sorted, so swapping one section
+only rescans the days that section meets on. relative_time_features computes
+the same features for a whole batch of schedules at once.
+"""
+
+__author__     = "Oliver Villegas, Jaxon Lee"
+__copyright__  = "Copyright 2023"
+__credits__    = ["Jet Lee"]
+__license__    = "MIT"
+__version__    = "0.1.0"
+__maintainer__ = "Oliver Villegas, Jaxon Lee"
+__email__      = "j.oliver.vv@gmail.com, jaxondlee@gmail.com"
+__status__     = "Development"
+
+import bisect
+import numpy as np
+from typing import Iterable, List, Tuple
+from section import Section, DAY_INDEX, MINUTES_PER_DAY
+
+# Classes at most this far apart are back to back; the time between them is
+# spent walking, not idle.
+BACK_TO_BACK_MINUTES = 15
+# Order of the feature vectors
+FEATURES = ("idle_hours", "longest_gap_hours", "back_to_back", "days_on_campus",
+            "four_day_week")
+# Meeting key used to pad per-section meeting arrays; sorts after any meeting
+NO_MEETING = np.iinfo(np.int64).max
+
+
+class ScheduleTimeline:
+  """Meetings of a schedule kept sorted per day, with per-day gap statistics
+  that are updated as sections are added and removed.
+  """
+  def __init__(self, sections : Iterable[Section] = ()) -> None:
+    self.days  : List[List[Tuple[int, int]]] = [[] for _ in DAY_INDEX]
+    # (idle minutes, longest gap, back-to-back pairs) of every day
+    self.stats : List[Tuple[int, int, int]] = [(0, 0, 0) for _ in DAY_INDEX]
+    for section in sections:
+      self.add(section)
+
+  def add(self, section : Section) -> None:
+    """Add a section's meetings."""
+    for start, end in section.meetings:
+      bisect.insort(self.days[start // MINUTES_PER_DAY], (start, end))
+    self._update(section)
+
+  def remove(self, section : Section) -> None:
+    """Remove a section's meetings. The section must have been added."""
+    for start, end in section.meetings:
+      meetings = self.days[start // MINUTES_PER_DAY]
+      del meetings[bisect.bisect_left(meetings, (start, end))]
+    self._update(section)
+
+  def replace(self, old : Section, new : Section) -> None:
+    """Swap one section for another, e.g. for a local search move."""
+    self.remove(old)
+    self.add(new)
+
+  def _update(self, section : Section) -> None:
+    """Rescan the days a section meets on."""
+    for day in {start // MINUTES_PER_DAY for start, _ in section.meetings}:
+      idle = longest = back_to_back = 0
+      last_end = None
+      for start, end in self.days[day]:
+        if (last_end is not None):
+          gap = start - last_end
+          if (gap <= BACK_TO_BACK_MINUTES):
+            back_to_back += 1
+          else:
+            idle += gap
+            longest = max(longest, gap)
+          last_end = max(last_end, end)
+        else:
+          last_end = end
+      self.stats[day] = (idle, longest, back_to_back)
+
+  def features(self) -> np.ndarray:
+    """Return the schedule's features, in FEATURES order."""
+    days_on_campus = sum([1 for meetings in self.days if meetings])
+    return np.array([sum([stats[0] for stats in self.stats]) / 60,
+                     max([stats[1] for stats in self.stats]) / 60,
+                     sum([stats[2] for stats in self.stats]),
+                     days_on_campus,
+                     float(days_on_campus <= 4)])
+
+
+def meeting_keys(sections : List[Section]) -> np.ndarray:
+  """Return the meetings of every section as sortable int64 keys, 
+  start << 16 | end, padded with NO_MEETING into an 
+  N x (most meetings of any section) array."""
+  width = max([len(section.meetings) for section in sections] + [1])
+  keys = np.full((len(sections), width), NO_MEETING, dtype=np.int64)
+  for i, section in enumerate(sections):
+    for j, (start, end) in enumerate(section.meetings):
+      keys[i, j] = start << 16 | end
+  return keys
+
+
+def relative_time_features(schedules : np.ndarray, keys : np.ndarray) -> np.ndarray:
+  """Return the features of a batch of schedules, the same as
+  ScheduleTimeline.features gives for each one.
+
+  Args:
+      schedules (np.ndarray): N x courses array of section indices.
+      keys (np.ndarray): Meeting keys of every section, from meeting_keys.
+
+  Returns:
+      np.ndarray: N x len(FEATURES) features.
+  """
+  schedules = np.asarray(schedules, dtype=int)
+  n_schedules = len(schedules)
+  # Sorting the keys sorts every schedule's meetings by start; padding sorts
+  # last.
+  meetings = np.sort(keys[schedules].reshape(n_schedules, -1), axis=1)
+  valid    = meetings != NO_MEETING
+  starts   = meetings >> 16
+  days     = starts // MINUTES_PER_DAY
+
+  last_end = np.maximum.accumulate(np.where(valid, meetings & 0xFFFF, -1), axis=1)
+  gaps = starts[:, 1:] - last_end[:, :-1]
+  consecutive  = valid[:, 1:] & (days[:, 1:] == days[:, :-1])
+  back_to_back = consecutive & (gaps <= BACK_TO_BACK_MINUTES)
+  idle_gaps    = np.where(consecutive & ~back_to_back, gaps, 0)
+
+  # A new day starts at the first meeting and wherever the day changes.
+  days_on_campus = valid[:, 0] + (valid[:, 1:] & ~consecutive).sum(axis=1)
+
+  features = np.empty((n_schedules, len(FEATURES)))
+  features[:, 0] = idle_gaps.sum(axis=1) / 60
+  features[:, 1] = (idle_gaps.max(axis=1) if idle_gaps.shape[1] else 0) / 60
+  features[:, 2] = back_to_back.sum(axis=1)
+  features[:, 3] = days_on_campus
+  features[:, 4] = days_on_campus <= 4
+  return features